@@ -1,10 +1,35 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, request, jsonify
-from backend.extract.extract_ejar import extract_all, walk_and_fix_arabic
-import tempfile, os, traceback
+from flask import Flask, request, jsonify, Response, g
+from backend.extract.extract_ejar import (
+    extract_all_cached, walk_and_fix_arabic, reload_rules, reload_rules_if_changed,
+    get_default_cache, StageTimer, arabic_memo_stats, job_budget,
+)
+from backend import ejar_metrics as metrics
+import time, traceback
 
 app = Flask(__name__)
 
+metrics.register(metrics.CallbackCounter("ejar_cache_hits_total", "Result cache hits since start.",
+                                         lambda: get_default_cache() and get_default_cache().hits))
+metrics.register(metrics.CallbackCounter("ejar_cache_misses_total", "Result cache misses since start.",
+                                         lambda: get_default_cache() and get_default_cache().misses))
+metrics.register(metrics.CallbackCounter("ejar_arabic_memo_hits_total", "Arabic transform memo hits since start.",
+                                         lambda: sum(v["hits"] for v in arabic_memo_stats().values())))
+metrics.register(metrics.CallbackCounter("ejar_arabic_memo_misses_total", "Arabic transform memo misses since start.",
+                                         lambda: sum(v["misses"] for v in arabic_memo_stats().values())))
+
+@app.before_request
+def _start_clock():
+    g.t0 = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    # 📊 عدّاد الطلبات وزمن الاستجابة لكل مسار (عدا /metrics نفسه)
+    if request.url_rule is not None and request.path != "/metrics":
+        metrics.REQUESTS.inc(request.path, str(response.status_code))
+        metrics.LATENCY.observe(time.perf_counter() - g.t0, request.path)
+    return response
+
 @app.route("/extract", methods=["POST"])
 def extract_contract():
     try:
@@ -12,30 +37,48 @@ def extract_contract():
         file = request.files.get("file")
         if not file:
             return jsonify({"error": "لم يتم رفع أي ملف"}), 400
-
-        # 📂 حفظ مؤقت
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            file.save(tmp)
-            tmp_path = tmp.name
-
-        # 🧠 تحليل العقد
-        data, _ = extract_all(tmp_path)
-        shaped = walk_and_fix_arabic(data, shape=False)
-
-        # 🧹 حذف الملف بعد التحليل
+        # ⏱️ حقول time_budget_ms / max_pages الاختيارية (أو EJAR_TIME_BUDGET_MS / EJAR_MAX_PAGES):
+        #    عند تجاوزها تُرجع نتيجة جزئية فيها "partial" مع الأقسام المتروكة
         try:
-            os.remove(tmp_path)
-        except:
-            pass
+            budget = job_budget(request.form)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        timer = StageTimer()
+
+        # 🧠 تحليل العقد من الذاكرة مباشرة (من الكاش إن سبق رفع نفس الملف)
+        reload_rules_if_changed()
+        data, _ = extract_all_cached(file.read(), timer=timer, keep_full_text=False, budget=budget)
+        with timer.stage("arabic_postprocess"):
+            shaped = walk_and_fix_arabic(data, shape=False, in_place=True)
+        metrics.observe_timer(timer)
+        metrics.observe_result(shaped)
 
-        # ✅ إرسال النتيجة
-        return jsonify(shaped)
+        # ✅ إرسال النتيجة (مع أزمنة المراحل في Server-Timing)
+        response = jsonify(shaped)
+        response.headers["Server-Timing"] = timer.server_timing()
+        return response
 
     except Exception as e:
         print("🔥 Error while extracting:", traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/rules/reload", methods=["POST"])
+def reload_extraction_rules():
+    # ♻️ إعادة تحميل قواعد الاستخراج (من EJAR_RULES_FILE) دون إعادة تشغيل الخادم
+    try:
+        rules = reload_rules()
+        return jsonify({"ok": True, "rules_version": rules.version})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    # 📊 مقاييس Prometheus
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     # 🚀 تشغيل الخادم
     app.run(host="0.0.0.0", port=8081)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+نسخة ASGI غير متزامنة من ejar_api.py بنفس عقد JSON.
+الملف المرفوع يُقرأ في الذاكرة ويُحلَّل في مجمع عمليات محدود، فلا يتوقف الـ event loop على ملف بطيء.
+
+    hypercorn backend.ejar_asgi:app --bind 0.0.0.0:8081
+"""
+from quart import Quart, request, jsonify, Response, g
+from concurrent.futures import ProcessPoolExecutor
+from backend.extract.extract_ejar import (
+    extract_all_cached, walk_and_fix_arabic, reload_rules, reload_rules_if_changed, StageTimer,
+    job_budget, budget_options, new_cancel_token, cancel_by_token, discard_cancel_token,
+)
+from backend import ejar_metrics as metrics
+import asyncio, os, time, traceback
+
+# ------------------------------
+# Executor
+# ------------------------------
+WORKERS = int(os.environ.get("EJAR_ASGI_WORKERS", "0")) or max(1, min(4, (os.cpu_count() or 2) - 1))
+MAX_PENDING = int(os.environ.get("EJAR_ASGI_MAX_PENDING", "0")) or WORKERS * 4
+QUEUE_TIMEOUT = float(os.environ.get("EJAR_ASGI_QUEUE_TIMEOUT", "10"))
+MAX_UPLOAD_MB = int(os.environ.get("EJAR_MAX_UPLOAD_MB", "25"))
+
+_executor = None
+_slots = None
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=WORKERS)
+    return _executor
+
+def _extract_upload(pdf_bytes: bytes, options: dict, cancel_file: str):
+    """
+    يعمل داخل عملية العامل: يحلّل الملف ويرجع (النتيجة، أزمنة المراحل، عدد الصفحات، ذروة الذاكرة، ملف القالب).
+    وجود cancel_file يعني أن العميل قطع الاتصال → يتوقف التحليل عند أول فحص للميزانية.
+    """
+    timer = StageTimer()
+    reload_rules_if_changed()
+    data, _ = extract_all_cached(pdf_bytes, timer=timer, keep_full_text=False,
+                                 budget=job_budget(options, cancel_file=cancel_file))
+    with timer.stage("arabic_postprocess"):
+        shaped = walk_and_fix_arabic(data, shape=False, in_place=True)
+    return shaped, dict(timer.stages), timer.pages, timer.peak_rss, timer.profile
+
+# ------------------------------
+# App
+# ------------------------------
+app = Quart(__name__)
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_MB * 1024 * 1024
+
+@app.before_serving
+async def _startup():
+    global _slots
+    # حد أعلى للمهام المنتظرة + الجارية؛ ما زاد عنه يُرفض بـ 503 بدل تكديس الطلبات
+    _slots = asyncio.Semaphore(MAX_PENDING)
+    get_executor()
+
+@app.after_serving
+async def _shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+@app.before_request
+async def _start_clock():
+    g.t0 = time.perf_counter()
+
+@app.after_request
+async def _record_request(response):
+    if request.url_rule is not None and request.path != "/metrics":
+        metrics.REQUESTS.inc(request.path, str(response.status_code))
+        metrics.LATENCY.observe(time.perf_counter() - g.t0, request.path)
+    return response
+
+@app.route("/extract", methods=["POST"])
+async def extract_contract():
+    try:
+        # 📥 استلام الملف في الذاكرة
+        files = await request.files
+        file = files.get("file")
+        if not file:
+            return jsonify({"error": "لم يتم رفع أي ملف"}), 400
+        # حقول الميزانية تُتحقق منها هنا: قيمة خاطئة → 400 بدل خطأ داخل العامل
+        try:
+            options = budget_options(await request.form)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        pdf_bytes = file.read()
+
+        # ⏳ انتظار مكان في المجمع
+        try:
+            await asyncio.wait_for(_slots.acquire(), QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return jsonify({"error": "الخادم مشغول، حاول لاحقاً"}), 503
+        token = new_cancel_token()
+        future = get_executor().submit(_extract_upload, pdf_bytes, options, token)
+        try:
+            shaped, stages, pages, peak_rss, profile = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # 🔌 العميل قطع الاتصال (Quart يلغي المعالج) → إيقاف التحليل في العامل بدل إكماله بلا فائدة
+            cancel_by_token(token)
+            metrics.PARTIAL.inc("cancelled")
+            raise
+        finally:
+            _slots.release()
+            # ملف الإلغاء يُحذف بعد انتهاء العامل فعلاً حتى يراه
+            future.add_done_callback(lambda _: discard_cancel_token(token))
+
+        timer = StageTimer()
+        timer.stages.update(stages)
+        timer.pages = pages
+        timer.peak_rss = peak_rss
+        timer.profile = profile
+        metrics.observe_timer(timer)
+        metrics.observe_result(shaped)
+
+        # ✅ إرسال النتيجة (مع أزمنة المراحل في Server-Timing)
+        response = jsonify(shaped)
+        response.headers["Server-Timing"] = timer.server_timing()
+        return response
+
+    except Exception as e:
+        print("🔥 Error while extracting:", traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/rules/reload", methods=["POST"])
+async def reload_extraction_rules():
+    # ♻️ التحقق من القواعد هنا ثم استبدال المجمع حتى تحمّلها العمليات الجديدة
+    global _executor
+    try:
+        rules = reload_rules()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    old, _executor = _executor, None
+    get_executor()
+    if old is not None:
+        old.shutdown(wait=False)
+    return jsonify({"ok": True, "rules_version": rules.version})
+
+
+@app.route("/metrics", methods=["GET"])
+async def prometheus_metrics():
+    # 📊 مقاييس Prometheus (أزمنة المراحل تأتي من العمّال مع كل نتيجة)
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+if __name__ == "__main__":
+    # 🚀 تشغيل خادم التطوير
+    app.run(host="0.0.0.0", port=8081)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+مقاييس خادم الاستخراج بصيغة Prometheus النصية (text exposition 0.0.4) بدون مكتبات إضافية.
+"""
+from __future__ import annotations
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+LabelValues = Tuple[str, ...]
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    v = float(v)
+    return str(int(v)) if v.is_integer() else repr(v)
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Iterable[str] = ()):
+        self.name, self.doc, self.label_names = name, doc, tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for lv, v in sorted(self._values.items()):
+                out.append(f"{self.name}{_labels(self.label_names, lv)} {_fmt(v)}")
+        return out
+
+class Histogram:
+    def __init__(self, name: str, doc: str, buckets: Iterable[float], labels: Iterable[str] = ()):
+        self.name, self.doc, self.label_names = name, doc, tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[LabelValues, List[float]] = {}  # [عدادات الحاويات..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, le in enumerate(self.buckets):
+                if value <= le:
+                    s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for lv, s in sorted(self._series.items()):
+                for le, n in zip(self.buckets, s):
+                    le_label = 'le="%s"' % _fmt(le)
+                    out.append(f"{self.name}_bucket{_labels(self.label_names, lv, le_label)} {_fmt(n)}")
+                out.append(f"{self.name}_sum{_labels(self.label_names, lv)} {_fmt(s[-2])}")
+                out.append(f"{self.name}_count{_labels(self.label_names, lv)} {_fmt(s[-1])}")
+        return out
+
+class Gauge:
+    """ قيمة لحظية تُقرأ عند كل طلب /metrics. """
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, read):
+        self.name, self.doc, self.read = name, doc, read
+
+    def render(self) -> List[str]:
+        value = self.read()
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}", f"{self.name} {_fmt(value)}"]
+
+class CallbackCounter(Gauge):
+    """ مجموع تراكمي يحتفظ به كائن آخر (مثل عدادات الكاش) ويُقرأ عند كل طلب /metrics؛ الاسم ينتهي بـ _total. """
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, read):
+        if not name.endswith("_total"):
+            raise ValueError(f"counter name must end with _total: {name}")
+        super().__init__(name, doc, read)
+
+# ------------------------------
+# مقاييس الخادم
+# ------------------------------
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STAGE_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+PAGE_BUCKETS = (1, 2, 4, 8, 12, 16, 24, 32, 64, 128)
+RSS_BUCKETS = tuple(mb * 1024 * 1024 for mb in (64, 128, 256, 384, 512, 768, 1024, 2048, 4096))
+
+REQUESTS = Counter("ejar_requests_total", "Extraction API requests.", ("endpoint", "status"))
+LATENCY = Histogram("ejar_request_duration_seconds", "End-to-end request latency.",
+                    LATENCY_BUCKETS, ("endpoint",))
+PAGES = Histogram("ejar_pdf_pages", "Pages per extracted PDF (cache misses only).", PAGE_BUCKETS)
+STAGES = Histogram("ejar_stage_duration_seconds", "Duration of each extraction stage.",
+                   STAGE_BUCKETS, ("stage",))
+PARTIAL = Counter("ejar_partial_results_total", "Extractions stopped early by a budget or cancellation.",
+                  ("reason",))
+PEAK_RSS = Histogram("ejar_document_peak_rss_bytes", "Worker peak RSS while extracting one PDF (cache misses only).",
+                     RSS_BUCKETS)
+PROFILES = Counter("ejar_template_profile_total", "Extractions per template profile (cache misses only).",
+                   ("profile",))
+
+_registry: List[object] = [REQUESTS, LATENCY, PAGES, STAGES, PARTIAL, PEAK_RSS, PROFILES]
+
+def register(metric) -> None:
+    _registry.append(metric)
+
+def observe_timer(timer) -> None:
+    """ تسجيل أزمنة StageTimer وعدد الصفحات وذروة الذاكرة وملف القالب (إن حُلّل الملف فعلاً) في المقاييس. """
+    for stage, seconds in timer.stages.items():
+        STAGES.observe(seconds, stage)
+    if timer.pages is not None:
+        PAGES.observe(timer.pages)
+    if timer.peak_rss is not None:
+        PEAK_RSS.observe(timer.peak_rss)
+    if timer.profile is not None:
+        PROFILES.inc(timer.profile)
+
+def observe_result(data) -> None:
+    """ عدّ النتائج الجزئية حسب سبب التوقف (time / pages / cancelled). """
+    partial = data.get("partial") if isinstance(data, dict) else None
+    if partial:
+        PARTIAL.inc(partial.get("reason", "unknown"))
+
+def render() -> str:
+    lines: List[str] = []
+    for m in _registry:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
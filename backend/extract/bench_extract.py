@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+قياس أداء مراحل الاستخراج كلٌ على حدة على نصوص عقود اصطناعية (بدون PDF).
+
+    python extract/bench_extract.py                      # كل المراحل على كل النماذج
+    python extract/bench_extract.py --json bench.json    # حفظ النتائج
+    python extract/bench_extract.py --compare bench.json # مقارنة بتشغيل سابق (قبل نشر إصدار قواعد جديد)
+"""
+from __future__ import annotations
+import os, sys, json, time, random, argparse, platform, statistics, tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import extract_ejar as E
+
+# ------------------------------
+# Synthetic fixtures
+# ------------------------------
+def make_contract(units: int = 1, installments: int = 4, lessors: int = 1,
+                  brokers: int = 1, seed: int = 7) -> str:
+    """ نص عقد إيجار بنفس ترتيب أقسام Ejar وبعض النصوص بصيغ Presentation Forms كما تخرج من pdfplumber. """
+    rnd = random.Random(seed)
+    L: List[str] = [
+        "Lease Contract Contract No. 10123456789/1 ﺪﻘﻌﻟا ﻢﻗر",
+        "Tenancy Start Date 2024-01-01 ﺪﻘﻌﻟا ﺔﻳاﺪﺑ",
+        f"Tenancy End Date {2024 + max(1, installments // 12)}-12-31 ﺪﻘﻌﻟا ﺔﻳﺎﻬﻧ",
+        "Lessor Data ﺮﺟﺆﻤﻟا تﺎﻧﺎﻴﺑ",
+    ]
+    for i in range(lessors):
+        L += [f"Name ﺪﻤﺤﻣ ﷲاﺪﺒﻋ {i} ﻢﺳﻻا",
+              "Nationality ﺔﻳدﻮﻌﺳ ﺔﻴﺴﻨﺠﻟا",
+              f"ID Type National ID ID No. 10{i:08d}",
+              f"Mobile No. +9665{i:08d} Email lessor{i}@example.com"]
+    L += ["Lessor Representative Data",
+          "Name ﺪﻟﺎﺧ ﺪﻤﺣأ ﻢﺳﻻا",
+          "ID No. 1099999999 Mobile No. +966500000001",
+          "Tenant Data ﺮﺟﺄﺘﺴﻤﻟا تﺎﻧﺎﻴﺑ",
+          "Company Name ﺔﻛﺮﺷ ءﺎﻨﺒﻟا ةدوﺪﺤﻤﻟا",
+          "Unified No. 7001234567 CR No. 1010101010 Issue Date 2015-05-05",
+          "Name ﺪﻌﺳ ﺮﻤﻋ ﻢﺳﻻا",
+          "Nationality ﺔﻳدﻮﻌﺳ",
+          "ID No. 1088888888 Mobile No. +966511111111 Email t@example.com",
+          "Tenant Representative Data",
+          "Name ﻲﻠﻋ ﻦﺴﺣ",
+          "ID No. 1077777777 Mobile No. +966522222222",
+          "Brokerage Entity and Broker Data",
+          "Brokerage Entity Name ﺐﺘﻜﻣ ﺔﻃﺎﺳﻮﻟا ةﺄﺸﻨﻣ ﻢﺳا",
+          "Brokerage Entity Address ضﺎﻳﺮﻟا ﻲﺣ",
+          "CR No. 4030303030 Landline No. 0112223333 Fax No. 0112224444"]
+    for i in range(brokers):
+        L += [f"Broker Name ﺪﻬﻓ ﺮﺻﺎﻧ {i}",
+              f"ID No. 10555{i:05d} Mobile No. +96655{i:07d}"]
+    L += ["Title Deeds Data",
+          "Title Deed No. 310105012345 Issuer ﺔﻟﺪﻌﻟا ةرازو راﺪﺻﻹا ﺔﻬﺟ",
+          "Place of Issue ضﺎﻳﺮﻟا Issue Date 1440-01-01",
+          "Property Data",
+          "National Address RRRD1234 ٢٣٤٥ 6789",
+          "Property Usage دارﻓأ ﻦﻜﺳ" if units == 1 else "Property Usage يرﺎﺠﺗ",
+          "Property Type ةرﺎﻤﻋ",
+          f"Number of Units {units} Number of Floors {max(1, units // 10)}",
+          "Number of Parking Lots 10 Number of Elevators 2",
+          f"Number of Electricity Meters {units} Number of Water Meters 1 Number of Gas Meters 0",
+          "Rental Units Data"]
+    for i in range(units):
+        L += [f"Unit No. {100 + i} Unit Type {'ﺔﻘﺷ' if i % 4 else 'ضرﻌﻣ'}",
+              f"Unit Area {rnd.randint(50, 300)}.5 Floor No. {i % 10}",
+              f"Electricity Meter No. EM{i:06d} Electricity Account No. EA{i:06d}",
+              f"Water Meter No. WM{i:06d} Water Account No. WA{i:06d}",
+              f"Gas Meter No. GM{i:06d} A.C. Type Split"]
+    annual = 60000 * max(1, units // 5)
+    L += ["Financial Data",
+          f"Annual Rent {annual:,}.00 ﻱﻮﻨﺴﻟا رﺎﺠﻳﻹا",
+          f"Total Contract Value {annual * max(1, installments // 12):,}.00",
+          "VAT Value 0.00",
+          "Rent Payments Schedule"]
+    amount = annual * max(1, installments // 12) / installments
+    for i in range(installments):
+        y, m = 2024 + i // 12, i % 12 + 1
+        L.append(f"{amount:.2f} {1445 + i // 12}-{m:02d}-01 {y}-{m:02d}-01 {i + 1}")
+    L += ["Terms and Conditions", "The parties agree to the following terms. " * 10]
+    return "\n".join(L)
+
+FIXTURES: Dict[str, Callable[[], str]] = {
+    "residential_1_unit":    lambda: make_contract(units=1, installments=2),
+    "commercial_200_units":  lambda: make_contract(units=200, installments=12, lessors=3, brokers=2),
+    "monthly_120_payments":  lambda: make_contract(units=2, installments=120),
+}
+
+# ------------------------------
+# Stages
+# ------------------------------
+def _prepare(text: str) -> Dict[str, Any]:
+    doc = E.EjarDocument(text)
+    spans = E.find_spans(doc.raw)
+    blocks = {k: doc.slice(*spans[k]) if k in spans else ("", "") for k in E.SECTION_KEYS}
+    return {"doc": doc, "blocks": blocks}
+
+def _result_tree(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    b = ctx["blocks"]
+    return {
+        **E.extract_basic(ctx["doc"].raw, ctx["doc"].digits),
+        "lessors": E.extract_party_people(*b["lessor"]),
+        "property": E.extract_property(*b["property"]),
+        "units": E.extract_units(*b["units"]),
+        **E.extract_payments(*b["payments"]),
+    }
+
+STAGES: Dict[str, Callable[[Dict[str, Any]], Callable[[], Any]]] = {
+    "find_spans":           lambda c: lambda: E.find_spans(c["doc"].raw),
+    "document":             lambda c: lambda: E.EjarDocument(c["doc"].raw),
+    "extract_basic":        lambda c: lambda: E.extract_basic(c["doc"].raw, c["doc"].digits),
+    "extract_party_people": lambda c: lambda: E.extract_party_people(*c["blocks"]["lessor"]),
+    "extract_brokerage":    lambda c: lambda: E.extract_brokerage(*c["blocks"]["brokerage"]),
+    "extract_property":     lambda c: lambda: E.extract_property(*c["blocks"]["property"]),
+    "extract_units":        lambda c: lambda: E.extract_units(*c["blocks"]["units"]),
+    "extract_payments":     lambda c: lambda: E.extract_payments(*c["blocks"]["payments"]),
+    "walk_and_fix_arabic":  lambda c: (lambda tree: lambda: E.walk_and_fix_arabic(tree, shape=False))(_result_tree(c)),
+}
+
+# ------------------------------
+# Measurement
+# ------------------------------
+def time_call(fn: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, float]:
+    """ أفضل/وسيط زمن الاستدعاء الواحد (µs)؛ كل تكرار يشغّل الدالة بعدد يكفي لـ min_time ثانية. """
+    fn()  # إحماء (تحميل القواعد، تعبئة الكاش الداخلي لـ re ...)
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time:
+            break
+        number *= 2
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t0) / number)
+    return {"best_us": min(samples) * 1e6, "median_us": statistics.median(samples) * 1e6,
+            "loops": number}
+
+def measure_alloc(fn: Callable[[], Any]) -> Dict[str, int]:
+    """ ذروة الذاكرة المخصصة أثناء استدعاء واحد وعدد الكتل التي بقيت بعده (tracemalloc). """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    diff = after.compare_to(before, "filename")
+    del result
+    return {"peak_bytes": peak - base,
+            "retained_blocks": sum(max(d.count_diff, 0) for d in diff)}
+
+def run(fixtures: List[str], stages: List[str], repeat: int, min_time: float) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for fx in fixtures:
+        text = FIXTURES[fx]()
+        ctx = _prepare(text)
+        for st in stages:
+            fn = STAGES[st](ctx)
+            row = time_call(fn, repeat, min_time)
+            row.update(measure_alloc(fn))
+            row["text_chars"] = len(text)
+            results[f"{fx}/{st}"] = row
+    return {
+        "meta": {
+            "rules_version": E.RULES.version,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+def print_table(report: Dict[str, Any], baseline: Dict[str, Any] = None) -> None:
+    base = (baseline or {}).get("results", {})
+    head = f"{'stage':<46}{'best µs':>12}{'median µs':>12}{'peak KiB':>11}"
+    if base:
+        head += f"{'vs base':>10}"
+    print(head)
+    print("-" * len(head))
+    for name, row in report["results"].items():
+        line = (f"{name:<46}{row['best_us']:>12.1f}{row['median_us']:>12.1f}"
+                f"{row['peak_bytes'] / 1024:>11.1f}")
+        if base:
+            ref = base.get(name)
+            line += f"{row['best_us'] / ref['best_us']:>9.2f}x" if ref else f"{'new':>10}"
+        print(line)
+    if baseline:
+        print(f"\nbaseline rules {baseline['meta'].get('rules_version')} → "
+              f"current rules {report['meta']['rules_version']}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the Ejar extraction stages.")
+    parser.add_argument("--fixture", action="append", choices=sorted(FIXTURES),
+                        help="نموذج محدد (يمكن تكراره)؛ الإفتراضي كل النماذج.")
+    parser.add_argument("--stage", action="append", choices=sorted(STAGES),
+                        help="مرحلة محددة (يمكن تكرارها)؛ الإفتراضي كل المراحل.")
+    parser.add_argument("--repeat", type=int, default=5, help="عدد التكرارات لكل قياس.")
+    parser.add_argument("--min-time", type=float, default=0.05, help="أقل زمن (ثانية) لكل تكرار.")
+    parser.add_argument("--json", default=None, help="حفظ النتائج في ملف JSON.")
+    parser.add_argument("--compare", default=None, help="ملف JSON من تشغيل سابق للمقارنة.")
+    args = parser.parse_args()
+
+    report = run(args.fixture or list(FIXTURES), args.stage or list(STAGES), args.repeat, args.min_time)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_table(report, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n[OK] benchmark saved -> {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+قياس زمن استيراد extract_ejar في مفسّر جديد (python -X importtime) وفرض ميزانية له.
+مسار Node القديم يشغّل عملية جديدة لكل ملف، فزمن الاستيراد جزء من زمن كل طلب.
+
+    python extract/check_import_time.py                  # فحص الميزانية (exit 1 عند التجاوز)
+    python extract/check_import_time.py --budget-ms 80 --top 15
+    python extract/check_import_time.py --json importtime.json
+"""
+from __future__ import annotations
+import os, sys, json, argparse, statistics, subprocess
+from typing import Any, Dict, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# حد زمن الاستيراد التراكمي (الوسيط) بالمللي ثانية؛ ≈ ضعف القياس الحالي حتى لا يفشل على أجهزة أبطأ،
+# وأقل بكثير من كلفة pdfplumber وحده (~150ms) فيُكشف أي استيراد ثقيل يعود لأعلى الملف.
+DEFAULT_BUDGET_MS = float(os.environ.get("EJAR_IMPORT_BUDGET_MS", "100"))
+
+# مكتبات يجب ألا تُحمَّل عند import extract_ejar (تُستورد عند أول استخدام عبر _lazy_import)
+FORBIDDEN = ("pdfplumber", "pdfminer", "pypdfium2", "numpy", "arabic_reshaper")
+
+# ------------------------------
+# Measurement
+# ------------------------------
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """ أسطر "import time: self | cumulative | name" → [(name, self_us, cumulative_us, depth)]. """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # سطر العناوين
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(parts[0]), int(parts[1]), depth))
+    return rows
+
+def _child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    # القياس يمثل النشر الفعلي: ملفات .pyc موجودة (وإلا يدخل زمن ترجمة المصدر في القياس)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    env.pop("PYTHONPROFILEIMPORTTIME", None)
+    return env
+
+def import_once(module: str, python: str) -> List[Tuple[str, int, int, int]]:
+    proc = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=HERE, env=_child_env(), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"[ERROR] import {module} failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+def measure(module: str, runs: int, python: str) -> Dict[str, Any]:
+    import_once(module, python)  # تسخين: كتابة .pyc وملء كاش نظام الملفات
+    totals: List[int] = []
+    last: List[Tuple[str, int, int, int]] = []
+    for _ in range(runs):
+        rows = import_once(module, python)
+        total = next((cum for name, _, cum, depth in rows if name == module and depth == 0), None)
+        if total is None:
+            raise SystemExit(f"[ERROR] {module} not found in -X importtime output")
+        totals.append(total)
+        last = rows
+    loaded = {name.split(".")[0] for name, *_ in last}
+    return {
+        "module": module,
+        "python": python,
+        "runs": runs,
+        "median_ms": round(statistics.median(totals) / 1000, 2),
+        "best_ms": round(min(totals) / 1000, 2),
+        "self_ms": round(next(s for n, s, _, d in last if n == module and d == 0) / 1000, 2),
+        "forbidden_loaded": sorted(m for m in FORBIDDEN if m in loaded),
+        "top_level": sorted(((n, round(c / 1000, 2)) for n, _, c, d in last if d == 1),
+                            key=lambda r: -r[1]),
+    }
+
+# ------------------------------
+# Report
+# ------------------------------
+def print_report(report: Dict[str, Any], budget_ms: float, top: int) -> None:
+    print(f"import {report['module']}: median {report['median_ms']:.1f} ms, best {report['best_ms']:.1f} ms "
+          f"({report['runs']} runs), module body {report['self_ms']:.1f} ms, budget {budget_ms:.0f} ms")
+    print(f"\n{'direct import':<28}{'cumulative ms':>14}")
+    print("-" * 42)
+    for name, ms in report["top_level"][:top]:
+        print(f"{name:<28}{ms:>14.2f}")
+    if report["forbidden_loaded"]:
+        print(f"\n[FAIL] heavy modules loaded at import: {', '.join(report['forbidden_loaded'])}")
+    if report["median_ms"] > budget_ms:
+        print(f"\n[FAIL] import time {report['median_ms']:.1f} ms exceeds budget {budget_ms:.0f} ms")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cold-start import time check for extract_ejar.")
+    parser.add_argument("--module", default="extract_ejar", help="الوحدة المقاسة (من مجلد هذا الملف).")
+    parser.add_argument("--runs", type=int, default=7, help="عدد المفسرات الجديدة المقاسة.")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="الحد الأعلى لوسيط زمن الاستيراد (EJAR_IMPORT_BUDGET_MS).")
+    parser.add_argument("--top", type=int, default=10, help="عدد الاستيرادات المباشرة المعروضة.")
+    parser.add_argument("--python", default=sys.executable, help="المفسر المستخدم (مثل PYTHON_BIN للعمّال).")
+    parser.add_argument("--json", default=None, help="حفظ القياس في ملف JSON.")
+    args = parser.parse_args()
+
+    report = measure(args.module, max(1, args.runs), args.python)
+    report["budget_ms"] = args.budget_ms
+    report["ok"] = not report["forbidden_loaded"] and report["median_ms"] <= args.budget_ms
+    print_report(report, args.budget_ms, args.top)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n[OK] report saved -> {args.json}")
+    sys.exit(0 if report["ok"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+فحوصات تكافؤ: المسارات السريعة في extract_ejar مقابل مرجعها البسيط على نماذج bench_extract (بدون PDF).
+
+    labels   LabelScanner.scan (مرور واحد) مقابل RULES[rule].search لكل حقل منفرداً
+    segments segment_spans للوحدات والوسطاء مقابل أنماط lazy + lookahead القديمة (الفرق الوحيد المسموح:
+             وحدة تتجاوز 600 حرف كان النمط القديم يسقطها)
+
+    python extract/check_parity.py                       # كل الفحوصات (exit 1 عند أي اختلاف)
+    python extract/check_parity.py --check labels --fuzz 5000 --seed 3
+"""
+from __future__ import annotations
+import os, re, sys, json, random, argparse
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import extract_ejar as E
+from bench_extract import FIXTURES, make_contract
+
+Mismatch = Dict[str, Any]
+
+def _blocks(text: str) -> Dict[str, Tuple[str, str]]:
+    doc = E.EjarDocument(text)
+    spans = E.find_spans(doc.raw)
+    return {k: doc.slice(*spans[k]) if k in spans else ("", "") for k in E.SECTION_KEYS}
+
+# ------------------------------
+# labels: LabelScanner vs per-rule search
+# ------------------------------
+# قواعد مستبدلة تختبر الحالتين اللتين لا تظهران في القواعد الإفتراضية:
+# tie: حقلان يطابقان في نفس الموضع، overlap: مرساة تبدأ داخل ظهور مرساة أخرى ("rty" داخل "property")
+LABEL_OVERRIDES: Dict[str, Dict[str, str]] = {
+    "default": {},
+    "tie": {"property.num_floors": r"(?i)Number\s*of\s*(?:Units|Floors)\s*(\d+)"},
+    "overlap": {"property.num_elevators": r"(?i)rty\s*Usage\s*(\S+)"},
+}
+
+def _label_cases(seed: int, fuzz: int) -> List[Tuple[str, str, str, int, Optional[int]]]:
+    """ (الاسم، مجموعة الحقول، النص، pos، endpos): كتل العقار والوحدات ومقاطع الوحدات، ثم نصوص عشوائية. """
+    cases = []
+    for name, make in FIXTURES.items():
+        blocks = _blocks(make())
+        prop, units = blocks["property"][0], blocks["units"][0]
+        cases.append((f"{name}/property", "property", prop, 0, None))
+        cases.append((f"{name}/units", "unit", units, 0, None))
+        for i, (m, end) in enumerate(E.segment_spans(units, E.RULES["unit.boundary"], E.RULES["unit.no"])):
+            cases.append((f"{name}/unit[{i}]", "unit", units, m.start(), end))
+    # أسطر العناوين مخلوطة ومكررة وأحياناً ملتصقة بلا فواصل (مواضع متجاورة ومتداخلة)
+    rnd = random.Random(seed)
+    lines = make_contract(units=4, brokers=0).splitlines()
+    for i in range(fuzz):
+        picked = rnd.sample(lines, rnd.randint(1, min(12, len(lines))))
+        picked += rnd.sample(picked, rnd.randint(0, len(picked)))
+        rnd.shuffle(picked)
+        text = rnd.choice(("\n", " ", "")).join(picked)
+        pos = rnd.randint(0, len(text) // 3)
+        cases.append((f"fuzz[{i}]", rnd.choice(("property", "unit")), text, pos, None))
+    return cases
+
+def check_labels(seed: int, fuzz: int) -> Tuple[int, List[Mismatch]]:
+    fields = {"property": E.PROPERTY_LABELS, "unit": E.UNIT_LABELS}
+    cases = _label_cases(seed, fuzz)
+    mismatches: List[Mismatch] = []
+    runs = 0
+    for variant, overrides in LABEL_OVERRIDES.items():
+        rules = E.RuleSet({**E.DEFAULT_RULES, **overrides}, f"check-{variant}")
+        scanners = {k: E.LabelScanner(rules, f) for k, f in fields.items()}
+        for name, group, raw, pos, endpos in cases:
+            digits = E.to_ascii_digits(raw)
+            end = len(raw) if endpos is None else endpos
+            got = scanners[group].scan(raw, digits, pos, endpos)
+            runs += 1
+            for field, (rule, src) in fields[group].items():
+                ref = rules[rule].search(digits if src == "digits" else raw, pos, end)
+                m = got.get(field)
+                a = (ref.span(), ref.groups()) if ref else None
+                b = (m.span(), m.groups()) if m else None
+                if a != b:
+                    mismatches.append({"check": "labels", "rules": variant, "case": name,
+                                       "field": field, "search": a, "scan": b})
+    return runs, mismatches
+
+# ------------------------------
+# segments: segment_spans vs the old lazy + lookahead patterns
+# ------------------------------
+# أنماط ما قبل segment_spans (RULESET_VERSION 2) كمرجع؛ الوحدات بحدها القديم 600 وبدونه
+OLD_BROKER_RE = re.compile(r"(?is)Broker\s*Name\s+(.+?)(?=Broker\s*Name|$)")
+OLD_UNIT_RE = re.compile(r"(?is)Unit\s*No\.?\s*([^\s:\n]+)([\s\S]{0,600}?)(?=Unit\s*No\.?|$)")
+UNCAPPED_UNIT_RE = re.compile(r"(?is)Unit\s*No\.?\s*([^\s:\n]+)([\s\S]*?)(?=Unit\s*No\.?|$)")
+
+def _segment_cases(seed: int, fuzz: int) -> List[Tuple[str, str]]:
+    """ (الاسم، النص): كتل الوحدات والوساطة من النماذج، وحدة أطول من 600 حرف، ثم أسطر مخلوطة ومكررة. """
+    cases = []
+    for name, make in FIXTURES.items():
+        blocks = _blocks(make())
+        cases.append((f"{name}/units", blocks["units"][0]))
+        cases.append((f"{name}/brokerage", blocks["brokerage"][0]))
+    lines = make_contract(units=4, brokers=4).splitlines()
+    units = [l for l in lines if l.startswith(("Unit", "Electricity", "Water", "Gas"))]
+    brokers = [l for l in lines if "Broker" in l or l.startswith(("ID No", "CR No"))]
+    cases.append(("long_unit", "\n".join(units[:5] + units[1:5] * 6 + units[5:])))
+    # حدود ملتصقة ومكررة وبلا قيمة، ونص ينتهي بسطر جديد أو مسافة
+    extra = ["Broker Name", "Broker Name ", "BrokerName", "Unit No.", "Unit No", "Name x", " ", "\n"]
+    rnd = random.Random(seed)
+    for i in range(fuzz):
+        src = rnd.choice((units, brokers))
+        picked = rnd.sample(src, rnd.randint(1, min(10, len(src))))
+        picked += rnd.sample(picked, rnd.randint(0, len(picked)))
+        picked += [rnd.choice(extra) for _ in range(rnd.randint(0, 3))]
+        rnd.shuffle(picked)
+        cases.append((f"fuzz[{i}]", rnd.choice(("\n", " ", "")).join(picked) + rnd.choice(("", "\n", " "))))
+    return cases
+
+def _unit_rows(block: str, digits: str, spans: List[Tuple[int, int, str]]) -> List[Any]:
+    rows = []
+    for start, end, no in spans:
+        found = E.scan_unit(block, digits, start, end)
+        rows.append((no, sorted((k, m.groups()) for k, m in found.items())))
+    return rows
+
+def _broker_cards(block: str, digits: str, spans: List[Tuple[int, int]]) -> List[Dict[str, str]]:
+    cards = (E.parse_person_card("Name " + block[a:b], "Name " + digits[a:b]) for a, b in spans)
+    return [c for c in cards if any(c.values())]
+
+def check_segments(seed: int, fuzz: int) -> Tuple[int, List[Mismatch]]:
+    """ يقارن ما يصل لـ scan_unit وparse_person_card (لا المواضع: $ القديم يقف قبل سطر جديد أخير). """
+    mismatches: List[Mismatch] = []
+    runs = 0
+    for name, block in _segment_cases(seed, fuzz):
+        digits = E.to_ascii_digits(block)
+        runs += 1
+        # الوحدات: segment_spans = النمط القديم بلا حد، ويساوي القديم بحده ما لم تتجاوز وحدة 600 حرف
+        uncapped = list(UNCAPPED_UNIT_RE.finditer(block))
+        ref = _unit_rows(block, digits, [(m.start(), m.end(), m.group(1)) for m in uncapped])
+        got = _unit_rows(block, digits, [(m.start(), end, m.group(1)) for m, end in
+                                         E.segment_spans(block, E.RULES["unit.boundary"], E.RULES["unit.no"])])
+        if got != ref:
+            mismatches.append({"check": "segments", "case": name, "what": "units",
+                               "old": ref, "new": got})
+        if not any(len(m.group(2)) > 600 for m in uncapped):
+            old = _unit_rows(block, digits, [(m.start(), m.end(), m.group(1)) for m in OLD_UNIT_RE.finditer(block)])
+            if old != ref:
+                mismatches.append({"check": "segments", "case": name, "what": "units<=600",
+                                   "old": old, "new": ref})
+        # الوسطاء: نفس البطاقات
+        ref = _broker_cards(block, digits, [m.span(1) for m in OLD_BROKER_RE.finditer(block)])
+        got = _broker_cards(block, digits, [(m.end(), end) for m, end in E.segment_spans(
+            block, E.RULES["brokerage.broker_boundary"], E.RULES["brokerage.broker_start"], nonempty=True)])
+        if got != ref:
+            mismatches.append({"check": "segments", "case": name, "what": "brokers",
+                               "old": ref, "new": got})
+    return runs, mismatches
+
+# ------------------------------
+# Runner
+# ------------------------------
+CHECKS: Dict[str, Callable[[int, int], Tuple[int, List[Mismatch]]]] = {
+    "labels": check_labels,
+    "segments": check_segments,
+}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Parity checks of the fast extraction paths.")
+    parser.add_argument("--check", action="append", choices=sorted(CHECKS),
+                        help="فحص محدد (يمكن تكراره)؛ الإفتراضي كل الفحوصات.")
+    parser.add_argument("--fuzz", type=int, default=2000, help="عدد النصوص العشوائية لكل فحص.")
+    parser.add_argument("--seed", type=int, default=7, help="بذرة النصوص العشوائية.")
+    parser.add_argument("--show", type=int, default=10, help="عدد الاختلافات المعروضة لكل فحص.")
+    args = parser.parse_args()
+
+    ok = True
+    for name in args.check or list(CHECKS):
+        runs, mismatches = CHECKS[name](args.seed, args.fuzz)
+        if mismatches:
+            ok = False
+            print(f"[FAIL] {name}: {len(mismatches)} mismatches in {runs} runs")
+            for m in mismatches[:args.show]:
+                print("   ", json.dumps(m, ensure_ascii=False))
+        else:
+            print(f"[OK] {name}: {runs} runs, no mismatches")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+مقارنة محركات استخراج النص على مجموعة عقود: السرعة (صفحات/ثانية) والفروقات على مستوى حقول extract_all.
+
+    python extract/compare_engines.py contracts/ --engines pdfplumber,pdfminer,pypdfium2
+    python extract/compare_engines.py "archive/**/*.pdf" --json engines.json
+"""
+from __future__ import annotations
+import os, re, sys, json, time, argparse
+from collections import Counter
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import extract_ejar as E
+
+INDEX_RE = re.compile(r"\[\d+\]")
+
+def flatten(x: Any, prefix: str = "") -> Dict[str, Any]:
+    """ {"units[0].unit_no": ...}: مسار لكل قيمة نهائية حتى تُقارن الحقول واحداً واحداً. """
+    out: Dict[str, Any] = {}
+    if isinstance(x, dict):
+        for k, v in x.items():
+            out.update(flatten(v, f"{prefix}.{k}" if prefix else str(k)))
+    elif isinstance(x, list):
+        for i, v in enumerate(x):
+            out.update(flatten(v, f"{prefix}[{i}]"))
+        if not x:
+            out[prefix] = []
+    else:
+        out[prefix] = x
+    return out
+
+def run_engine(engine: str, pdfs: List[str]) -> Dict[str, Any]:
+    files: Dict[str, Any] = {}
+    total = pages = text_s = 0.0
+    for path in pdfs:
+        timer = E.StageTimer()
+        t0 = time.perf_counter()
+        try:
+            data, _ = E.extract_all(path, timer=timer, engine=engine)
+        except Exception as e:
+            files[path] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+        total += time.perf_counter() - t0
+        text_s += timer.stages.get("text_extraction", 0.0)
+        pages += timer.pages or 0
+        files[path] = {"fields": flatten(data)}
+    return {"engine": engine, "files": files, "seconds": total,
+            "text_seconds": text_s, "pages": int(pages)}
+
+def diff_fields(ref: Dict[str, Any], other: Dict[str, Any]) -> List[str]:
+    return sorted(k for k in set(ref) | set(other) if ref.get(k) != other.get(k))
+
+def compare(pdfs: List[str], engines: List[str], reference: str) -> Dict[str, Any]:
+    runs = {e: run_engine(e, pdfs) for e in engines}
+    ref = runs[reference]
+    report: Dict[str, Any] = {"reference": reference, "files": len(pdfs), "engines": {}}
+    for name, run in runs.items():
+        field_diffs: Counter = Counter()
+        per_file: Dict[str, List[str]] = {}
+        compared = equal_fields = 0
+        for path in pdfs:
+            a, b = ref["files"].get(path, {}), run["files"].get(path, {})
+            if "fields" not in a or "fields" not in b:
+                continue
+            diffs = diff_fields(a["fields"], b["fields"])
+            compared += len(set(a["fields"]) | set(b["fields"]))
+            equal_fields += len(set(a["fields"]) | set(b["fields"])) - len(diffs)
+            if diffs:
+                per_file[path] = diffs
+                # units[3].unit_no → units[].unit_no حتى تُجمع الفروقات حسب نوع الحقل
+                field_diffs.update({_generic(k) for k in diffs})
+        report["engines"][name] = {
+            "seconds": round(run["seconds"], 3),
+            "text_seconds": round(run["text_seconds"], 3),
+            "pages": run["pages"],
+            "pages_per_sec": round(run["pages"] / run["seconds"], 2) if run["seconds"] else None,
+            "speedup_vs_reference": round(ref["seconds"] / run["seconds"], 2) if run["seconds"] else None,
+            "errors": {p: f["error"] for p, f in run["files"].items() if "error" in f},
+            "field_agreement": round(equal_fields / compared, 4) if compared else None,
+            "files_with_diffs": len(per_file),
+            "top_field_diffs": field_diffs.most_common(15),
+            "diffs": per_file,
+        }
+    return report
+
+def _generic(path: str) -> str:
+    return INDEX_RE.sub("[]", path)
+
+def available_engines() -> List[str]:
+    names = []
+    for name, cls in E.TEXT_ENGINES.items():
+        try:
+            __import__(cls.requires)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{report['files']} files, reference engine: {report['reference']}\n")
+    head = f"{'engine':<12}{'pages/s':>10}{'text s':>10}{'total s':>10}{'speedup':>9}{'fields ==':>11}{'files ≠':>9}{'errors':>8}"
+    print(head)
+    print("-" * len(head))
+    for name, r in report["engines"].items():
+        agree = f"{r['field_agreement'] * 100:.1f}%" if r["field_agreement"] is not None else "-"
+        print(f"{name:<12}{r['pages_per_sec'] or 0:>10.1f}{r['text_seconds']:>10.2f}{r['seconds']:>10.2f}"
+              f"{r['speedup_vs_reference'] or 0:>8.2f}x{agree:>11}{r['files_with_diffs']:>9}{len(r['errors']):>8}")
+    for name, r in report["engines"].items():
+        if name == report["reference"] or not r["top_field_diffs"]:
+            continue
+        print(f"\n{name}: most frequent field differences")
+        for field, n in r["top_field_diffs"]:
+            print(f"  {n:>5}  {field}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare PDF text engines on a corpus of Ejar contracts.")
+    parser.add_argument("inputs", nargs="+", metavar="PATH_OR_GLOB", help="ملفات أو مجلدات أو أنماط glob.")
+    parser.add_argument("--engines", default=None,
+                        help="محركات مفصولة بفواصل؛ الإفتراضي كل المحركات المثبتة.")
+    parser.add_argument("--reference", default=E.DEFAULT_TEXT_ENGINE, help="المحرك المرجعي للمقارنة.")
+    parser.add_argument("--json", default=None, help="حفظ التقرير كاملاً (مع الحقول المختلفة لكل ملف).")
+    args = parser.parse_args()
+
+    engines = [e.strip() for e in args.engines.split(",")] if args.engines else available_engines()
+    for e in engines:
+        E.resolve_engine(e)
+    if args.reference not in engines:
+        engines.insert(0, args.reference)
+    pdfs = E.collect_pdfs(args.inputs)
+    if not pdfs:
+        raise SystemExit("[ERROR] no PDF files found")
+
+    report = compare(pdfs, engines, args.reference)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n[OK] report saved -> {args.json}")
+
+if __name__ == "__main__":
+    main()
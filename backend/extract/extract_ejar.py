@@ -1,21 +1,54 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import os, re, json, argparse, unicodedata
-from typing import List, Dict, Any, Tuple, Optional
+import os, io, re, sys, json, glob, gzip, time, mmap, base64, argparse, unicodedata, hashlib, tempfile, threading, importlib, queue
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from contextlib import contextmanager
+from typing import List, Dict, Any, Tuple, Optional, Union, BinaryIO
 from datetime import datetime
-import pdfplumber
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# ------------------------------
+# Lazy imports
+# ------------------------------
+# المكتبات الثقيلة (pdfplumber ≈ 150ms) تُستورد عند أول استخدام فقط: نتيجة من الكاش
+# أو --help أو --serve قبل أول مهمة لا تدفع كلفتها. راجع check_import_time.py.
+_LAZY_MODULES: Dict[str, Any] = {}
+
+def _lazy_import(name: str, optional: bool=False):
+    """ استيراد name مرة واحدة؛ optional → None إن لم تكن المكتبة مثبتة (بدون إعادة المحاولة). """
+    mod = _LAZY_MODULES.get(name)
+    if mod is None:
+        try:
+            mod = importlib.import_module(name)
+        except ImportError:
+            if not optional:
+                raise
+            mod = False
+        _LAZY_MODULES[name] = mod
+    return mod or None
 
 # ------------------------------
 # Helpers
 # ------------------------------
 AR_NUMS = str.maketrans("٠١٢٣٤٥٦٧٨٩", "0123456789")
 ARABIC_CHARS = re.compile(r"[\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFF]")
+ARABIC_LETTER = re.compile(r"[\u0600-\u06FF]")
+SPACES_RE = re.compile(r"[ \t\u200f\u200e]+")
+WS_RE = re.compile(r"\s+")
+DIGITS_RE = re.compile(r"\d+")
+ISO_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+TRAILING_COLON_RE = re.compile(r"\s*[:：]\s*$")
+ALLAH_BEFORE_RE = re.compile(r'(الله)([^\s])')
+ALLAH_AFTER_RE = re.compile(r'([^\s])(الله)')
+AL_JOINED_RE = re.compile(r'([^\s])(ال)([^\s])')
 
 def to_ascii_digits(s: str) -> str:
     return (s or "").translate(AR_NUMS)
 
 def norm_space(s: str) -> str:
-    return re.sub(r"[ \t\u200f\u200e]+", " ", s or "").strip()
+    return SPACES_RE.sub(" ", s or "").strip()
 
 def parse_date_any(s: str) -> Optional[str]:
     if not s: return None
@@ -24,23 +57,591 @@ def parse_date_any(s: str) -> Optional[str]:
         try:
             return datetime.strptime(s, f).strftime("%Y-%m-%d")
         except: pass
-    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", s): return s
+    if ISO_DATE_RE.fullmatch(s): return s
     return None
 
-def extract_text(pdf_path: str) -> Tuple[str, List[str]]:
-    pages_text = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for p in pdf.pages:
+# ------------------------------
+# Normalized document
+# ------------------------------
+class EjarDocument:
+    """
+    نص العقد يُحضّر مرة واحدة بصورتين متطابقتي المواضع: raw كما استُخرج، وdigits بأرقام ASCII.
+    المستخرجات تأخذ شرائح من هذه الصور بدل إعادة تحويل كل مقطع.
+    """
+    __slots__ = ("raw", "digits", "pages")
+
+    def __init__(self, raw: str, pages: Optional[List[str]]=None):
+        self.raw = raw or ""
+        self.digits = to_ascii_digits(self.raw)
+        self.pages = pages
+
+    def slice(self, start: int, end: int) -> Tuple[str, str]:
+        """ (raw, digits) لنفس المدى. """
+        return self.raw[start:end], self.digits[start:end]
+
+# ------------------------------
+# Field rules registry
+# ------------------------------
+# كل قواعد الحقول في مكان واحد: الاسم → نمط (الأعلام تُكتب داخل النمط مثل (?i)).
+# كل نمط يُترجم عند أول استخدام ثم يُحفظ، ويمكن استبدال أي قاعدة من ملف JSON (EJAR_RULES_FILE) وإعادة تحميله أثناء التشغيل.
+# ارفع RULESET_VERSION عند تعديل أي قاعدة هنا → تُبطل النتائج المخزنة تلقائياً.
+RULESET_VERSION = "4"
+
+DEFAULT_RULES: Dict[str, str] = {
+    # Section headers
+    "section.lessor":      r"(?i)(?:Lessor\s*Data)",
+    "section.lessor_rep":  r"(?i)(?:Lessor\s*Representative\s*Data)",
+    "section.tenant":      r"(?i)(?:Tenant\s*Data)",
+    "section.tenant_rep":  r"(?i)(?:Tenant\s*Representative\s*Data)",
+    "section.brokerage":   r"(?i)(?:Brokerage\s*Entity.*?Data)",
+    "section.titles":      r"(?i)(?:Title\s*Deeds?\s*Data)",
+    "section.property":    r"(?i)(?:Property\s*Data)",
+    "section.units":       r"(?i)(?:Rental\s*Units?\s*Data)",
+    "section.financial":   r"(?i)(?:Financial\s*Data)",
+    "section.payments":    r"(?i)(?:Rent\s*Payments?\s*Schedule)",
+
+    # Basic fields
+    "basic.contract_no":          r"(?i)Contract\s+No\.?\s*([^\s/]+(?:/\S+)?)",
+    "basic.annual_rent":          r"(?i)Annual\s*Rent[:：]?\s*([0-9\.,]+)",
+    "basic.total_contract_value": r"(?i)Total\s*Contract\s*Value[:：]?\s*([0-9\.,]+)",
+    "basic.tenancy_range_en":     r"(?i)Tenancy\s*Start\s*Date\s*[:：]?\s*([0-9/\-]+)[\s\S]{0,100}?(?:Tenancy\s*End\s*Date\s*[:：]?\s*([0-9/\-]+))",
+    "basic.tenancy_range_ar":     r"(?i)بداية\s*العقد\s*[:：]?\s*([0-9/\-]+)[\s\S]{0,100}?(?:نهاية|انتهاء)\s*العقد\s*[:：]?\s*([0-9/\-]+)",
+    "basic.tenancy_start_en":     r"(?i)Tenancy\s*Start\s*Date\s*[:：]?\s*([0-9/\-]+)",
+    "basic.tenancy_end_en":       r"(?i)Tenancy\s*End\s*Date\s*[:：]?\s*([0-9/\-]+)",
+    "basic.tenancy_start_ar":     r"بداية\s*العقد\s*[:：]?\s*([0-9/\-]+)",
+    "basic.tenancy_end_ar":       r"(?:نهاية|انتهاء)\s*العقد\s*[:：]?\s*([0-9/\-]+)",
+
+    # Template profile markers (تُبحث في رأس النص فقط، انظر template_fingerprint)
+    "profile.en_start": r"(?i)Tenancy\s*Start\s*Date",
+    "profile.en_end":   r"(?i)Tenancy\s*End\s*Date",
+    "profile.ar_dates": r"بداية\s*العقد",
+
+    # People cards
+    "people.card_start":        r"(?m)^Name\s+",
+    "people.name":              r"(?m)^Name\s+(.+?)\s*$",
+    "people.name_label_suffix": r"\s*[:：]?\s*(?:ﻢﺳﻻا|الاسم)\s*$",
+    "people.id":                r"ID\s*No\.?\s*([0-9]+)",
+    "people.phone":             r"(?i)Mobile\s*No\.?\s*([+\d][\d\s\-+]*)",
+    "people.email":             r"(?i)Email\s+([^\s:]+@[^\s:]+)",
+    "people.nationality":       r"(?i)(?:الجنسية|Nationality|ﺔﻴ\S*ﻟا)\s*[:：]?\s*([^\n:]+)",
+    "people.nationality_stop":  r"(?:ID|Type|No\.|\bNationality\b|Email|Mobile)",
+    "people.nationality_label": r"(?:الجنسية|Nationality|ﺔﻴ\S*ﻟا)",
+    "people.nationality_label_word": r"(?:الجنسية|Nationality|ﺔﻴ\S*ﻟا)\b",
+    "people.nationality_label_only": r"(?:الجنسية|Nationality|ﺔ\S*ﻟا)",
+
+    # Company header
+    "company.name":          r"(?mi)^(?:Tenant|Lessee|Company|Entity|Establishment)\s*Name\s*[:：]?\s*(.+?)$",
+    "company.name_fallback": r"(?mi)^Name\s+(.+?)$",
+    "company.unified_no":    r"\bUnified\s*(?:No\.?|Number)\s*([0-9]+)\b",
+    "company.cr_no":         r"\bCR\s*No\.?\s*([0-9]+)\b",
+    "company.issue_date":    r"\bIssue\s*Date\s*([0-9/\-]+)\b",
+
+    # Brokerage
+    "brokerage.entity_name":    r"(?i)Brokerage\s*Entity\s*Name\s*[:：]?\s*(.+)",
+    "brokerage.entity_address": r"(?i)Brokerage\s*Entity\s*Address\s*[:：]?\s*(.+)",
+    "brokerage.name_label":     r"(?i)(?:اسم\s*منش[اأإآ](?:ة|ﺔ)?\s*الوساطة\s*العقارية|ﺔﻳرﺎﻘﻌﻟا\s*ﺔﻃﺎﺳﻮﻟا\s*ةﺄﺸﻨﻣ\s*ﻢﺳا)\s*[:：]?\s*",
+    "brokerage.address_label":  r"(?i)(?:عنوان\s*منش[اأإآ](?:ة|ﺔ)?\s*الوساطة\s*العقارية|ﺔﻳرﺎﻘﻌﻟا\s*ﺔﻃﺎﺳﻮﻟا\s*ةﺄﺸﻨﻣ\s*ناﻮﻨﻋ)\s*[:：]?\s*",
+    "brokerage.cr_no":          r"\bCR\s*No\.?\s*([0-9]+)",
+    "brokerage.landline":       r"(?i)Landline\s*No\.?\s*[:：]?\s*([0-9\-\s]+)",
+    "brokerage.fax":            r"(?i)Fax\s*No\.?\s*[:：]?\s*([0-9\-\s]+)",
+    "brokerage.broker_boundary": r"(?i)Broker\s*Name",
+    "brokerage.broker_start":   r"(?i)Broker\s*Name\s+",
+    "brokerage.broker_label":   (r"(?i)^\s*(?:"
+                                 r"الممثل\s*(?:النظامي|الرسمي)\s*(?:للمنشأة|لمنشأة\s*الوساطة\s*العقارية)?"
+                                 r"|اسم\s*الموظف|الموظف|Employee\s*Name|Name|اسم"
+                                 r")\s*[:：]?\s*"),
+    "brokerage.la_word":        r"\bلا\b",
+
+    # Property
+    "property.national_address":  r"(?i)National\s*Address\s*[:：]?\s*(.+)",
+    "property.usage":             r"(?i)Property\s*Usage\s*[:：]?\s*([^\n:]+)",
+    "property.type":              r"(?i)Property\s*Type\s*[:：]?\s*([^\n:]+)",
+    "property.num_units":         r"(?i)Number\s*of\s*Units\s*[:：]?\s*([0-9]+)",
+    "property.num_floors":        r"(?i)Number\s*of\s*Floors\s*[:：]?\s*([0-9]+)",
+    "property.num_parking":       r"(?i)(?:Number\s*of\s*Parking(?:\s*Lots)?)\s*[:：]?\s*([0-9]+)",
+    "property.num_elevators":     r"(?i)(?:Number\s*of\s*Elevators?)\s*[:：]?\s*([0-9]+)",
+    "property.electricity_meters_count": r"(?i)Number\s*of\s*Electricity\s*Meters?\s*[:：]?\s*([0-9]+)",
+    "property.water_meters_count":       r"(?i)Number\s*of\s*Water\s*Meters?\s*[:：]?\s*([0-9]+)",
+    "property.gas_meters_count":         r"(?i)Number\s*of\s*Gas\s*Meters?\s*[:：]?\s*([0-9]+)",
+
+    # Title deeds
+    "titles.deed_no":      r"(?i)\bTitle\s*Deed\s*No\.?\s*[:：]?\s*([0-9\-]+)\b",
+    "titles.issuer":       r"(?is)\bIssuer\s*[:：]?\s*(.+?)(?=\s*(?:Title\s*Deed|Place\s*of\s*Issue|Issue\s*Date|$))",
+    "titles.issuer_label": r"(?:جهة\s*الإصدار|راﺪﺻﻹا\s*ﺔﻬﺟ)\s*[:：]?\s*",
+    "titles.place":        r"(?is)\bPlace\s*of\s*Issue\s*[:：]?\s*(.+?)(?=\s*(?:Issuer|Title\s*Deed|Issue\s*Date|$))",
+    "titles.place_label":  r"(?:مكان\s*الإصدار|راﺪﺻﻹا\s*نﺎﻜﻣ)\s*[:：]?\s*",
+    "titles.issue_date":   r"(?i)\bIssue\s*Date\s*[:：]?\s*([0-9/\-]+)",
+
+    # Units
+    "unit.boundary": r"(?i)Unit\s*No\.?",
+    "unit.no":      r"(?i)Unit\s*No\.?\s*([^\s:\n]+)",
+    "unit.type":    r"(?i)Unit\s*Type\s*([^\n:]+)",
+    "unit.area":    r"(?i)Unit\s*Area\s*([0-9\.,]+)",
+    "unit.electricity_account_no": r"(?i)Electricity\s*(?:Account|Acc(?:ount)?)\s*No\.?\s*([A-Za-z0-9\-]+)",
+    "unit.electricity_meter_no":   r"(?i)Electricity\s*Meter\s*No\.?\s*([A-Za-z0-9\-]+)",
+    "unit.water_account_no":       r"(?i)Water\s*(?:Account|Acc(?:ount)?)\s*No\.?\s*([A-Za-z0-9\-]+)",
+    "unit.water_meter_no":         r"(?i)Water\s*Meter\s*No\.?\s*([A-Za-z0-9\-]+)",
+    "unit.gas_account_no":         r"(?i)Gas\s*(?:Account|Acc(?:ount)?)\s*No\.?\s*([A-Za-z0-9\-]+)",
+    "unit.gas_meter_no":           r"(?i)Gas\s*Meter\s*No\.?\s*([A-Za-z0-9\-]+)",
+    "unit.ac_type":                r"(?i)A\.?C\.?\s*Type\s*[:：]?\s*([^\n:]+)",
+    "unit.electricity_meter_no_ar": r"عداد\s*الكهرب(?:اء)?\s*[:：]?\s*([0-9\-]+)",
+    "unit.water_meter_no_ar":       r"عداد\s*الم(?:ي|ياه)\s*[:：]?\s*([0-9\-]+)",
+    "unit.gas_meter_no_ar":         r"عداد\s*الغاز\s*[:：]?\s*([0-9\-]+)",
+
+    # Financial & payments
+    "financial.vat":    r"(?i)\bVAT\b.*?(?:Value|amount)?\s*[:\-]?\s*([0-9\.,]+)",
+    "payments.row":     r"(?m)^\s*(\d{3,}(?:,\d{3})*\.\d{2}).*?(14\d{2}-\d{2}-\d{2}).*?(20\d{2}-\d{2}-\d{2}).*$",
+    "payments.amount":  r"(?<!\d)(\d{3,}(?:,\d{3})*\.\d{2})(?!\d)",
+    "payments.ad_date": r"\b(20\d{2}-\d{2}-\d{2})\b",
+    "payments.ah_date": r"\b(14\d{2}-\d{2}-\d{2})\b",
+}
+
+class RuleSet:
+    """
+    مجموعة قواعد وإصدارها؛ تُستبدل ككل عند إعادة التحميل (لا تُعدّل في مكانها).
+    الأنماط تُترجم عند أول طلب لكل اسم، فلا يدفع بدء التشغيل ثمن ~100 نمط لن يُستخدم أغلبها في طلب واحد.
+    """
+
+    def __init__(self, patterns: Dict[str, str], version: str, source: Optional[str]=None):
+        self.patterns = dict(patterns)
+        self.compiled: Dict[str, "re.Pattern[str]"] = {}
+        self.version = version
+        self.source = source
+        self.source_mtime = os.path.getmtime(source) if source else None
+        self._section_plan: Optional[Dict[str, Any]] = None  # يُبنى عند أول استخدام
+        self._label_scanners: Dict[str, "LabelScanner"] = {}  # انظر label_scanner
+
+    def __getitem__(self, name: str) -> "re.Pattern[str]":
+        rx = self.compiled.get(name)
+        if rx is None:
+            rx = self.compiled[name] = re.compile(self.patterns[name])
+        return rx
+
+    def get(self, name: str) -> Optional["re.Pattern[str]"]:
+        return self[name] if name in self.patterns else None
+
+def load_rules(path: Optional[str]=None) -> RuleSet:
+    """
+    القواعد الافتراضية + استبدالات اختيارية من ملف JSON بالشكل:
+    {"rules": {"basic.contract_no": "(?i)Contract\\s+No ..."}}
+    إصدار المجموعة يتضمن بصمة الملف حتى تُبطل نتائج الكاش عند تغيير القواعد.
+    """
+    if not path:
+        return RuleSet(DEFAULT_RULES, RULESET_VERSION)
+    with open(path, "rb") as f:
+        raw = f.read()
+    overrides = json.loads(raw.decode("utf-8")).get("rules", {})
+    unknown = set(overrides) - set(DEFAULT_RULES)
+    if unknown:
+        raise ValueError(f"unknown rules in {path}: {', '.join(sorted(unknown))}")
+    patterns = {**DEFAULT_RULES, **overrides}
+    version = f"{RULESET_VERSION}+{hashlib.sha256(raw).hexdigest()[:12]}"
+    rules = RuleSet(patterns, version, source=os.path.abspath(path))
+    for name in overrides:
+        rules[name]  # نمط خاطئ في الملف يُرفض هنا لا أثناء طلب
+    return rules
+
+RULES = load_rules(os.environ.get("EJAR_RULES_FILE"))
+
+def reload_rules(path: Optional[str]=None) -> RuleSet:
+    """ إعادة تحميل القواعد دون إعادة تشغيل العملية؛ خطأ في الملف يُبقي القواعد الحالية. """
+    global RULES
+    if path is None:
+        path = RULES.source or os.environ.get("EJAR_RULES_FILE")
+    RULES = load_rules(path)
+    return RULES
+
+_failed_rules_mtime: Optional[float] = None  # آخر نسخة فاشلة من ملف القواعد (لا تُعاد محاولتها)
+
+def reload_rules_if_changed() -> bool:
+    """
+    فحص رخيص (stat) لملف القواعد وإعادة تحميله إن تغيّر.
+    ملف خاطئ (JSON أو نمط) لا يوقف الاستخراج: يُسجّل الخطأ وتبقى القواعد الحالية، ولا تُعاد محاولة
+    النسخة نفسها حتى يتغيّر الملف مجدداً. الخطأ نفسه يظهر لمن يطلب /rules/reload صراحة.
+    """
+    global _failed_rules_mtime
+    if not RULES.source:
+        return False
+    try:
+        mtime = os.path.getmtime(RULES.source)
+    except OSError:
+        return False
+    if mtime == RULES.source_mtime or mtime == _failed_rules_mtime:
+        return False
+    try:
+        reload_rules(RULES.source)
+    except (OSError, ValueError, re.error) as e:
+        _failed_rules_mtime = mtime
+        print(f"[WARN] keeping rules {RULES.version}; {RULES.source} failed to load: {e}",
+              file=sys.stderr, flush=True)
+        return False
+    return True
+
+# ------------------------------
+# Input sources
+# ------------------------------
+# مصدر ملف PDF: مسار، أو محتواه في الذاكرة (bytes/bytearray/memoryview/mmap)، أو كائن ملف قابل للـ seek
+PdfSource = Union[str, "os.PathLike[str]", bytes, bytearray, memoryview, mmap.mmap, BinaryIO]
+
+class _BufferReader(io.RawIOBase):
+    """ كائن ملف للقراءة فقط فوق memoryview: pdfminer يقرأ أجزاءً منه دون نسخ الملف كاملاً. """
+
+    def __init__(self, buf):
+        self._view = memoryview(buf).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool: return True
+    def seekable(self) -> bool: return True
+    def tell(self) -> int: return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def readinto(self, b) -> int:
+        chunk = self._view[self._pos:self._pos + len(b)]
+        n = len(chunk)
+        b[:n] = chunk
+        self._pos += n
+        return n
+
+    def close(self) -> None:
+        # تحرير الـ view ضروري حتى يستطيع المستدعي إغلاق الـ mmap بعد التحليل
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+def is_path_source(source: PdfSource) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+def as_stream(source: PdfSource) -> BinaryIO:
+    """ كائن ملف لمصدر في الذاكرة: bytes تُغلّف بـ BytesIO (تشارك نفس الذاكرة)، وbytearray/memoryview/mmap عبر memoryview بلا نسخ. """
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    if isinstance(source, (bytearray, memoryview, mmap.mmap)):
+        return _BufferReader(source)
+    return source
+
+@contextmanager
+def open_pdf(source: PdfSource):
+    """ pdfplumber.open لأي مصدر: المسار يُفتح كالمعتاد، وكائن الملف يُمرَّر كما هو. """
+    if is_path_source(source):
+        with _lazy_import("pdfplumber").open(source) as pdf:
+            yield pdf
+        return
+    stream = as_stream(source)
+    try:
+        with _lazy_import("pdfplumber").open(stream) as pdf:
+            yield pdf
+    finally:
+        if stream is not source:
+            stream.close()
+
+# ------------------------------
+# Text engines
+# ------------------------------
+class TextEngine(ABC):
+    """
+    واجهة محرك استخراج النص: يفتح المصدر مرة واحدة ويعطي نص كل صفحة عند الطلب.
+    raw(i) تدفق نص رخيص (بدون تحليل تخطيط) يُستخدم لفهرسة الصفحات في lazy_pages.
+    محرك لا يعرّف __len__ وtext يُرفض عند إنشائه لا عند أول صفحة.
+    """
+    name = ""
+    requires = ""  # الحزمة الاختيارية التي يحتاجها المحرك
+
+    def __init__(self, source: PdfSource):
+        self.source = source
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def text(self, i: int) -> str:
+        ...
+
+    def raw(self, i: int) -> str:
+        return self.text(i)
+
+    def release(self, i: int) -> None:
+        """ تحرير كائنات الصفحة i المحللة بعد أخذ نصها (وضع تدفق الصفحات). """
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+class PdfplumberEngine(TextEngine):
+    """ الإفتراضي: تحليل تخطيط pdfplumber (الأبطأ، وعليه ضُبطت القواعد). """
+    name = "pdfplumber"
+    requires = "pdfplumber"
+
+    def __init__(self, source: PdfSource):
+        super().__init__(source)
+        self._cm = open_pdf(source)
+        self.pages = self._cm.__enter__().pages
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def text(self, i: int) -> str:
+        return _page_text(self.pages[i])
+
+    def raw(self, i: int) -> str:
+        return "".join(c.get("text", "") for c in self.pages[i].chars)
+
+    def release(self, i: int) -> None:
+        # الحروف والتخطيط وخريطة النص المخزنة في الصفحة هي معظم ذاكرة المستند؛
+        # كائن Page نفسه يبقى في pdf.pages لأن pdf.close يمر عليها
+        self.pages[i].close()
+
+    def close(self) -> None:
+        self._cm.__exit__(None, None, None)
+
+# إعدادات LAParams لمحرك pdfminer (تُعدّل بـ EJAR_PDFMINER_LAPARAMS كـ JSON)
+PDFMINER_LAPARAMS = {"line_margin": 0.3, "char_margin": 2.0, "word_margin": 0.1,
+                     "boxes_flow": None, "detect_vertical": False, "all_texts": False}
+
+class PdfminerEngine(TextEngine):
+    """ pdfminer.six مباشرة: مفسّر واحد لكل الصفحات وسطور مرتبة من الأعلى للأسفل. """
+    name = "pdfminer"
+    requires = "pdfminer"
+
+    def __init__(self, source: PdfSource):
+        super().__init__(source)
+        from pdfminer.pdfparser import PDFParser
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfpage import PDFPage
+        from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+        from pdfminer.converter import PDFPageAggregator
+        from pdfminer.layout import LAParams
+        self._stream = open(source, "rb") if is_path_source(source) else as_stream(source)
+        params = dict(PDFMINER_LAPARAMS, **json.loads(os.environ.get("EJAR_PDFMINER_LAPARAMS") or "{}"))
+        self._pages = list(PDFPage.create_pages(PDFDocument(PDFParser(self._stream))))
+        resources = PDFResourceManager(caching=True)
+        self._device = PDFPageAggregator(resources, laparams=LAParams(**params))
+        self._interp = PDFPageInterpreter(resources, self._device)
+        # بدون LAParams: تفسير الصفحة فقط (حروف بترتيب التدفق) لفهرسة lazy_pages دون تحليل التخطيط
+        self._raw_device = PDFPageAggregator(resources, laparams=None)
+        self._raw_interp = PDFPageInterpreter(resources, self._raw_device)
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def text(self, i: int) -> str:
+        from pdfminer.layout import LTTextContainer, LTTextLine
+        try:
+            self._interp.process_page(self._pages[i])
+            lines = []
+            for box in self._device.get_result():
+                if isinstance(box, LTTextLine):
+                    lines.append(box)
+                elif isinstance(box, LTTextContainer):
+                    lines.extend(l for l in box if isinstance(l, LTTextLine))
+            lines.sort(key=lambda l: (-round(l.y1), l.x0))
+            return "\n".join(l.get_text().strip("\n") for l in lines)
+        except Exception:
+            return ""
+
+    def raw(self, i: int) -> str:
+        from pdfminer.layout import LTChar, LTContainer
+        try:
+            self._raw_interp.process_page(self._pages[i])
+            out, stack = [], [self._raw_device.get_result()]
+            while stack:
+                for obj in stack.pop():
+                    if isinstance(obj, LTChar):
+                        out.append(obj.get_text())
+                    elif isinstance(obj, LTContainer):
+                        stack.append(obj)
+            return "".join(out)
+        except Exception:
+            return ""
+
+    def close(self) -> None:
+        if self._stream is not self.source:
+            self._stream.close()
+
+class PdfiumEngine(TextEngine):
+    """ طبقة النص في pypdfium2 (PDFium بلغة C): بدون تحليل تخطيط، وهو الأسرع. """
+    name = "pypdfium2"
+    requires = "pypdfium2"
+
+    def __init__(self, source: PdfSource):
+        super().__init__(source)
+        import pypdfium2 as pdfium
+        self._stream = source if is_path_source(source) or isinstance(source, bytes) else as_stream(source)
+        self._doc = pdfium.PdfDocument(self._stream)
+        self._raw: Dict[int, str] = {}  # نص الصفحات المقروءة للفهرسة، يُسلَّم لـ text مرة واحدة
+
+    def __len__(self) -> int:
+        return len(self._doc)
+
+    def raw(self, i: int) -> str:
+        # طبقة النص هنا بلا تخطيط أصلاً → الفهرسة تقرأ النص نفسه مرة واحدة لصفحات lazy_pages
+        text = self._raw.get(i)
+        if text is None:
+            text = self._raw[i] = self._read(i)
+        return text
+
+    def text(self, i: int) -> str:
+        text = self._raw.pop(i, None)
+        return text if text is not None else self._read(i)
+
+    def _read(self, i: int) -> str:
+        page = self._doc[i]
+        try:
+            textpage = page.get_textpage()
             try:
-                t = p.extract_text() or ""
-            except Exception:
-                t = ""
-            pages_text.append(t)
+                return textpage.get_text_range().replace("\r\n", "\n")
+            finally:
+                textpage.close()
+        except Exception:
+            return ""
+        finally:
+            page.close()
+
+    def close(self) -> None:
+        self._doc.close()
+        if self._stream is not self.source:
+            self._stream.close()
+
+TEXT_ENGINES: Dict[str, type] = {e.name: e for e in (PdfplumberEngine, PdfminerEngine, PdfiumEngine)}
+DEFAULT_TEXT_ENGINE = "pdfplumber"
+
+def resolve_engine(engine: Optional[str]=None) -> str:
+    """ اسم المحرك: المعطى، أو EJAR_TEXT_ENGINE، أو pdfplumber. """
+    name = engine or os.environ.get("EJAR_TEXT_ENGINE") or DEFAULT_TEXT_ENGINE
+    if name not in TEXT_ENGINES:
+        raise ValueError(f"unknown text engine: {name} (available: {', '.join(TEXT_ENGINES)})")
+    return name
+
+# عدد الصفحات الذي يبدأ عنده التوزيع على عمليات متوازية (الملفات الصغيرة تبقى في عملية واحدة)
+PARALLEL_PAGE_THRESHOLD = int(os.environ.get("EJAR_PARALLEL_PAGES", "12"))
+# تحرير كل صفحة بعد أخذ نصها → ذاكرة العامل ثابتة تقريباً مهما زاد عدد الصفحات (EJAR_STREAM_PAGES=0 للتعطيل)
+STREAM_PAGES = os.environ.get("EJAR_STREAM_PAGES", "1") == "1"
+
+def _page_text(page) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        return ""
+
+def _extract_page_range(args: Tuple[Union[str, bytes], List[int], str]) -> List[str]:
+    """ عامل في عملية منفصلة: يفتح الملف ويستخرج نص الصفحات المحددة. """
+    source, indices, engine = args
+    texts = []
+    with TEXT_ENGINES[engine](source) as doc:
+        for i in indices:
+            texts.append(doc.text(i))
+            doc.release(i)
+    return texts
+
+def extract_text(pdf_path: PdfSource, workers: Optional[int]=None,
+                 parallel_threshold: Optional[int]=None,
+                 sections: Optional[List[str]]=None,
+                 engine: Optional[str]=None,
+                 on_open=None,
+                 stream_pages: Optional[bool]=None,
+                 budget: Optional["ExtractionBudget"]=None) -> Tuple[str, List[str]]:
+    """
+    استخراج نص الصفحات. مع workers > 1 وعدد صفحات >= parallel_threshold
+    تُوزَّع الصفحات على مجمع عمليات بأجزاء متتالية، ويُحفظ ترتيبها كما هو.
+    مع sections: فهرسة سريعة لعناوين الأقسام ثم تحليل التخطيط للصفحات اللازمة فقط
+    (الصفحات المتجاوزة تبقى نصاً فارغاً للحفاظ على ترقيم الصفحات).
+    pdf_path: أي PdfSource؛ التوزيع على عمليات متاح للمسارات وbytes فقط (تُرسل للعمّال)،
+    وباقي المصادر في الذاكرة تُحلَّل في نفس العملية.
+    engine: محرك النص (انظر TEXT_ENGINES)؛ الإفتراضي EJAR_TEXT_ENGINE أو pdfplumber.
+    on_open: دالة تُستدعى بالمستند المفتوح قبل استخراج النص؛ إن أرجعت True فالحقول الأساسية
+    متوفرة مسبقاً (من القالب) ولا تُضاف صفحات BASIC_SECTIONS في lazy_pages.
+    stream_pages: تحرير كائنات كل صفحة بعد أخذ نصها (الإفتراضي STREAM_PAGES)؛ مع sections
+    تُحرَّر الصفحات أثناء الفهرسة أيضاً فتُحلَّل الصفحات المطلوبة مرة ثانية مقابل ذاكرة محدودة.
+    budget: يُفحص قبل كل صفحة (وأثناء انتظار العمّال)؛ الصفحات غير المقروءة تبقى نصاً فارغاً
+    وعددها في budget.unread_pages.
+    """
+    engine = resolve_engine(engine)
+    stream_pages = STREAM_PAGES if stream_pages is None else stream_pages
+    threshold = PARALLEL_PAGE_THRESHOLD if parallel_threshold is None else parallel_threshold
+    if not (is_path_source(pdf_path) or isinstance(pdf_path, bytes)):
+        workers = None
+    with TEXT_ENGINES[engine](pdf_path) as doc:
+        n_pages = len(doc)
+        limit = budget.page_limit(n_pages) if budget is not None else n_pages
+        basic_ready = bool(on_open(doc)) if on_open else False
+        if sections is None:
+            wanted = list(range(limit))
+        else:
+            index = index_pages(doc, release=stream_pages, budget=budget, limit=limit)
+            wanted = pages_for_sections(index, sections, include_basic=not basic_ready,
+                                        open_end=len(index) < n_pages)
+        pages_text = [""] * n_pages
+        if not workers or workers <= 1 or len(wanted) < max(threshold, 2):
+            for n, i in enumerate(wanted):
+                if budget is not None:
+                    if budget.pages_exhausted():
+                        budget.unread_pages += len(wanted) - n
+                        break
+                    budget.pages_read += 1
+                pages_text[i] = doc.text(i)
+                if stream_pages:
+                    doc.release(i)
+            return "\n".join(pages_text), pages_text
+
+    from concurrent.futures import ProcessPoolExecutor
+    workers = min(workers, len(wanted))
+    step = -(-len(wanted) // workers)
+    chunks = [wanted[a:a + step] for a in range(0, len(wanted), step)]
+    ex = ProcessPoolExecutor(max_workers=len(chunks))
+    try:
+        futures = [ex.submit(_extract_page_range, (pdf_path, c, engine)) for c in chunks]
+        # النتائج تُجمع بترتيب الأجزاء → نفس full_text الناتج عن المسار المتسلسل
+        for n, (indices, fut) in enumerate(zip(chunks, futures)):
+            texts = budget.wait(fut) if budget is not None else fut.result()
+            if texts is None:
+                budget.unread_pages += sum(len(c) for c in chunks[n:])
+                break
+            if budget is not None:
+                budget.pages_read += len(indices)
+            for i, t in zip(indices, texts):
+                pages_text[i] = t
+    finally:
+        # عند التوقف لا يُنتظر العمّال الجارون (يكملون جزءهم ويخرجون)، والأجزاء التي لم تبدأ تُلغى
+        ex.shutdown(wait=budget is None or not budget.pages_exhausted(), cancel_futures=True)
     return "\n".join(pages_text), pages_text
 
 # ------------------------------
 # Arabic post-processing (for JSON)
 # ------------------------------
+# نفس النصوص تتكرر عبر العقود (أسماء، جنسيات، أنواع الوحدات، جهات الإصدار)؛
+# كل تحويل عربي نقي (نص → نص) محفوظ في ذاكرة LRU محدودة على مستوى العملية.
+ARABIC_MEMO_SIZE = int(os.environ.get("EJAR_ARABIC_MEMO", "4096"))
+_ARABIC_MEMOS: Dict[str, Any] = {}
+
+def _arabic_memo(fn):
+    cached = lru_cache(maxsize=ARABIC_MEMO_SIZE)(fn)
+    _ARABIC_MEMOS[fn.__name__] = cached
+    return cached
+
+def arabic_memo_stats() -> Dict[str, Dict[str, int]]:
+    """ إحصاءات الذاكرة لكل تحويل: hits / misses / size / maxsize. """
+    out = {}
+    for name, fn in _ARABIC_MEMOS.items():
+        info = fn.cache_info()
+        out[name] = {"hits": info.hits, "misses": info.misses,
+                     "size": info.currsize, "maxsize": info.maxsize}
+    return out
+
+def clear_arabic_memo() -> None:
+    for fn in _ARABIC_MEMOS.values():
+        fn.cache_clear()
+
+@_arabic_memo
 def _normalize_ar_presentation(s: str) -> str:
     # يحوّل Presentation Forms إلى حروف عربية عادية
     s = unicodedata.normalize("NFKC", s or "")
@@ -48,18 +649,21 @@ def _normalize_ar_presentation(s: str) -> str:
     s = s.replace("ﷲ", "الله")
     s = s.replace("ﷺ", "")
     # شيل فراغات قبل/بعد النقطتين إن وجدت
-    s = re.sub(r"\s*[:：]\s*$", "", s)
+    s = TRAILING_COLON_RE.sub("", s)
     return s
 
+@_arabic_memo
 def _shape_ar_for_display(s: str) -> str:
     """ تشكيل النص العربي للعرض (بدون قلب bidi). """
+    reshaper = _lazy_import("arabic_reshaper", optional=True)
+    if reshaper is None:
+        return s
     try:
-        import arabic_reshaper
-        reshaped = arabic_reshaper.reshape(s)
-        return reshaped
+        return reshaper.reshape(s)
     except Exception:
         return s
 
+@_arabic_memo
 def _fix_arabic_text(text: str) -> str:
     """ إصلاح اتجاه النص العربي - عكس الكلمات والجملة. """
     if not text or not ARABIC_CHARS.search(text):
@@ -68,9 +672,9 @@ def _fix_arabic_text(text: str) -> str:
     text = _normalize_ar_presentation(text)
     
     # إصلاح الكلمات التي تحتوي على "الله" أو "الـ" بدون مسافات
-    text = re.sub(r'(الله)([^\s])', r'\1 \2', text)  # الله + حرف
-    text = re.sub(r'([^\s])(الله)', r'\1 \2', text)  # حرف + الله
-    text = re.sub(r'([^\s])(ال)([^\s])', r'\1 \2\3', text)  # حرف + ال + حرف
+    text = ALLAH_BEFORE_RE.sub(r'\1 \2', text)  # الله + حرف
+    text = ALLAH_AFTER_RE.sub(r'\1 \2', text)   # حرف + الله
+    text = AL_JOINED_RE.sub(r'\1 \2\3', text)   # حرف + ال + حرف
     
     words = text.split()
     reversed_words = []
@@ -88,41 +692,214 @@ def arabic_for_json(value: Any, shape: bool=True) -> Any:
         return value
     if not ARABIC_CHARS.search(value):
         return value
+    return _arabic_for_json_str(value, shape)
+
+@_arabic_memo
+def _arabic_for_json_str(value: str, shape: bool) -> str:
     s = _normalize_ar_presentation(value)
     if shape:
         s = _shape_ar_for_display(s)
     return s
 
-def walk_and_fix_arabic(x: Any, shape: bool=True) -> Any:
+def _reverse_arabic_word(word: str) -> str:
+    """يقلب الحروف داخل الكلمات العربية فقط"""
+    return word[::-1] if ARABIC_LETTER.search(word) else word
+
+@_arabic_memo
+def fix_property_text(text: str) -> str:
+    """إصلاح اتجاه النص العربي كلمةً بحرف (استخدام/نوع العقار)."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text)
+    text = text.replace("ﻻ", "ال")
+    text = WS_RE.sub(" ", text).strip(" :،.-")
+
+    # نقلب كل كلمة عربية
+    words = text.split()
+    fixed_words = [_reverse_arabic_word(w) for w in words]
+    text = " ".join(fixed_words)
+
+    # إصلاح الكلمات المعروفة
+    text = text.replace("نكس دارفأ", "سكن أفراد")
+    text = text.replace("ةرامع", "عمارة")
+    return text.strip()
+
+# مفاتيح قيمها أرقام/تواريخ فقط (من تعابير رقمية أو محسوبة) فلا داعي لزيارة ما تحتها
+NON_ARABIC_KEYS = frozenset({
+    "payments", "payment_checks", "due_date", "amount", "installment_amount", "installments_count",
+    "annual_rent", "total_contract_value", "vat_value", "tenancy_start", "tenancy_end",
+})
+
+def walk_and_fix_arabic(x: Any, shape: bool=True, in_place: bool=False,
+                        skip_keys: frozenset=NON_ARABIC_KEYS) -> Any:
+    """
+    تطبيق arabic_for_json على كل نص في الشجرة بدون استدعاء ذاتي.
+    in_place: تعديل القوائم والقواميس نفسها بدل نسخها (للنتائج الطازجة التي لا يشاركها أحد).
+    skip_keys: مفاتيح لا تحتوي عربية تُترك كما هي؛ في وضع النسخ تُشارك قيمها مع المدخل.
+    """
     if isinstance(x, dict):
-        return {k: walk_and_fix_arabic(v, shape) for k, v in x.items()}
+        root = x if in_place else dict(x)
     elif isinstance(x, list):
-        return [walk_and_fix_arabic(v, shape) for v in x]
+        root = x if in_place else list(x)
     else:
         return arabic_for_json(x, shape)
 
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        is_dict = isinstance(node, dict)
+        for k, v in (node.items() if is_dict else enumerate(node)):
+            if is_dict and k in skip_keys:
+                continue
+            if isinstance(v, str):
+                if ARABIC_CHARS.search(v):
+                    node[k] = _arabic_for_json_str(v, shape)
+            elif isinstance(v, (dict, list)):
+                if not in_place:
+                    v = node[k] = dict(v) if isinstance(v, dict) else list(v)
+                stack.append(v)
+    return root
+
 # ------------------------------
 # Section detection
 # ------------------------------
-SECTION_PATTERNS = [
-    (r"(?:Lessor\s*Data)", "lessor"),
-    (r"(?:Lessor\s*Representative\s*Data)", "lessor_rep"),
-    (r"(?:Tenant\s*Data)", "tenant"),
-    (r"(?:Tenant\s*Representative\s*Data)", "tenant_rep"),
-    (r"(?:Brokerage\s*Entity.*?Data)", "brokerage"),
-    (r"(?:Title\s*Deeds?\s*Data)", "titles"),
-    (r"(?:Property\s*Data)", "property"),
-    (r"(?:Rental\s*Units?\s*Data)", "units"),
-    (r"(?:Financial\s*Data)", "financial"),
-    (r"(?:Rent\s*Payments?\s*Schedule)", "payments"),
-]
+# الأنماط نفسها في سجل القواعد تحت section.<key>
+SECTION_KEYS = ["lessor", "lessor_rep", "tenant", "tenant_rep", "brokerage",
+                "titles", "property", "units", "financial", "payments"]
+
+# ترتيب الأولوية عند تطابق عنوانين في نفس الموضع: الأكثر تحديداً أولاً
+SECTION_SCAN_PRIORITY = ["lessor_rep", "tenant_rep", "lessor", "tenant", "brokerage",
+                         "titles", "property", "units", "financial", "payments"]
+_GLOBAL_FLAGS_RE = re.compile(r"^\(\?([aiLmsux]+)\)")
+_LEADING_WORD_RE = re.compile(r"[A-Za-z]+")
+
+def _scoped(pattern: str) -> str:
+    """ (?i)abc → (?i:abc) حتى يمكن دمج الأنماط في نمط واحد. """
+    m = _GLOBAL_FLAGS_RE.match(pattern)
+    if not m:
+        return f"(?:{pattern})"
+    return f"(?{m.group(1)}:{pattern[m.end():]})"
+
+def _top_level(pattern: str):
+    """ يمر على محارف النمط مع عمق الأقواس (يتجاوز المحارف المهرّبة و [...]). """
+    depth, i, n = 0, 0, len(pattern)
+    while i < n:
+        ch = pattern[i]
+        if ch == "\\":
+            i += 2
+            continue
+        if ch == "[":
+            j = i + 1
+            if j < n and pattern[j] == "]": j += 1
+            while j < n and pattern[j] != "]":
+                j += 2 if pattern[j] == "\\" else 1
+            i = j + 1
+            continue
+        if ch == "(": depth += 1
+        elif ch == ")": depth -= 1
+        yield i, ch, depth
+        i += 1
+
+def _literal_anchor(pattern: str, word_re: "re.Pattern[str]"=_LEADING_WORD_RE) -> Optional[str]:
+    """
+    الكلمة الحرفية التي يجب أن يبدأ بها أي تطابق للنمط (مثل Lessor\s*Data → lessor)،
+    أو None إن لم يمكن استنتاجها بأمان (تناوب في المستوى الأعلى، بداية غير حرفية...).
+    """
+    body = _GLOBAL_FLAGS_RE.sub("", pattern, count=1)
+    while body.startswith("(?:"):
+        close = next((i for i, ch, d in _top_level(body) if ch == ")" and d == 0), None)
+        if close == len(body) - 1:
+            body = body[3:-1]
+            continue
+        # (?:Number\s*of\s*Parking)\s*... → بداية المجموعة بداية النمط ما لم تكن اختيارية أو في تناوب
+        if close is None or body[close + 1:close + 2] in ("?", "*", "{") or \
+           any(ch == "|" and d == 0 for _, ch, d in _top_level(body)):
+            return None
+        body = body[3:close]
+    if any(ch == "|" and d == 0 for _, ch, d in _top_level(body)):
+        return None
+    m = word_re.match(body)
+    if not m:
+        return None
+    word = m.group(0)
+    if body[m.end():m.end() + 1] in ("?", "*", "{"):
+        word = word[:-1]
+    return word.lower() or None
 
-def find_spans(full_text: str) -> Dict[str, Tuple[int, int]]:
+def _section_plan(rules: Optional[RuleSet]=None) -> Dict[str, Any]:
+    """
+    يُبنى مرة لكل مجموعة قواعد: نمط كلمات مفتاحية واحد يجمع الكلمة الأولى لكل عنوان قسم.
+    المرور عليه (على نص بأحرف صغيرة) يعطي المواضع المرشحة، ثم يُتحقق من العنوان الكامل عندها فقط.
+    إن تعذّر استنتاج كلمة لأحد الأنماط يُستخدم نمط lookahead مجمّع بمجموعات مسماة.
+    """
+    rules = rules or RULES
+    plan = rules._section_plan
+    if plan is not None:
+        return plan
+    anchors = {key: _literal_anchor(rules.patterns[f"section.{key}"]) for key in SECTION_SCAN_PRIORITY}
+    if all(anchors.values()):
+        words = sorted(set(anchors.values()), key=len, reverse=True)
+        plan = {
+            "keywords": re.compile("|".join(map(re.escape, words))),
+            "keywords_ci": re.compile("|".join(map(re.escape, words)), re.IGNORECASE),
+            "order": [(key, anchors[key], rules[f"section.{key}"]) for key in SECTION_SCAN_PRIORITY],
+        }
+    else:
+        alts = "|".join(f"(?P<{key}>{_scoped(rules.patterns['section.' + key])})"
+                        for key in SECTION_SCAN_PRIORITY)
+        plan = {"combined": re.compile(f"(?=(?:{alts}))")}
+    rules._section_plan = plan
+    return plan
+
+def scan_sections(full_text: str) -> List[Tuple[int, int, str]]:
+    """
+    كل ظهور لكل عنوان قسم في مرور واحد: (بداية العنوان، نهايته، المفتاح) مرتبة حسب الموضع.
+    عند تطابق أكثر من عنوان في نفس الموضع يُختار حسب SECTION_SCAN_PRIORITY.
+    """
+    plan = _section_plan()
     marks = []
-    for pat, key in SECTION_PATTERNS:
-        m = re.search(pat, full_text, flags=re.IGNORECASE)
-        if m: marks.append((m.start(), key))
-    marks.sort()
+    if "combined" in plan:
+        for m in plan["combined"].finditer(full_text):
+            key = m.lastgroup
+            marks.append((m.start(), m.end(key), key))
+        return marks
+
+    folded = full_text.lower()
+    if len(folded) == len(full_text):
+        candidates = plan["keywords"].finditer(folded)
+    else:
+        # lower() غيّر الطول (حروف نادرة) → المواضع لا تتطابق؛ نبحث بدون تحويل
+        folded = None
+        candidates = plan["keywords_ci"].finditer(full_text)
+    for c in candidates:
+        pos = c.start()
+        for key, anchor, rule in plan["order"]:
+            if folded is not None:
+                if not folded.startswith(anchor, pos):
+                    continue
+            elif full_text[pos:pos + len(anchor)].lower() != anchor:
+                continue
+            h = rule.match(full_text, pos)
+            if h:
+                marks.append((pos, h.end(), key))
+                break
+    return marks
+
+def find_all_spans(full_text: str) -> Dict[str, List[Tuple[int, int]]]:
+    """ مثل find_spans لكن لكل الظهورات (للعقود التي تتكرر فيها العناوين). """
+    marks = scan_sections(full_text)
+    spans: Dict[str, List[Tuple[int, int]]] = {}
+    for i, (pos, _, key) in enumerate(marks):
+        end = marks[i + 1][0] if i + 1 < len(marks) else len(full_text)
+        spans.setdefault(key, []).append((pos, end))
+    return spans
+
+def find_spans(full_text: str) -> Dict[str, Tuple[int, int]]:
+    """ أول ظهور لكل قسم، ويمتد حتى أول ظهور للقسم التالي. """
+    first: Dict[str, int] = {}
+    for pos, _, key in scan_sections(full_text):
+        first.setdefault(key, pos)
+    marks = sorted((pos, key) for key, pos in first.items())
     spans = {}
     for i, (pos, key) in enumerate(marks):
         end = marks[i + 1][0] if i + 1 < len(marks) else len(full_text)
@@ -134,28 +911,154 @@ def slice_section(full_text: str, spans: Dict[str, Tuple[int,int]], key: str) ->
     a, b = spans[key]
     return full_text[a:b]
 
+# ------------------------------
+# Page index (lazy page loading)
+# ------------------------------
+# الحقول الأساسية تقرأ من الصفحة الأولى (رقم العقد/التواريخ) ومن البيانات المالية (الإيجار/القيمة)
+BASIC_SECTIONS = ["financial"]
+
+def index_pages(doc: TextEngine, release: bool=False, budget: Optional["ExtractionBudget"]=None,
+                limit: Optional[int]=None) -> List[Dict[str, Any]]:
+    """
+    مرور رخيص على تدفق الحروف الخام لكل صفحة (بدون تحليل التخطيط):
+    أي عناوين أقسام تظهر في الصفحة وموضعها، وهل تحتوي تواريخ ميلادية (سطور جدول الدفعات).
+    release: تحرير كل صفحة بعد قراءتها (وضع تدفق الصفحات).
+    budget/limit: التوقف عند انتهاء الميزانية أو بعد أول limit صفحة (الفهرس يغطي ما قُرئ فقط).
+    """
+    index = []
+    n_pages = len(doc) if limit is None else limit
+    for i in range(n_pages):
+        if budget is not None and budget.pages_exhausted():
+            budget.unread_pages += n_pages - i
+            break
+        try:
+            raw = doc.raw(i)
+        except Exception:
+            raw = ""
+        if release:
+            doc.release(i)
+        headers: Dict[str, int] = {}
+        for pos, _, key in scan_sections(raw):
+            headers.setdefault(key, pos)
+        index.append({"headers": headers,
+                      "has_dates": bool(RULES["payments.ad_date"].search(to_ascii_digits(raw)))})
+    return index
+
+def pages_for_sections(index: List[Dict[str, Any]], sections: List[str],
+                       include_basic: bool=True, open_end: bool=False) -> List[int]:
+    """
+    الصفحات اللازمة للأقسام المطلوبة: من صفحة عنوان القسم حتى صفحة العنوان التالي.
+    القسم الأخير (عادةً جدول الدفعات) يمتد ما دامت الصفحات التالية تحتوي تواريخ،
+    فتُتجاوز صفحات الشروط والأحكام في نهاية العقد.
+    open_end: الفهرس مقطوع (ميزانية) → القسم الأخير يمتد حتى آخر صفحة مفهرسة.
+    """
+    if not index:
+        return []
+    marks = []
+    for page_no, entry in enumerate(index):
+        for key, pos in entry["headers"].items():
+            marks.append((page_no, pos, key))
+    marks.sort()
+    first: Dict[str, int] = {}
+    for i, (_, _, key) in enumerate(marks):
+        first.setdefault(key, i)
+
+    wanted = {0}
+    for key in set(sections) | (set(BASIC_SECTIONS) if include_basic else set()):
+        if key not in first:
+            continue
+        i = first[key]
+        start = marks[i][0]
+        if i + 1 < len(marks):
+            end = marks[i + 1][0]
+        else:
+            end = len(index) - 1 if open_end else start
+            while end + 1 < len(index) and index[end + 1]["has_dates"]:
+                end += 1
+        wanted.update(range(start, end + 1))
+    return sorted(wanted)
+
+# ------------------------------
+# Template profiles (text fingerprint)
+# ------------------------------
+# كل إصدار من قالب Ejar يطبع عناوين التواريخ وجدول الدفعات بصيغة واحدة، بينما المستخرجات تجرّب كل البدائل
+# بالترتيب على كل ملف. بصمة رخيصة (علامات في رأس النص) تختار ملف الإصدار فتُجرَّب بدائله أولاً،
+# ثم باقي البدائل إن لم تُرجع شيئاً (لا يُحذف بديل أبداً: عقد ثنائي اللغة قد يحمل التاريخ بالعربية وحدها).
+# ملف بلا بصمة معروفة يمر على البدائل بترتيبها الأصلي (generic).
+DATE_STRATEGIES = ("range_en", "range_ar", "split_en", "split_ar")
+PAYMENT_STRATEGIES = ("row", "ad", "ah")
+PROFILE_MARKERS = ("en_start", "en_end", "ar_dates")  # قواعد profile.<marker>
+PROFILE_HEAD_CHARS = 2000
+# EJAR_PROFILES=0 → كل الملفات على مسار generic
+USE_PROFILES = os.environ.get("EJAR_PROFILES", "1") == "1"
+
+def _prefer(first: Tuple[str, ...], strategies: Tuple[str, ...]) -> Tuple[str, ...]:
+    """ بدائل الملف أولاً ثم الباقي بترتيبه الأصلي كـ fallback. """
+    return first + tuple(s for s in strategies if s not in first)
+
+GENERIC_PROFILE: Dict[str, Any] = {"id": "generic", "dates": DATE_STRATEGIES, "payments": PAYMENT_STRATEGIES}
+TEMPLATE_PROFILES: List[Dict[str, Any]] = [
+    # القالب الإنجليزي: عنوانا البداية والنهاية بالإنجليزية معاً ولا عناوين عربية مقروءة،
+    # وجدول الدفعات فيه التاريخ الميلادي عادةً
+    {"id": "ejar-en", "requires": ("en_start", "en_end"), "excludes": ("ar_dates",),
+     "dates": _prefer(("range_en", "split_en"), DATE_STRATEGIES),
+     "payments": _prefer(("row", "ad"), PAYMENT_STRATEGIES)},
+    # القالب العربي: لا عناوين تواريخ إنجليزية
+    {"id": "ejar-ar", "requires": ("ar_dates",), "excludes": ("en_start", "en_end"),
+     "dates": _prefer(("range_ar", "split_ar"), DATE_STRATEGIES),
+     "payments": PAYMENT_STRATEGIES},
+]
+
+_profile_lock = threading.Lock()
+_profile_usage: Dict[str, int] = {}
+
+def template_fingerprint(text: str) -> str:
+    """ "en_start+en_end": علامات القالب الموجودة في أول PROFILE_HEAD_CHARS حرف ("-" بدون علامات). """
+    head = text[:PROFILE_HEAD_CHARS]
+    return "+".join(m for m in PROFILE_MARKERS if RULES[f"profile.{m}"].search(head)) or "-"
+
+def select_profile(fingerprint: str) -> Dict[str, Any]:
+    if not USE_PROFILES:
+        return GENERIC_PROFILE
+    markers = set(fingerprint.split("+"))
+    for prof in TEMPLATE_PROFILES:
+        if markers.issuperset(prof["requires"]) and markers.isdisjoint(prof.get("excludes", ())):
+            return prof
+    return GENERIC_PROFILE
+
+def record_profile(profile_id: str) -> None:
+    with _profile_lock:
+        _profile_usage[profile_id] = _profile_usage.get(profile_id, 0) + 1
+
+def profile_stats() -> Dict[str, int]:
+    """ عدد الملفات التي حُللت بكل ملف قالب منذ بدء العملية. """
+    with _profile_lock:
+        return dict(_profile_usage)
+
 # ------------------------------
 # Basic fields
 # ------------------------------
-def extract_basic(full_text: str) -> Dict[str, Any]:
+def extract_basic(full_text: str, digits: Optional[str]=None,
+                  profile: Optional[Dict[str, Any]]=None) -> Dict[str, Any]:
     """
     استخراج الحقول الأساسية من نص عقد الإيجار (رقم العقد، الإيجار السنوي، القيمة الإجمالية، بداية ونهاية العقد).
     يدعم العربية والإنجليزية ويتعامل مع النصوص متعددة الأسطر.
+    profile: ملف القالب (انظر select_profile) الذي يحدد ترتيب بدائل التواريخ؛ الإفتراضي الترتيب الأصلي.
     """
-    text_d = to_ascii_digits(full_text)
+    text_d = digits if digits is not None else to_ascii_digits(full_text)
     out: Dict[str, Any] = {}
 
     # -------------------------------
     # رقم العقد
     # -------------------------------
-    m = re.search(r"Contract\s+No\.?\s*([^\s/]+(?:/\S+)?)", full_text, re.IGNORECASE)
+    m = RULES["basic.contract_no"].search(full_text)
     if m:
         out["contract_no"] = norm_space(m.group(1))
 
     # -------------------------------
     # الإيجار السنوي
     # -------------------------------
-    m = re.search(r"Annual\s*Rent[:：]?\s*([0-9\.,]+)", text_d, re.IGNORECASE)
+    m = RULES["basic.annual_rent"].search(text_d)
     if m:
         try:
             out["annual_rent"] = f"{float(m.group(1).replace(',', '')):.2f}"
@@ -165,7 +1068,7 @@ def extract_basic(full_text: str) -> Dict[str, Any]:
     # -------------------------------
     # القيمة الإجمالية للعقد
     # -------------------------------
-    m = re.search(r"Total\s*Contract\s*Value[:：]?\s*([0-9\.,]+)", text_d, re.IGNORECASE)
+    m = RULES["basic.total_contract_value"].search(text_d)
     if m:
         try:
             out["total_contract_value"] = f"{float(m.group(1).replace(',', '')):.2f}"
@@ -175,69 +1078,277 @@ def extract_basic(full_text: str) -> Dict[str, Any]:
     # -------------------------------
     # ✅ تاريخ بداية ونهاية العقد (باللغتين)
     # -------------------------------
-    date_patterns = [
-        # English: Tenancy Start / End Date
-        r"Tenancy\s*Start\s*Date\s*[:：]?\s*([0-9/\-]+)[\s\S]{0,100}?(?:Tenancy\s*End\s*Date\s*[:：]?\s*([0-9/\-]+))",
-        # Arabic: بداية العقد / نهاية أو انتهاء العقد
-        r"بداية\s*العقد\s*[:：]?\s*([0-9/\-]+)[\s\S]{0,100}?(?:نهاية|انتهاء)\s*العقد\s*[:：]?\s*([0-9/\-]+)",
-    ]
-
-    for pat in date_patterns:
-        m = re.search(pat, text_d, re.IGNORECASE)
-        if m:
-            start_raw, end_raw = m.group(1).strip(), m.group(2).strip()
-            start = parse_date_any(start_raw) or start_raw
-            end = parse_date_any(end_raw) or end_raw
-            out["tenancy_start"] = start
-            out["tenancy_end"] = end
+    # range_en / range_ar: البداية والنهاية معاً (Tenancy Start / End Date، بداية العقد / نهاية أو انتهاء العقد)
+    # split_en / split_ar: fallback إذا كانت كل تاريخ في سطر منفصل
+    for strategy in (profile or GENERIC_PROFILE)["dates"]:
+        if "tenancy_start" in out and "tenancy_end" in out:
             break
+        if strategy.startswith("range_"):
+            if "tenancy_start" in out or "tenancy_end" in out:
+                continue
+            m = RULES[f"basic.tenancy_{strategy}"].search(text_d)
+            if m:
+                start_raw, end_raw = m.group(1).strip(), m.group(2).strip()
+                out["tenancy_start"] = parse_date_any(start_raw) or start_raw
+                out["tenancy_end"] = parse_date_any(end_raw) or end_raw
+            continue
+        lang = strategy[len("split_"):]
+        for key in ("start", "end"):
+            if f"tenancy_{key}" not in out:
+                m = RULES[f"basic.tenancy_{key}_{lang}"].search(text_d)
+                if m:
+                    out[f"tenancy_{key}"] = parse_date_any(m.group(1)) or m.group(1)
 
-    # -------------------------------
-    # ✅ fallback إذا كانت كل تاريخ في سطر منفصل
-    # -------------------------------
-    if "tenancy_start" not in out:
-        m1 = re.search(r"Tenancy\s*Start\s*Date\s*[:：]?\s*([0-9/\-]+)", text_d, re.IGNORECASE)
-        if m1:
-            out["tenancy_start"] = parse_date_any(m1.group(1)) or m1.group(1)
-    if "tenancy_end" not in out:
-        m2 = re.search(r"Tenancy\s*End\s*Date\s*[:：]?\s*([0-9/\-]+)", text_d, re.IGNORECASE)
-        if m2:
-            out["tenancy_end"] = parse_date_any(m2.group(1)) or m2.group(1)
+    return out
 
-    # -------------------------------
-    # ✅ fallback العربية بشكل منفصل
-    # -------------------------------
-    if "tenancy_start" not in out:
-        m1 = re.search(r"بداية\s*العقد\s*[:：]?\s*([0-9/\-]+)", text_d)
-        if m1:
-            out["tenancy_start"] = parse_date_any(m1.group(1)) or m1.group(1)
-    if "tenancy_end" not in out:
-        m2 = re.search(r"(?:نهاية|انتهاء)\s*العقد\s*[:：]?\s*([0-9/\-]+)", text_d)
-        if m2:
-            out["tenancy_end"] = parse_date_any(m2.group(1)) or m2.group(1)
 
-    return out
 
+# ------------------------------
+# Template layouts (coordinate-based)
+# ------------------------------
+# الحقول التي تُقرأ من مربعات ثابتة في قالب Ejar، ونوع تحويل كل منها (نفس صيغ extract_basic)
+TEMPLATE_FIELDS = {
+    "contract_no": "text",
+    "annual_rent": "amount",
+    "total_contract_value": "amount",
+    "tenancy_start": "date",
+    "tenancy_end": "date",
+}
+# قاعدة العنوان التي تثبت أن الكلمة قيمة هذا الحقل بعينه عند تعلّم القالب
+TEMPLATE_LABEL_RULES = {
+    "contract_no": "basic.contract_no",
+    "annual_rent": "basic.annual_rent",
+    "total_contract_value": "basic.total_contract_value",
+    "tenancy_start": "basic.tenancy_start_en",
+    "tenancy_end": "basic.tenancy_end_en",
+}
+AMOUNT_RE = re.compile(r"[0-9][0-9,]*(?:\.[0-9]+)?")
+DATE_TOKEN_RE = re.compile(r"[0-9]{1,4}[/\-][0-9]{1,2}[/\-][0-9]{1,4}")
+
+class LayoutSet:
+    """
+    قوالب الصفحات المعروفة (من EJAR_LAYOUTS_FILE). كل قالب:
+    {"id", "page_size": [w, h], "anchors": [{"page", "text", "bbox"}], "fields": {name: {"page", "bbox"}}}
+    الإحداثيات بنظام pdfplumber (x0, top, x1, bottom) وتُنتج بـ --learn-layout من عقد معروف لا يدوياً.
+    """
+    def __init__(self, layouts: List[Dict[str, Any]], source: Optional[str]=None):
+        for lay in layouts:
+            unknown = set(lay.get("fields", {})) - set(TEMPLATE_FIELDS)
+            if unknown:
+                raise ValueError(f"layout {lay.get('id')}: unknown template fields: {', '.join(sorted(unknown))}")
+            if not lay.get("anchors"):
+                raise ValueError(f"layout {lay.get('id')}: at least one anchor is required")
+        self.layouts = layouts
+        self.source = source
+        self.version = hashlib.sha256(json.dumps(layouts, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+def load_layouts(path: Optional[str]=None) -> Optional[LayoutSet]:
+    if not path:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return LayoutSet(json.load(f).get("layouts", []), source=path)
+
+LAYOUTS: Optional[LayoutSet] = None
+_layouts_loaded = False
+
+def get_layouts() -> Optional[LayoutSet]:
+    """ القوالب تُحمّل عند أول استخدام لوضع القوالب فقط. """
+    global LAYOUTS, _layouts_loaded
+    if not _layouts_loaded:
+        LAYOUTS = load_layouts(os.environ.get("EJAR_LAYOUTS_FILE"))
+        _layouts_loaded = True
+    return LAYOUTS
+
+def _squash(s: str) -> str:
+    return WS_RE.sub("", s or "").casefold()
+
+def _bbox_text(page, bbox) -> str:
+    """ نص الحروف الواقعة كلياً داخل المربع فقط (لا تحليل تخطيط لباقي الصفحة). """
+    try:
+        return page.within_bbox(tuple(bbox)).extract_text() or ""
+    except Exception:
+        return ""
+
+def _convert_template_value(kind: str, text: str) -> Optional[str]:
+    text = norm_space(to_ascii_digits(text))
+    if not text:
+        return None
+    if kind == "amount":
+        m = AMOUNT_RE.search(text)
+        if not m:
+            return None
+        try:
+            return f"{float(m.group(0).replace(',', '')):.2f}"
+        except ValueError:
+            return None
+    if kind == "date":
+        m = DATE_TOKEN_RE.search(text)
+        return (parse_date_any(m.group(0)) or m.group(0)) if m else None
+    return text
+
+def match_layout(pages, layouts: LayoutSet) -> Optional[Dict[str, Any]]:
+    """ أول قالب تطابق مقاسات صفحاته ونصوص مراسيه (anchors) في مواضعها. """
+    for lay in layouts.layouts:
+        ok = True
+        for a in lay["anchors"]:
+            if a["page"] >= len(pages):
+                ok = False
+                break
+            page = pages[a["page"]]
+            w, h = lay.get("page_size") or (page.width, page.height)
+            if abs(page.width - w) > 2 or abs(page.height - h) > 2 or \
+               _squash(a["text"]) not in _squash(_bbox_text(page, a["bbox"])):
+                ok = False
+                break
+        if ok:
+            return lay
+    return None
+
+def extract_template_fields(pages, layouts: LayoutSet) -> Tuple[Optional[str], Dict[str, str]]:
+    """
+    قراءة الحقول الأساسية من مربعاتها في القالب المطابق.
+    يرجع (معرّف القالب، الحقول المقروءة)؛ بدون قالب مطابق يرجع (None, {}) ويُستخدم مسار التعابير.
+    """
+    lay = match_layout(pages, layouts)
+    if lay is None:
+        return None, {}
+    out: Dict[str, str] = {}
+    for name in TEMPLATE_FIELDS:
+        spec = lay.get("fields", {}).get(name)
+        if spec is None or spec["page"] >= len(pages):
+            continue
+        value = _convert_template_value(TEMPLATE_FIELDS[name], _bbox_text(pages[spec["page"]], spec["bbox"]))
+        if value:
+            out[name] = value
+    return lay["id"], out
+
+_CONTRACT_NO_RE = re.compile(r"[^\s/]+(?:/\S+)?")
+TEMPLATE_TOTAL_TOLERANCE = 0.05  # فرق مسموح بين الإجمالي والإيجار × المدة (تقريب الأيام والكسور)
+
+def template_fields_valid(fields: Dict[str, str]) -> bool:
+    """
+    فحص رخيص لقيم قالب مقروءة كاملة بدل مسح التعابير: رقم عقد بصيغة القاعدة، مبالغ موجبة،
+    تاريخان ISO والبداية قبل النهاية، والقيمة الإجمالية ≈ الإيجار السنوي × المدة (يكشف مربعين متبادلين).
+    أي شك → مسار التعابير كاملاً مع check_template_fields (الفحص الخاطئ يكلّف وقتاً لا دقة).
+    """
+    if len(fields) != len(TEMPLATE_FIELDS) or not _CONTRACT_NO_RE.fullmatch(fields["contract_no"]):
+        return False
+    try:
+        rent, total = float(fields["annual_rent"]), float(fields["total_contract_value"])
+        start = datetime.strptime(fields["tenancy_start"], "%Y-%m-%d")
+        end = datetime.strptime(fields["tenancy_end"], "%Y-%m-%d")
+    except ValueError:
+        return False
+    if rent <= 0 or total <= 0 or end <= start:
+        return False
+    years = ((end - start).days + 1) / 365.25
+    return abs(rent * years - total) <= TEMPLATE_TOTAL_TOLERANCE * total
+
+def check_template_fields(template_fields: Dict[str, str], basic: Dict[str, Any]) -> None:
+    """
+    مقارنة قيم القالب بقيم مسار التعابير: ما يختلف يُحذف من template_fields (فتُقدّم قيمة التعابير)،
+    وما لم يجده مسار التعابير يبقى من القالب.
+    """
+    for name in [n for n, v in template_fields.items() if basic.get(n) and basic[n] != v]:
+        del template_fields[name]
 
+def learn_layout(pdf_path: str, layout_id: str, pad: float=2.0, max_pages: int=3) -> Dict[str, Any]:
+    """
+    بناء قالب من عقد معروف: يستخرج الحقول بمسار التعابير ثم يبحث في الصفحات الأولى عن كلمة كل قيمة
+    مسبوقة بعنوان حقلها في نفس السطر (تتحقق منه قاعدة الحقل نفسها)، فيأخذ خلية القيمة كاملة:
+    من نهاية العنوان إلى الكلمة التالية في السطر أو حافة الصفحة، لتتسع لقيم أطول من قيمة العيّنة.
+    الكلمة الواحدة لا تُنسب لحقلين (مثلاً الإيجار السنوي = القيمة الإجمالية في عقد سنة واحدة).
+    """
+    data, _ = extract_all(pdf_path, engine="pdfplumber", template=False)
+    fields: Dict[str, Any] = {}
+    anchors: List[Dict[str, Any]] = []
+    with open_pdf(pdf_path) as pdf:
+        page_size = [float(pdf.pages[0].width), float(pdf.pages[0].height)]
+        for page_no, page in enumerate(pdf.pages[:max_pages]):
+            words = page.extract_words()
+            for idx, w in enumerate(words):
+                line = [v for v in words if abs(v["top"] - w["top"]) < 2]
+                # كلمات العنوان في نفس السطر قبل القيمة (مثل "Contract No.")
+                label = [v for v in words[max(0, idx - 3):idx]
+                         if abs(v["top"] - w["top"]) < 2 and v["x1"] <= w["x0"]
+                         and ARABIC_LETTER.search(v["text"]) is None
+                         and not any(ch.isdigit() for ch in v["text"])]
+                if not label:
+                    continue
+                label_text = " ".join(v["text"] for v in label)
+                for name, kind in TEMPLATE_FIELDS.items():
+                    if name in fields or not data.get(name):
+                        continue
+                    if _convert_template_value(kind, w["text"]) != data[name]:
+                        continue
+                    m = RULES[TEMPLATE_LABEL_RULES[name]].search(f"{label_text} {w['text']}")
+                    if m is None or _convert_template_value(kind, m.group(1)) != data[name]:
+                        continue
+                    label_x1 = max(v["x1"] for v in label)
+                    following = [v["x0"] for v in line if v["x0"] >= w["x1"]]
+                    fields[name] = {"page": page_no,
+                                    "bbox": [round(label_x1 + 0.5, 1), round(w["top"] - pad, 1),
+                                             round(min(following) - 0.5 if following else page_size[0], 1),
+                                             round(w["bottom"] + pad, 1)]}
+                    anchors.append({"page": page_no, "text": label_text,
+                                    "bbox": [round(min(v["x0"] for v in label) - pad, 1),
+                                             round(min(v["top"] for v in label) - pad, 1),
+                                             round(label_x1 + pad, 1),
+                                             round(max(v["bottom"] for v in label) + pad, 1)]})
+                    break
+    if not anchors:
+        raise ValueError("no label anchors found next to the learned fields; cannot build a layout")
+    return {"id": layout_id, "page_size": page_size, "anchors": anchors, "fields": fields}
+
+# ------------------------------
+# Segmentation
+# ------------------------------
+def segment_spans(text: str, boundary: "re.Pattern[str]",
+                  start: Optional["re.Pattern[str]"]=None,
+                  nonempty: bool=False) -> List[Tuple["re.Match[str]", int]]:
+    """
+    مقاطع متتالية (بطاقات، وحدات، وسطاء) في مرور خطي واحد، بدل نمط lazy مع lookahead يُعاد من كل تطابق:
+    boundary.finditer يعطي كل الحدود مرة واحدة، وstart (الإفتراضي تطابق boundary نفسه) يُطابق عند الحد
+    ليبدأ مقطعاً يمتد حتى أول حد بعد نهاية تطابقه أو نهاية النص، مهما طال.
+    يُرجع [(تطابق start، نهاية المقطع)]؛ المقطع هو text[m.start():end] ويُمرَّر كمدى (pos/endpos) دون نسخه.
+    حدٌّ لا يطابق عنده start ينهي المقطع السابق ولا يبدأ مقطعاً.
+    nonempty: المقطع حرف واحد على الأقل بعد تطابق start، فالحد الملاصق لنهايته يُبتلع داخله
+    (كما في نمط (.+?)(?=...) القديم للوسطاء).
+    """
+    marks = list(boundary.finditer(text))
+    out: List[Tuple["re.Match[str]", int]] = []
+    i, n = 0, len(marks)
+    while i < n:
+        m = marks[i] if start is None else start.match(text, marks[i].start())
+        i += 1
+        if m is None:
+            continue
+        stop = m.end() + nonempty
+        while i < n and marks[i].start() < stop:
+            i += 1
+        out.append((m, marks[i].start() if i < n else len(text)))
+    return out
 
 # ------------------------------
 # People parsing
 # ------------------------------
 def clean_name_line(s: str) -> str:
     s = norm_space(s)
-    s = re.sub(r"\s*[:：]?\s*(?:ﻢﺳﻻا|الاسم)\s*$", "", s)
+    s = RULES["people.name_label_suffix"].sub("", s)
     return s
 
+def card_offsets(block: str) -> List[Tuple[int, int]]:
+    """ مواضع بطاقات الأشخاص داخل الكتلة (كل بطاقة تبدأ بسطر Name). """
+    return [(m.start(), end) for m, end in segment_spans(block, RULES["people.card_start"])]
+
 def split_cards_by_name(block: str) -> List[str]:
-    idxs = [m.start() for m in re.finditer(r"(?m)^Name\s+", block)]
-    cards = []
-    for i, start in enumerate(idxs):
-        end = idxs[i+1] if i+1 < len(idxs) else len(block)
-        cards.append(block[start:end])
-    return cards or ([block] if re.search(r"(?m)^Name\s+", block) else [])
-
-def pick_first(pattern: str, text: str, flags=0, group=1, post=lambda x: x) -> str:
-    m = re.search(pattern, text or "", flags)
+    return [block[a:b] for a, b in card_offsets(block)]
+
+def pick_first(pattern, text: str, flags=0, group=1, post=lambda x: x) -> str:
+    """ pattern: اسم قاعدة من RULES أو نمط مترجم أو نص نمط (مع flags). """
+    if isinstance(pattern, str):
+        pattern = RULES.get(pattern) or re.compile(pattern, flags)
+    m = pattern.search(text or "")
     if not m:
         return ""
     try:
@@ -246,45 +1357,44 @@ def pick_first(pattern: str, text: str, flags=0, group=1, post=lambda x: x) -> s
         return post(m.group(0))
 
 
-def parse_person_card(card: str) -> Dict[str, str]:
+def parse_person_card(card: str, digits: Optional[str]=None) -> Dict[str, str]:
     info: Dict[str, str] = {}
 
     # الاسم
-    m = re.search(r"(?m)^Name\s+(.+?)\s*$", card)
+    m = RULES["people.name"].search(card)
     if m:
         info["name"] = clean_name_line(m.group(1))
         
 
-    bd = to_ascii_digits(card)
-    info["id"] = pick_first(r"ID\s*No\.?\s*([0-9]+)", bd)
-    info["phone"] = norm_space(pick_first(r"Mobile\s*No\.?\s*([+\d][\d\s\-+]*)", card, re.IGNORECASE))
-    info["email"] = pick_first(r"Email\s+([^\s:]+@[^\s:]+)", card, re.IGNORECASE)
+    bd = digits if digits is not None else to_ascii_digits(card)
+    info["id"] = pick_first("people.id", bd)
+    info["phone"] = norm_space(pick_first("people.phone", card))
+    info["email"] = pick_first("people.email", card)
 
     # -----------------------------
     # ✅ الجنسية
     # -----------------------------
     nat = ""
-    m_inline = re.search(
-        r"(?:الجنسية|Nationality|ﺔﻴ\S*ﻟا)\s*[:：]?\s*([^\n:]+)",
-        card, re.IGNORECASE)
+    m_inline = RULES["people.nationality"].search(card)
     if m_inline:
         val = m_inline.group(1).strip()
-        val = re.split(r"(?:ID|Type|No\.|\bNationality\b|Email|Mobile)", val)[0]
+        val = RULES["people.nationality_stop"].split(val)[0]
         nat = val.strip(" :،.-")
 
     if not nat:
+        label = RULES["people.nationality_label"]
         lines = [l.strip() for l in card.splitlines() if l.strip()]
         for i, line in enumerate(lines):
-            if re.search(r"(?:الجنسية|Nationality|ﺔﻴ\S*ﻟا)", line):
+            if label.search(line):
                 if i + 1 < len(lines):
                     nxt = lines[i + 1].strip()
-                    if nxt and not re.search(r"(?:الجنسية|Nationality|ﺔﻴ\S*ﻟا)", nxt):
+                    if nxt and not label.search(nxt):
                         nat = nxt.strip(" :،.-")
                         break
 
     if nat:
-        nat = re.sub(r"(?:الجنسية|Nationality|ﺔﻴ\S*ﻟا)\b", "", nat).strip(" :،.-")
-        if nat and not re.fullmatch(r"(?:الجنسية|Nationality|ﺔ\S*ﻟا)", nat):
+        nat = RULES["people.nationality_label_word"].sub("", nat).strip(" :،.-")
+        if nat and not RULES["people.nationality_label_only"].fullmatch(nat):
             info["nationality"] = nat
 
     # -----------------------------
@@ -295,7 +1405,6 @@ def parse_person_card(card: str) -> Dict[str, str]:
             info[key] = _fix_arabic_text(info[key])
 
     # ✅ تحويل الحروف الشكلية Presentation Forms إلى الحروف العربية الأصلية
-    import unicodedata
     for key in ["name", "nationality"]:
         if key in info:
             info[key] = unicodedata.normalize("NFKC", info[key])
@@ -303,10 +1412,12 @@ def parse_person_card(card: str) -> Dict[str, str]:
     return {k: v for k, v in info.items() if v}
 
 
-def extract_party_people(block: str) -> List[Dict[str, str]]:
+def extract_party_people(block: str, digits: Optional[str]=None) -> List[Dict[str, str]]:
+    if digits is None:
+        digits = to_ascii_digits(block)
     people = []
-    for c in split_cards_by_name(block):
-        p = parse_person_card(c)
+    for a, b in card_offsets(block):
+        p = parse_person_card(block[a:b], digits[a:b])
         if any(p.values()):
             people.append(p)
     # unique
@@ -320,14 +1431,13 @@ def extract_party_people(block: str) -> List[Dict[str, str]]:
 # ------------------------------
 # Company (Tenant/Lessor company header)
 # ------------------------------
-def extract_company_header(block: str, role: str) -> Dict[str, Any]:
+def extract_company_header(block: str, role: str, digits: Optional[str]=None) -> Dict[str, Any]:
     out: Dict[str, Any] = {}
-    bd = to_ascii_digits(block)
+    bd = digits if digits is not None else to_ascii_digits(block)
 
-    name = pick_first(r"(?mi)^(?:Tenant|Lessee|Company|Entity|Establishment)\s*Name\s*[:：]?\s*(.+?)$",
-                      block)
+    name = pick_first("company.name", block)
     if not name:
-        name = pick_first(r"(?mi)^Name\s+(.+?)$", block)
+        name = pick_first("company.name_fallback", block)
     if name:
         name = clean_name_line(name)
         # تصحيح النص العربي إذا كان مقلوباً
@@ -335,16 +1445,16 @@ def extract_company_header(block: str, role: str) -> Dict[str, Any]:
             name = _fix_arabic_text(name)
         out[f"{role}_name"] = name
 
-    uni = pick_first(r"\bUnified\s*(?:No\.?|Number)\s*([0-9]+)\b", bd)
-    cr  = pick_first(r"\bCR\s*No\.?\s*([0-9]+)\b", bd)
-    dt  = pick_first(r"\bIssue\s*Date\s*([0-9/\-]+)\b", bd, post=lambda x: parse_date_any(x) or x)
+    uni = pick_first("company.unified_no", bd)
+    cr  = pick_first("company.cr_no", bd)
+    dt  = pick_first("company.issue_date", bd, post=lambda x: parse_date_any(x) or x)
 
     if uni: out[f"{role}_unified_no"] = uni
     if cr:  out[f"{role}_cr_no"] = cr
     if dt:  out[f"{role}_cr_date"] = dt
 
-    em = pick_first(r"Email\s+([^\s:]+@[^\s:]+)", block, re.IGNORECASE)
-    ph = pick_first(r"Mobile\s*No\.?\s*([+\d][\d\s\-+]*)", block, re.IGNORECASE)
+    em = pick_first("people.email", block)
+    ph = pick_first("people.phone", block)
     if em: out[f"{role}_email"] = em
     if ph: out[f"{role}_phone"] = norm_space(ph)
 
@@ -363,27 +1473,21 @@ def extract_company_header(block: str, role: str) -> Dict[str, Any]:
 # ------------------------------
 # Brokerage (entity + brokers)
 # ------------------------------
-def extract_brokerage(block: str) -> Dict[str, Any]:
-    import unicodedata, re
+def extract_brokerage(block: str, digits: Optional[str]=None) -> Dict[str, Any]:
     out: Dict[str, Any] = {}
-    bd = to_ascii_digits(block)
+    bd = digits if digits is not None else to_ascii_digits(block)
 
     # ========== Entity Info ==========
     ent: Dict[str, str] = {}
     
     # استخراج الاسم والعنوان
-    name_raw = pick_first(r"Brokerage\s*Entity\s*Name\s*[:：]?\s*(.+)", block, re.IGNORECASE)
-    address_raw = pick_first(r"Brokerage\s*Entity\s*Address\s*[:：]?\s*(.+)", block, re.IGNORECASE)
+    name_raw = pick_first("brokerage.entity_name", block)
+    address_raw = pick_first("brokerage.entity_address", block)
     
     # تنظيف الاسم والعنوان من الـ labels
     if name_raw:
         # إزالة الـ labels العربية والإنجليزية من الاسم
-        name_raw = re.sub(
-            r"(?:اسم\s*منش[اأإآ](?:ة|ﺔ)?\s*الوساطة\s*العقارية|ﺔﻳرﺎﻘﻌﻟا\s*ﺔﻃﺎﺳﻮﻟا\s*ةﺄﺸﻨﻣ\s*ﻢﺳا)\s*[:：]?\s*",
-            "",
-            name_raw,
-            flags=re.IGNORECASE
-        )
+        name_raw = RULES["brokerage.name_label"].sub("", name_raw)
         if ARABIC_CHARS.search(name_raw):
             ent["name"] = _fix_arabic_text(name_raw)
         else:
@@ -391,20 +1495,15 @@ def extract_brokerage(block: str) -> Dict[str, Any]:
     
     if address_raw:
         # إزالة الـ labels من العنوان
-        address_raw = re.sub(
-            r"(?:عنوان\s*منش[اأإآ](?:ة|ﺔ)?\s*الوساطة\s*العقارية|ﺔﻳرﺎﻘﻌﻟا\s*ﺔﻃﺎﺳﻮﻟا\s*ةﺄﺸﻨﻣ\s*ناﻮﻨﻋ)\s*[:：]?\s*",
-            "",
-            address_raw,
-            flags=re.IGNORECASE
-        )
+        address_raw = RULES["brokerage.address_label"].sub("", address_raw)
         if ARABIC_CHARS.search(address_raw):
             ent["address"] = _fix_arabic_text(address_raw)
         else:
             ent["address"] = norm_space(address_raw)
     
-    ent["cr_no"]    = pick_first(r"\bCR\s*No\.?\s*([0-9]+)", bd)
-    ent["landline"] = pick_first(r"Landline\s*No\.?\s*[:：]?\s*([0-9\-\s]+)", block, re.IGNORECASE)
-    ent["fax"]      = pick_first(r"Fax\s*No\.?\s*[:：]?\s*([0-9\-\s]+)", block, re.IGNORECASE)
+    ent["cr_no"]    = pick_first("brokerage.cr_no", bd)
+    ent["landline"] = pick_first("brokerage.landline", block)
+    ent["fax"]      = pick_first("brokerage.fax", block)
 
     ent = {k: v for k, v in ent.items() if v}
     if ent:
@@ -413,14 +1512,15 @@ def extract_brokerage(block: str) -> Dict[str, Any]:
     # ========== Brokers ==========
     brokers: List[Dict[str, str]] = []
 
-    for seg in re.finditer(r"(?is)Broker\s*Name\s+(.+?)(?=Broker\s*Name|$)", block):
-        chunk = "Name " + seg.group(1)
-        p = parse_person_card(chunk)
+    # كل وسيط من "Broker Name" حتى التالي
+    for m, end in segment_spans(block, RULES["brokerage.broker_boundary"], RULES["brokerage.broker_start"],
+                               nonempty=True):
+        p = parse_person_card("Name " + block[m.end():end], "Name " + bd[m.end():end])
         if any(p.values()):
             brokers.append(p)
 
     if not brokers:
-        brokers = extract_party_people(block)
+        brokers = extract_party_people(block, bd)
 
     # ========== Clean broker names ==========
     cleaned_brokers = []
@@ -428,20 +1528,12 @@ def extract_brokerage(block: str) -> Dict[str, Any]:
         name = b.get("name", "")
         if name:
             # Remove any labels
-            name = re.sub(
-                r"^\s*(?:"
-                r"الممثل\s*(?:النظامي|الرسمي)\s*(?:للمنشأة|لمنشأة\s*الوساطة\s*العقارية)?"
-                r"|اسم\s*الموظف|الموظف|Employee\s*Name|Name|اسم"
-                r")\s*[:：]?\s*",
-                "",
-                name,
-                flags=re.IGNORECASE,
-            )
+            name = RULES["brokerage.broker_label"].sub("", name)
 
             name = unicodedata.normalize("NFKC", name)
             name = name.replace("ﻻ", "ال")
-            name = re.sub(r"\bلا\b", "ال", name)
-            name = re.sub(r"\s+", " ", name).strip(" :،.-")
+            name = RULES["brokerage.la_word"].sub("ال", name)
+            name = WS_RE.sub(" ", name).strip(" :،.-")
 
             # reverse full name (Arabic order)
             
@@ -473,56 +1565,133 @@ def extract_brokerage(block: str) -> Dict[str, Any]:
 
 
 # ------------------------------
-# Property & Title Deeds
+# Label/value tokenizer
 # ------------------------------
-def extract_property(block: str) -> Dict[str, Any]:
-    import re, unicodedata
-
-    def reverse_arabic_word(word: str) -> str:
-        """يقلب الحروف داخل الكلمات العربية فقط"""
-        return word[::-1] if re.search(r"[\u0600-\u06FF]", word) else word
-
-    def fix_arabic_text(text: str) -> str:
-        """إصلاح اتجاه النص العربي كلمةً بحرف."""
-        if not text:
-            return ""
-        text = unicodedata.normalize("NFKC", text)
-        text = text.replace("ﻻ", "ال")
-        text = re.sub(r"\s+", " ", text).strip(" :،.-")
-
-        # نقلب كل كلمة عربية
-        words = text.split()
-        fixed_words = [reverse_arabic_word(w) for w in words]
-        text = " ".join(fixed_words)
-
-        # إصلاح الكلمات المعروفة
-        text = text.replace("نكس دارفأ", "سكن أفراد")
-        text = text.replace("ةرامع", "عمارة")
-        return text.strip()
+# كتلة العقار ومقاطع الوحدات سلسلة "عنوان قيمة"؛ بدل بحث مستقل لكل حقل (مرور كامل على النص لكل قاعدة)
+# تُجمع الكلمة الأولى لعنوان كل حقل في نمط كلمات واحد يمر على النص (بأحرف صغيرة) مرة،
+# وعند كل كلمة تُطابق قواعد الحقول التي تبدأ بها في موضعها فقط، كما في scan_sections.
+# كل تطابق لقاعدة ذات مرساة يبدأ بكلمتها، فأول موضع تُطابق فيه هو موضع RULES[rule].search نفسه ما دامت
+# كل ظهورات الكلمات تُزار: حقلان يطابقان في نفس الموضع يأخذه كلاهما، وكلمات قد تتداخل ظهوراتها
+# تُبحث بإزاحة حرف بدل finditer. check_parity.py يقارن النتيجة بالبحث المنفرد لكل قاعدة.
+_LABEL_WORD_RE = re.compile(r"[^\W\d_]+")
+# كلمة أقصر من هذا (مثل A في A.C. Type) تعطي مواضع مرشحة كثيرة → تُبحث قاعدتها منفردة
+MIN_LABEL_ANCHOR = 3
+
+class LabelScanner:
+    """
+    كلمات عناوين مجموعة حقول في نمط واحد: fields = {الحقل: (اسم القاعدة، "raw" أو "digits")}.
+    scan يُرجع {الحقل: تطابق القاعدة} لأول ظهور لكل حقل.
+    """
+    def __init__(self, rules: RuleSet, fields: Dict[str, Tuple[str, str]]):
+        self.fields = fields
+        self.rules = {field: rules[rule] for field, (rule, _) in fields.items()}
+        self.on_digits = frozenset(f for f, (_, src) in fields.items() if src == "digits")
+        self.solo: List[str] = []
+        anchors: Dict[str, List[str]] = {}
+        for field, (rule, _) in fields.items():
+            anchor = _literal_anchor(rules.patterns[rule], _LABEL_WORD_RE)
+            if anchor is None or len(anchor) < MIN_LABEL_ANCHOR:
+                self.solo.append(field)
+            else:
+                anchors.setdefault(anchor, []).append(field)
+        # الكلمة الأطول تُطابق أولاً في التناوب، فتُجرّب معها حقول الكلمات التي هي بادئة لها
+        self.by_word = {w: [(f, self.rules[f], f in self.on_digits) for f in fields
+                            if any(f in anchors[a] for a in anchors if w.startswith(a))]
+                        for w in anchors}
+        words = sorted(anchors, key=len, reverse=True)
+        self.keywords = re.compile("|".join(map(re.escape, words))) if words else None
+        self.keywords_ci = re.compile("|".join(map(re.escape, words)), re.IGNORECASE) if words else None
+        # ظهور كلمة قد يبدأ داخل ظهور أخرى (لاحقة إحداهما بادئة للأخرى، أو إحداهما داخلها)
+        # → finditer يتخطاه؛ مع قواعد مستبدلة تسمح بذلك يُبحث من الحرف التالي لكل تطابق
+        self.overlapping = any(a != b and (b in a[1:] or any(a.endswith(b[:k]) for k in range(1, len(b))))
+                               for a in words for b in words)
+
+    def _hits(self, rx: "re.Pattern[str]", text: str, pos: int, endpos: int):
+        if not self.overlapping:
+            return rx.finditer(text, pos, endpos)
+        return self._overlapping_hits(rx, text, pos, endpos)
+
+    @staticmethod
+    def _overlapping_hits(rx: "re.Pattern[str]", text: str, pos: int, endpos: int):
+        m = rx.search(text, pos, endpos)
+        while m:
+            yield m
+            m = rx.search(text, m.start() + 1, endpos)
+
+    def scan(self, raw: str, digits: Optional[str]=None, pos: int=0, endpos: Optional[int]=None,
+             folded: Optional[str]=None) -> Dict[str, "re.Match[str]"]:
+        """
+        raw وdigits متطابقا المواضع؛ قواعد "digits" تُطابق على digits والباقي على raw.
+        pos/endpos: مدى داخل النص (مقطع وحدة مثلاً) بدون نسخه.
+        folded: digits.lower() محسوباً مرة للكتلة كلها عند مسح مقاطع كثيرة منها.
+        """
+        digits = raw if digits is None else digits
+        endpos = len(raw) if endpos is None else endpos
+        found: Dict[str, "re.Match[str]"] = {}
+        for field in self.solo:
+            m = self.rules[field].search(digits if field in self.on_digits else raw, pos, endpos)
+            if m:
+                found[field] = m
+        if self.keywords is None:
+            return found
+        if folded is None:
+            folded = digits.lower()
+        if len(folded) == len(digits):
+            hits = self._hits(self.keywords, folded, pos, endpos)
+            fold = False
+        else:
+            # lower() غيّر الطول (حروف نادرة) → المواضع لا تتطابق؛ نبحث بدون تحويل
+            hits = self._hits(self.keywords_ci, digits, pos, endpos)
+            fold = True
+        total = len(self.fields)
+        by_word = self.by_word
+        for hit in hits:
+            word = hit.group()
+            start = hit.start()
+            for field, rx, on_digits in by_word[word.lower() if fold else word]:
+                if field in found:
+                    continue
+                m = rx.match(digits if on_digits else raw, start, endpos)
+                if m:
+                    found[field] = m
+            if len(found) == total:
+                break
+        return found
+
+def label_scanner(name: str, fields: Dict[str, Tuple[str, str]]) -> LabelScanner:
+    """ يُبنى مرة لكل مجموعة قواعد (إعادة تحميل القواعد تنشئ مجموعة جديدة فيُعاد بناؤه). """
+    rules = RULES
+    scanner = rules._label_scanners.get(name)
+    if scanner is None:
+        scanner = rules._label_scanners[name] = LabelScanner(rules, fields)
+    return scanner
 
+# ------------------------------
+# Property & Title Deeds
+# ------------------------------
+PROPERTY_COUNT_FIELDS = ("num_units", "num_floors", "num_parking", "num_elevators",
+                         "electricity_meters_count", "water_meters_count", "gas_meters_count")
+PROPERTY_LABELS: Dict[str, Tuple[str, str]] = {
+    "national_address": ("property.national_address", "raw"),
+    "property_usage":   ("property.usage", "raw"),
+    "property_type":    ("property.type", "raw"),
+    **{key: (f"property.{key}", "digits") for key in PROPERTY_COUNT_FIELDS},
+}
+
+def extract_property(block: str, digits: Optional[str]=None) -> Dict[str, Any]:
     def extract_numbers_only(text: str) -> str:
         """استخراج الأرقام فقط من النص."""
         if not text:
             return ""
         text = unicodedata.normalize("NFKC", text)
-        text = text.translate(str.maketrans("٠١٢٣٤٥٦٧٨٩", "0123456789"))
-        nums = re.findall(r"\d+", text)
+        text = text.translate(AR_NUMS)
+        nums = DIGITS_RE.findall(text)
         return "، ".join(nums)
 
-    # ========== استخراج الحقول ==========
-    out: Dict[str, Any] = {}
-    out["national_address"] = pick_first(r"National\s*Address\s*[:：]?\s*(.+)", block, re.IGNORECASE)
-    out["property_usage"]   = pick_first(r"Property\s*Usage\s*[:：]?\s*([^\n:]+)", block, re.IGNORECASE)
-    out["property_type"]    = pick_first(r"Property\s*Type\s*[:：]?\s*([^\n:]+)", block, re.IGNORECASE)
-
-    bd = to_ascii_digits(block)
-    out["num_units"]        = pick_first(r"Number\s*of\s*Units\s*[:：]?\s*([0-9]+)", bd, re.IGNORECASE)
-    out["num_floors"]       = pick_first(r"Number\s*of\s*Floors\s*[:：]?\s*([0-9]+)", bd, re.IGNORECASE)
-    out["num_parking"]      = pick_first(r"(?:Number\s*of\s*Parking(?:\s*Lots)?)\s*[:：]?\s*([0-9]+)", bd, re.IGNORECASE)
-    out["num_elevators"]    = pick_first(r"(?:Number\s*of\s*Elevators?)\s*[:：]?\s*([0-9]+)", bd, re.IGNORECASE)
-    out["electricity_meters_count"] = pick_first(r"Number\s*of\s*Electricity\s*Meters?\s*[:：]?\s*([0-9]+)", bd, re.IGNORECASE)
-    out["water_meters_count"]       = pick_first(r"Number\s*of\s*Water\s*Meters?\s*[:：]?\s*([0-9]+)", bd, re.IGNORECASE)
-    out["gas_meters_count"]         = pick_first(r"Number\s*of\s*Gas\s*Meters?\s*[:：]?\s*([0-9]+)", bd, re.IGNORECASE)
+    # ========== استخراج الحقول (مرور واحد على الكتلة) ==========
+    bd = digits if digits is not None else to_ascii_digits(block)
+    found = label_scanner("property", PROPERTY_LABELS).scan(block or "", bd)
+    out: Dict[str, Any] = {key: found[key].group(1) if key in found else "" for key in PROPERTY_LABELS}
 
     # 🧠 تصحيح الاتجاه / الفلاتر
     if out.get("national_address"):
@@ -530,31 +1699,29 @@ def extract_property(block: str) -> Dict[str, Any]:
 
     for k in ["property_usage", "property_type"]:
         if out.get(k):
-            out[k] = fix_arabic_text(out[k])
+            out[k] = fix_property_text(out[k])
 
     return {k: v for k, v in out.items() if v}
    
 
 
-def extract_title_deeds(block: str) -> Dict[str, Any]:
+def extract_title_deeds(block: str, digits: Optional[str]=None) -> Dict[str, Any]:
     """ يلتقط رقم الصك + الجهة + مكان/تاريخ الإصدار بدون تشويش. """
     out: Dict[str, Any] = {}
-    bd = to_ascii_digits(block)
+    bd = digits if digits is not None else to_ascii_digits(block)
 
     # رقم الصك: الرقم فقط
-    td = pick_first(r"(?i)\bTitle\s*Deed\s*No\.?\s*[:：]?\s*([0-9\-]+)\b", bd)
+    td = pick_first("titles.deed_no", bd)
     if td:
         out["title_deed_no"] = td
         out["ownership_no"]  = td
 
     # الجهة: قف عند أي حقل معروف تالٍ
-    issuer = pick_first(
-        r"(?is)\bIssuer\s*[:：]?\s*(.+?)(?=\s*(?:Title\s*Deed|Place\s*of\s*Issue|Issue\s*Date|$))",
-        block, re.IGNORECASE, post=lambda s: norm_space(re.sub(r"\s*[:：]\s*$","",s))
-    )
+    issuer = pick_first("titles.issuer", block,
+                        post=lambda s: norm_space(TRAILING_COLON_RE.sub("", s)))
     if issuer:
         # إزالة الـ label وتصحيح الاتجاه
-        issuer = re.sub(r"(?:جهة\s*الإصدار|راﺪﺻﻹا\s*ﺔﻬﺟ)\s*[:：]?\s*", "", issuer)
+        issuer = RULES["titles.issuer_label"].sub("", issuer)
         issuer = issuer.strip(" :：")
         if ARABIC_CHARS.search(issuer):
             out["title_deed_issuer"] = _fix_arabic_text(issuer)
@@ -562,13 +1729,10 @@ def extract_title_deeds(block: str) -> Dict[str, Any]:
             out["title_deed_issuer"] = issuer
 
     # مكان الإصدار
-    place = pick_first(
-        r"(?is)\bPlace\s*of\s*Issue\s*[:：]?\s*(.+?)(?=\s*(?:Issuer|Title\s*Deed|Issue\s*Date|$))",
-        block, re.IGNORECASE, post=norm_space
-    )
+    place = pick_first("titles.place", block, post=norm_space)
     if place:
         # إزالة الـ label وتصحيح الاتجاه
-        place = re.sub(r"(?:مكان\s*الإصدار|راﺪﺻﻹا\s*نﺎﻜﻣ)\s*[:：]?\s*", "", place)
+        place = RULES["titles.place_label"].sub("", place)
         place = place.strip(" :：")
         if ARABIC_CHARS.search(place):
             out["title_deed_place"] = _fix_arabic_text(place)
@@ -576,8 +1740,7 @@ def extract_title_deeds(block: str) -> Dict[str, Any]:
             out["title_deed_place"] = place
 
     # تاريخ الإصدار
-    issue_date = pick_first(r"(?i)\bIssue\s*Date\s*[:：]?\s*([0-9/\-]+)", bd,
-                            post=lambda x: parse_date_any(x) or x)
+    issue_date = pick_first("titles.issue_date", bd, post=lambda x: parse_date_any(x) or x)
     if issue_date:
         out["title_deed_issue_date"] = issue_date
 
@@ -586,74 +1749,78 @@ def extract_title_deeds(block: str) -> Dict[str, Any]:
 # ------------------------------
 # Units (+ meters/accounts)
 # ------------------------------
-def extract_unit_extras(seg: str) -> Dict[str, str]:
+UNIT_EXTRA_FIELDS = ("electricity_account_no", "electricity_meter_no", "water_account_no",
+                     "water_meter_no", "gas_account_no", "gas_meter_no", "ac_type")
+UNIT_EXTRA_FIELDS_AR = ("electricity_meter_no", "water_meter_no", "gas_meter_no")
+UNIT_LABELS: Dict[str, Tuple[str, str]] = {
+    "unit_type": ("unit.type", "raw"),
+    "unit_area": ("unit.area", "digits"),
+    **{key: (f"unit.{key}", "raw") for key in UNIT_EXTRA_FIELDS},
+    **{f"{key}_ar": (f"unit.{key}_ar", "raw") for key in UNIT_EXTRA_FIELDS_AR},
+}
+
+def scan_unit(block: str, digits: str, pos: int=0, endpos: Optional[int]=None,
+              folded: Optional[str]=None) -> Dict[str, "re.Match[str]"]:
+    """ كل حقول الوحدة (النوع، المساحة، العدادات والحسابات) في مرور واحد على مقطعها. """
+    return label_scanner("unit", UNIT_LABELS).scan(block, digits, pos, endpos, folded)
+
+def extract_unit_extras(seg: str, found: Optional[Dict[str, "re.Match[str]"]]=None) -> Dict[str, str]:
+    """ found: نتيجة scan_unit للمقطع إن سبق حسابها. """
+    if found is None:
+        found = scan_unit(seg, to_ascii_digits(seg))
     extras: Dict[str, str] = {}
-    patterns = [
-        ("electricity_account_no", r"(?i)Electricity\s*(?:Account|Acc(?:ount)?)\s*No\.?\s*([A-Za-z0-9\-]+)"),
-        ("electricity_meter_no",   r"(?i)Electricity\s*Meter\s*No\.?\s*([A-Za-z0-9\-]+)"),
-        ("water_account_no",       r"(?i)Water\s*(?:Account|Acc(?:ount)?)\s*No\.?\s*([A-Za-z0-9\-]+)"),
-        ("water_meter_no",         r"(?i)Water\s*Meter\s*No\.?\s*([A-Za-z0-9\-]+)"),
-        ("gas_account_no",         r"(?i)Gas\s*(?:Account|Acc(?:ount)?)\s*No\.?\s*([A-Za-z0-9\-]+)"),
-        ("gas_meter_no",           r"(?i)Gas\s*Meter\s*No\.?\s*([A-Za-z0-9\-]+)"),
-        ("ac_type",                r"(?i)A\.?C\.?\s*Type\s*[:：]?\s*([^\n:]+)"),
-    ]
-    for key, pat in patterns:
-        m = re.search(pat, seg)
+    for key in UNIT_EXTRA_FIELDS:
+        m = found.get(key)
         if m: extras[key] = norm_space(m.group(1))
 
     # Arabic fallbacks
-    ar_patterns = [
-        ("electricity_meter_no", r"عداد\s*الكهرب(?:اء)?\s*[:：]?\s*([0-9\-]+)"),
-        ("water_meter_no",       r"عداد\s*الم(?:ي|ياه)\s*[:：]?\s*([0-9\-]+)"),
-        ("gas_meter_no",         r"عداد\s*الغاز\s*[:：]?\s*([0-9\-]+)"),
-    ]
-    for key, pat in ar_patterns:
-        m = re.search(pat, seg)
+    for key in UNIT_EXTRA_FIELDS_AR:
+        m = found.get(f"{key}_ar")
         if m and key not in extras:
             extras[key] = norm_space(m.group(1))
 
     return extras
 
-import re
-import unicodedata
-from typing import List, Dict
-
-def extract_units(block: str) -> List[Dict[str, str]]:
+def extract_units(block: str, digits: Optional[str]=None) -> List[Dict[str, str]]:
     units: List[Dict[str, str]] = []
+    if digits is None:
+        digits = to_ascii_digits(block)
     
-    # 🔹 تقسيم كل وحدة (Unit)
-    for m in re.finditer(r"(?is)Unit\s*No\.?\s*([^\s:\n]+)([\s\S]{0,600}?)(?=Unit\s*No\.?|$)", block):
-        seg = m.group(0)
+    folded = digits.lower()
+
+    # 🔹 تقسيم كل وحدة (Unit): من "Unit No" حتى التالي مهما طال مقطعها
+    for m, end in segment_spans(block, RULES["unit.boundary"], RULES["unit.no"]):
+        found = scan_unit(block, digits, m.start(), end, folded)
         u: Dict[str, str] = {"unit_no": m.group(1).strip().strip(".")}
-        mtype = re.search(r"Unit\s*Type\s*([^\n:]+)", seg, re.IGNORECASE)
+        mtype = found.get("unit_type")
         if mtype:
             u["unit_type"] = norm_space(mtype.group(1))
-        marea = re.search(r"Unit\s*Area\s*([0-9\.,]+)", to_ascii_digits(seg), re.IGNORECASE)
+        marea = found.get("unit_area")
         if marea:
             try:
                 u["unit_area"] = f"{float(marea.group(1).replace(',', '')):.1f}"
             except:
                 pass
-        u.update(extract_unit_extras(seg))
+        u.update(extract_unit_extras(block, found))
         units.append({k: v for k, v in u.items() if v})
 
     # 🔹 fallback لو مافي أكثر من وحدة
     if not units:
-        seg = block
+        found = scan_unit(block, digits, folded=folded)
         u = {}
-        m = re.search(r"Unit\s*No\.?\s*([^\s:\n]+)", seg, re.IGNORECASE)
+        m = RULES["unit.no"].search(block)
         if m:
             u["unit_no"] = m.group(1).strip().strip(".")
-        m = re.search(r"Unit\s*Type\s*([^\n:]+)", seg, re.IGNORECASE)
+        m = found.get("unit_type")
         if m:
             u["unit_type"] = norm_space(m.group(1))
-        m = re.search(r"Unit\s*Area\s*([0-9\.,]+)", to_ascii_digits(seg), re.IGNORECASE)
+        m = found.get("unit_area")
         if m:
             try:
                 u["unit_area"] = f"{float(m.group(1).replace(',', '')):.1f}"
             except:
                 pass
-        u.update(extract_unit_extras(seg))
+        u.update(extract_unit_extras(block, found))
         if u:
             units.append({k: v for k, v in u.items() if v})
 
@@ -687,91 +1854,438 @@ def extract_units(block: str) -> List[Dict[str, str]]:
 # ------------------------------
 # Financial (VAT) & Payments
 # ------------------------------
-def extract_vat(financial_block: str) -> str:
-    bd = to_ascii_digits(financial_block)
-    m = re.search(r"\bVAT\b.*?(?:Value|amount)?\s*[:\-]?\s*([0-9\.,]+)", bd, re.IGNORECASE)
+def extract_vat(financial_block: str, digits: Optional[str]=None) -> str:
+    bd = digits if digits is not None else to_ascii_digits(financial_block)
+    m = RULES["financial.vat"].search(bd)
     if m:
         try: return f"{float(m.group(1).replace(',', '')):.2f}"
         except: pass
     return ""
 
-AMOUNT_RE = re.compile(r"(?<!\d)(\d{3,}(?:,\d{3})*\.\d{2})(?!\d)")
-AD_RE     = re.compile(r"\b(20\d{2}-\d{2}-\d{2})\b")
-AH_RE     = re.compile(r"\b(14\d{2}-\d{2}-\d{2})\b")
-
-def extract_payments(pay_block: str) -> Dict[str, Any]:
-    payments: List[Dict[str, str]] = []
-    block = to_ascii_digits(pay_block)
-
-    row_pat = re.compile(
-        r"(?m)^\s*(\d{3,}(?:,\d{3})*\.\d{2}).*?(14\d{2}-\d{2}-\d{2}).*?(20\d{2}-\d{2}-\d{2}).*$"
-    )
-    for m in row_pat.finditer(block):
-        amt = m.group(1).replace(",", "")
-        ad  = m.group(3)
-        payments.append({"due_date": ad, "amount": f"{float(amt):.2f}"})
-
-    if not payments:
-        for ln in block.splitlines():
-            ad = AD_RE.search(ln)
-            amt = AMOUNT_RE.search(ln)
-            if ad and amt:
-                payments.append({
-                    "due_date": parse_date_any(ad.group(1)) or ad.group(1),
-                    "amount": f"{float(amt.group(1).replace(',', '')):.2f}"
-                })
-
-    if not payments:
-        for ln in block.splitlines():
-            ah = AH_RE.search(ln)
-            amt = AMOUNT_RE.search(ln)
-            if ah and amt:
-                payments.append({
-                    "due_date": ah.group(1),
-                    "amount": f"{float(amt.group(1).replace(',', '')):.2f}"
-                })
+def _halalas(amount: str) -> int:
+    """
+    "60,000.00" → 6000000: المبالغ بالهللات كأعداد صحيحة، مقرّبة إلى 0.01 أياً كان عدد الخانات العشرية
+    (قاعدة مستبدلة قد تقبل "60,000" أو "60,000.5"). قيمة غير رقمية أو غير منتهية (NaN، Infinity) → ValueError.
+    """
+    try:
+        value = Decimal((amount or "").replace(",", "")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        value = None
+    if value is None or not value.is_finite():
+        raise ValueError(f"invalid amount: {amount!r}")
+    return int(value * 100)
 
-    seen=set(); uniq=[]
-    for p in payments:
-        key=(p["due_date"], p["amount"])
-        if key not in seen:
-            seen.add(key); uniq.append(p)
+def _fmt_halalas(h: int) -> str:
+    return f"{h // 100}.{h % 100:02d}"
+
+class PaymentSchedule:
+    """
+    جدول الدفعات كأعمدة متوازية: تاريخ الاستحقاق (ISO)، التاريخ الهجري المقابل، والمبلغ بالهللات
+    (None لمبلغ غير صالح من قاعدة مستبدلة: الدفعة تبقى بمبلغ فارغ وتُذكر في checks بدل إفشال الاستخراج).
+    calendar = "hijri" إذا لم توجد تواريخ ميلادية وكان الاستحقاق هو التاريخ الهجري نفسه.
+    """
+    __slots__ = ("due", "hijri", "halalas", "calendar")
+
+    def __init__(self, calendar: str="gregorian"):
+        self.due: List[str] = []
+        self.hijri: List[str] = []
+        self.halalas: List[Optional[int]] = []
+        self.calendar = calendar
+
+    def __len__(self) -> int:
+        return len(self.due)
+
+    def add(self, due: str, hijri: str, amount: str) -> None:
+        self.due.append(due)
+        self.hijri.append(hijri)
+        try:
+            self.halalas.append(_halalas(amount))
+        except ValueError:
+            self.halalas.append(None)
+
+    def dedupe(self) -> "PaymentSchedule":
+        """ إزالة الصفوف المكررة (نفس التاريخ والمبلغ) مع الحفاظ على الترتيب الأول. """
+        first: Dict[Tuple[str, Optional[int]], int] = {}
+        for i, key in enumerate(zip(self.due, self.halalas)):
+            first.setdefault(key, i)
+        if len(first) == len(self.due):
+            return self
+        idx = list(first.values())
+        self.due = [self.due[i] for i in idx]
+        self.hijri = [self.hijri[i] for i in idx]
+        self.halalas = [self.halalas[i] for i in idx]
+        return self
+
+    def rows(self) -> List[Dict[str, str]]:
+        return [{"due_date": d, "amount": _fmt_halalas(h) if h is not None else ""}
+                for d, h in zip(self.due, self.halalas)]
+
+    def checks(self, expected_total: Optional[str]=None) -> Dict[str, Any]:
+        """
+        فحوصات الجدول كمؤشرات: مجموع الدفعات مقابل قيمة العقد، تزايد التواريخ،
+        انتظام الفاصل (بالأشهر أو الأيام)، وتساوي المبالغ.
+        invalid_amounts: أرقام الدفعات (من 1) التي لم يُقرأ مبلغها؛ مع وجودها المجموع جزئي
+        فلا يُحكم على total_matches ولا uniform_amounts (None).
+        """
+        out: Dict[str, Any] = {"calendar": self.calendar}
+
+        invalid = [i + 1 for i, h in enumerate(self.halalas) if h is None]
+        amounts = [h for h in self.halalas if h is not None]
+        total = sum(amounts)
+        uniform = len(set(amounts)) == 1 if not invalid else None
+        out["invalid_amounts"] = invalid
+        out["payments_total"] = _fmt_halalas(total)
+        expected = None
+        if expected_total:
+            try:
+                expected = _halalas(expected_total)
+            except ValueError:
+                expected = None
+        out["expected_total"] = _fmt_halalas(expected) if expected is not None else None
+        out["total_matches"] = (total == expected) if expected is not None and not invalid else None
+        out["uniform_amounts"] = uniform
+
+        increasing = interval_months = interval_days = None
+        if len(self.due) > 1:
+            ymd = [(int(d[0:4]), int(d[5:7]), int(d[8:10])) if len(d) == 10 and d[4] == d[7] == "-" else None
+                   for d in self.due]
+            if all(ymd):
+                increasing = all(b > a for a, b in zip(ymd, ymd[1:]))
+                step_m = [(b[0] - a[0]) * 12 + b[1] - a[1] for a, b in zip(ymd, ymd[1:])]
+                if step_m[0] > 0 and len(set(step_m)) == 1 and len({d for _, _, d in ymd}) == 1:
+                    interval_months = step_m[0]
+                elif self.calendar == "gregorian":
+                    try:
+                        ords = [datetime(*t).toordinal() for t in ymd]
+                    except ValueError:
+                        ords = None
+                    if ords:
+                        step_d = [b - a for a, b in zip(ords, ords[1:])]
+                        if step_d[0] > 0 and len(set(step_d)) == 1:
+                            interval_days = step_d[0]
+        out["dates_increasing"] = increasing
+        out["interval_months"] = interval_months
+        out["interval_days"] = interval_days
+        return out
+
+def parse_payment_schedule(block: str, strategies: Tuple[str, ...]=PAYMENT_STRATEGIES) -> PaymentSchedule:
+    """
+    جدول الدفعات من مقطع القسم (بأرقام ASCII)؛ الاستراتيجيات بالترتيب حتى تنجح إحداها:
+    row الصف الكامل، ad ميلادي+مبلغ، ah هجري+مبلغ (ملف القالب يقدّم ما ينطبق على إصداره).
+    """
+    amount_re, ad_re, ah_re = RULES["payments.amount"], RULES["payments.ad_date"], RULES["payments.ah_date"]
+    sched = PaymentSchedule()
+    for strategy in strategies:
+        if strategy == "row":
+            for m in RULES["payments.row"].finditer(block):
+                sched.add(m.group(3), m.group(2), m.group(1))
+        elif strategy == "ad":
+            for ln in block.splitlines():
+                ad = ad_re.search(ln)
+                amt = amount_re.search(ln)
+                if ad and amt:
+                    ah = ah_re.search(ln)
+                    sched.add(parse_date_any(ad.group(1)) or ad.group(1), ah.group(1) if ah else "", amt.group(1))
+        elif strategy == "ah":
+            sched.calendar = "hijri"
+            for ln in block.splitlines():
+                ah = ah_re.search(ln)
+                amt = amount_re.search(ln)
+                if ah and amt:
+                    sched.add(ah.group(1), ah.group(1), amt.group(1))
+        if sched:
+            break
+    return sched.dedupe()
+
+def extract_payments(pay_block: str, digits: Optional[str]=None,
+                     expected_total: Optional[str]=None,
+                     profile: Optional[Dict[str, Any]]=None) -> Dict[str, Any]:
+    """ expected_total: قيمة العقد التي يجب أن يساويها مجموع الدفعات (total_contract_value أو الإيجار السنوي). """
+    block = digits if digits is not None else to_ascii_digits(pay_block)
+    sched = parse_payment_schedule(block, (profile or GENERIC_PROFILE)["payments"])
 
     out: Dict[str, Any] = {}
-    if uniq:
-        out["payments"] = uniq
-        out["installments_count"] = len(uniq)
-        amts = {p["amount"] for p in uniq}
-        if len(amts) == 1:
-            out["installment_amount"] = uniq[0]["amount"]
+    if sched:
+        out["payments"] = sched.rows()
+        out["installments_count"] = len(sched)
+        checks = sched.checks(expected_total)
+        if checks["uniform_amounts"]:
+            out["installment_amount"] = _fmt_halalas(sched.halalas[0])
+        out["payment_checks"] = checks
     return out
 
+# ------------------------------
+# Stage timings
+# ------------------------------
+class StageTimer:
+    """
+    يجمع زمن كل مرحلة من مراحل التحليل (بالثواني) بترتيب تنفيذها.
+    نفس الكائن يمرّ عبر extract_all ثم المعالجة العربية في الخادم، ويُعرض في debug وفي ترويسة Server-Timing.
+    """
+    __slots__ = ("stages", "pages", "peak_rss", "profile")
+
+    def __init__(self):
+        self.stages: "OrderedDict[str, float]" = OrderedDict()
+        self.pages: Optional[int] = None
+        self.peak_rss: Optional[int] = None  # بالبايت، من MemoryProbe
+        self.profile: Optional[str] = None  # ملف القالب المختار (انظر select_profile)
+
+    def stage(self, name: str) -> "_Stage":
+        return _Stage(self, name)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def as_ms(self) -> Dict[str, float]:
+        return {k: round(v * 1000, 3) for k, v in self.stages.items()}
+
+    def server_timing(self) -> str:
+        """ قيمة ترويسة Server-Timing (https://www.w3.org/TR/server-timing/). """
+        return ", ".join(f"{k};dur={v * 1000:.2f}" for k, v in self.stages.items())
+
+class _Stage:
+    __slots__ = ("timer", "name", "t0")
+
+    def __init__(self, timer: StageTimer, name: str):
+        self.timer, self.name = timer, name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, time.perf_counter() - self.t0)
+        return False
+
+# ------------------------------
+# Memory
+# ------------------------------
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def current_rss() -> Optional[int]:
+    """ الذاكرة المقيمة للعملية الآن بالبايت (لينكس فقط). """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+def peak_rss() -> Optional[int]:
+    """ ذروة الذاكرة المقيمة بالبايت: VmHWM على لينكس، وإلا ru_maxrss. """
+    try:
+        with open("/proc/self/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:  # ويندوز
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class MemoryProbe:
+    """
+    ذروة ذاكرة العملية أثناء تحليل مستند واحد.
+    على لينكس تُصفَّر الذروة في البداية (/proc/self/clear_refs) فتخص هذا المستند (exact=True)،
+    وإلا فهي ذروة عمر العملية. القراءة للعملية كلها: تشمل الطلبات المتزامنة في نفس العملية،
+    ولا تشمل عمليات page_workers.
+    """
+    __slots__ = ("exact", "start", "peak")
+
+    def __init__(self):
+        self.exact = False
+        self.start: Optional[int] = None
+        self.peak: Optional[int] = None
+
+    def begin(self) -> "MemoryProbe":
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+            self.exact = True
+        except OSError:
+            self.exact = False
+        self.start = current_rss()
+        return self
+
+    def end(self) -> Optional[int]:
+        self.peak = peak_rss()
+        return self.peak
+
+    def as_dict(self) -> Dict[str, Any]:
+        mb = lambda v: round(v / 2**20, 1) if v is not None else None
+        return {"start_rss_mb": mb(self.start), "peak_rss_mb": mb(self.peak), "exact": self.exact}
+
+# ------------------------------
+# Budgets & cancellation
+# ------------------------------
+# نسبة الوقت المتاحة لاستخراج الصفحات؛ الباقي للمستخرجات حتى تعمل على ما قُرئ
+TEXT_BUDGET_SHARE = 0.8
+# كل كم ثانية يُفحص الإلغاء أثناء انتظار عمّال الصفحات المتوازية
+BUDGET_POLL_S = 0.2
+CANCEL_DIR = os.path.join(tempfile.gettempdir(), "ejar_cancel")
+
+class ExtractionBudget:
+    """
+    ميزانية مستند واحد تُفحص تعاونياً بين الصفحات وبين مستخرجات الأقسام (لا تقطع صفحة أثناء تحليلها).
+    - time_ms: بعد TEXT_BUDGET_SHARE منه يتوقف استخراج الصفحات، وعند انتهائه تُتخطى المستخرجات المتبقية.
+    - max_pages: تُحلَّل أول max_pages صفحة فقط، والمستخرجات تعمل على ما قُرئ.
+    - cancel(): من خيط آخر (أمر cancel في وضع العامل)، أو cancel_file: وجود الملف يعني الإلغاء
+      (للإلغاء من عملية أخرى، مثل خادم ASGI عند انقطاع العميل).
+    النتيجة الجزئية تحمل data["partial"] ولا تُخزَّن في الكاش.
+    """
+    __slots__ = ("deadline", "text_deadline", "max_pages", "cancel_file", "started", "stopped",
+                 "text_cut", "pages_read", "unread_pages", "_cancel")
+
+    def __init__(self, time_ms: Optional[int]=None, max_pages: Optional[int]=None,
+                 cancel_file: Optional[str]=None):
+        self.started = time.monotonic()
+        self.deadline = self.started + time_ms / 1000 if time_ms else None
+        self.text_deadline = self.started + time_ms * TEXT_BUDGET_SHARE / 1000 if time_ms else None
+        self.max_pages = max_pages or None
+        self.cancel_file = cancel_file
+        self.stopped: Optional[str] = None  # "time" أو "cancelled"
+        self.text_cut = False  # توقف استخراج الصفحات عند text_deadline
+        self.pages_read = 0
+        self.unread_pages = 0
+        self._cancel = threading.Event()
+
+    @classmethod
+    def from_env(cls, time_ms: Optional[int]=None, max_pages: Optional[int]=None,
+                 cancel_file: Optional[str]=None) -> Optional["ExtractionBudget"]:
+        """ القيم المعطاة أو EJAR_TIME_BUDGET_MS / EJAR_MAX_PAGES؛ None إن لم يكن هناك أي حد. """
+        # 0 = بلا حد
+        if time_ms is None:
+            time_ms = int(os.environ.get("EJAR_TIME_BUDGET_MS", "0"))
+        if max_pages is None:
+            max_pages = int(os.environ.get("EJAR_MAX_PAGES", "0"))
+        if not (time_ms or max_pages or cancel_file):
+            return None
+        return cls(time_ms, max_pages, cancel_file)
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def exceeded(self) -> Optional[str]:
+        """ سبب التوقف إن وُجد؛ أول سبب يبقى ثابتاً. """
+        if self.stopped is None:
+            if self._cancel.is_set() or (self.cancel_file and os.path.exists(self.cancel_file)):
+                self.stopped = "cancelled"
+            elif self.deadline is not None and time.monotonic() >= self.deadline:
+                self.stopped = "time"
+        return self.stopped
+
+    def pages_exhausted(self) -> bool:
+        """ هل يجب التوقف عن استخراج الصفحات (إلغاء، أو انتهاء حصة النص من الوقت)؟ """
+        if self.exceeded():
+            return True
+        if self.text_deadline is not None and time.monotonic() >= self.text_deadline:
+            self.text_cut = True
+        return self.text_cut
+
+    def page_limit(self, n_pages: int) -> int:
+        """ عدد الصفحات الأولى المسموح بتحليلها؛ الباقي يُحسب غير مقروء. """
+        limit = min(n_pages, self.max_pages) if self.max_pages else n_pages
+        self.unread_pages += n_pages - limit
+        return limit
+
+    def wait(self, future) -> Optional[Any]:
+        """ نتيجة future من عامل متوازٍ، أو None إن انتهت الميزانية قبلها. """
+        from concurrent.futures import TimeoutError as FutureTimeout
+        while not self.pages_exhausted():
+            try:
+                return future.result(timeout=BUDGET_POLL_S)
+            except FutureTimeout:
+                continue
+        return None
+
+    @property
+    def partial(self) -> bool:
+        return self.stopped is not None or self.unread_pages > 0
+
+    def report(self, skipped_sections: List[str]) -> Dict[str, Any]:
+        return {
+            "reason": self.stopped or ("time" if self.text_cut else "pages"),
+            "pages_read": self.pages_read,
+            "unread_pages": self.unread_pages,
+            "skipped_sections": skipped_sections,
+            "elapsed_ms": round((time.monotonic() - self.started) * 1000, 1),
+        }
+
+def new_cancel_token() -> str:
+    """ مسار ملف إلغاء فريد (غير موجود بعد) يُمرَّر كـ cancel_file إلى عملية أخرى. """
+    os.makedirs(CANCEL_DIR, exist_ok=True)
+    return os.path.join(CANCEL_DIR, f"{os.getpid()}-{threading.get_ident()}-{time.monotonic_ns()}")
+
+def cancel_by_token(path: str) -> None:
+    open(path, "a").close()
+
+def discard_cancel_token(path: str) -> None:
+    """ يُستدعى بعد انتهاء المهمة (لا قبله، وإلا قد لا يرى العامل الإلغاء). """
+    try: os.remove(path)
+    except OSError: pass
+
 # ------------------------------
 # Extract All
 # ------------------------------
-def extract_all(pdf_path: str, debug: bool=False) -> Dict[str, Any]:
-    full_text, pages = extract_text(pdf_path)
-    spans = find_spans(full_text)
+def extract_sections(full_text: str, pages: Optional[List[str]]=None,
+                     sections: Optional[List[str]]=None,
+                     timer: Optional[StageTimer]=None,
+                     template_fields: Optional[Dict[str, str]]=None,
+                     budget: Optional[ExtractionBudget]=None) -> Tuple[Dict[str, Any], Dict[str, Tuple[int, int]]]:
+    """
+    كل ما بعد استخراج النص: تحديد الأقسام ثم مستخرجاتها على نص جاهز،
+    سواء جاء من PDF الآن (extract_all) أو من أرشيف النص (reextract_from_text).
+    يُرجع (الحقول، مواضع الأقسام).
+    """
+    wanted = list(sections) if sections else SECTION_KEYS
+    timer = timer if timer is not None else StageTimer()
+    template_fields = template_fields or {}
+    with timer.stage("normalize"):
+        doc = EjarDocument(full_text, pages)
+    with timer.stage("section_detection"):
+        spans = find_spans(doc.raw)
+    with timer.stage("profile"):
+        profile = select_profile(template_fingerprint(doc.raw))
+    timer.profile = profile["id"]
+    record_profile(profile["id"])
+
+    # الميزانية تُفحص قبل كل مستخرج؛ ما يُتخطى يُسجَّل ويُعامل كقسم غير موجود
+    skipped: List[str] = []
+
+    def allowed(key: str) -> bool:
+        if budget is not None and budget.exceeded():
+            skipped.append(key)
+            return False
+        return True
 
     data: Dict[str, Any] = {}
-    data.update(extract_basic(full_text))
-
-    lessor_block   = slice_section(full_text, spans, "lessor")
-    lessor_rep_blk = slice_section(full_text, spans, "lessor_rep")
-    tenant_block   = slice_section(full_text, spans, "tenant")
-    tenant_rep_blk = slice_section(full_text, spans, "tenant_rep")
-    brokerage_blk  = slice_section(full_text, spans, "brokerage")
-    titles_blk     = slice_section(full_text, spans, "titles")
-    property_blk   = slice_section(full_text, spans, "property")
-    financial_blk  = slice_section(full_text, spans, "financial")
-    units_blk      = slice_section(full_text, spans, "units")
-    pays_blk       = slice_section(full_text, spans, "payments")
-
-    tenant_company = extract_company_header(tenant_block, "tenant")
+    with timer.stage("basic"):
+        if template_fields_valid(template_fields):
+            # القالب طابق بمراسيه وكل حقوله قُرئت سليمة → لا مسح بالتعابير لهذه الحقول
+            data.update(template_fields)
+        else:
+            # قالب غير مطابق أو حقول ناقصة/مشكوك فيها → مسار التعابير، وعند الاختلاف تُقدّم قيمته
+            if allowed("basic"):
+                basic = extract_basic(doc.raw, doc.digits, profile)
+                check_template_fields(template_fields, basic)
+                data.update(basic)
+            data.update(template_fields)
+
+    def block(key: str) -> Tuple[str, str]:
+        if key not in wanted or key not in spans or not allowed(key):
+            return "", ""
+        return doc.slice(*spans[key])
+
+    tenant_block, tenant_d = block("tenant")
+    with timer.stage("tenant"):
+        tenant_company = extract_company_header(tenant_block, "tenant", tenant_d)
+        tenant_people = extract_party_people(tenant_block, tenant_d)
     data.update(tenant_company)
     
     # استخراج الاسم من tenant_block مباشرة (بدل الاعتماد على company header)
-    tenant_people = extract_party_people(tenant_block)
     if tenant_people and tenant_people[0].get("name"):
         data["tenant_name"] = tenant_people[0]["name"]
         if tenant_people[0].get("id"):
@@ -786,7 +2300,9 @@ def extract_all(pdf_path: str, debug: bool=False) -> Dict[str, Any]:
             if tenant_people[0].get("phone"):
                 data["tenant"]["phone"] = tenant_people[0]["phone"]
 
-    tenant_reps = extract_party_people(tenant_rep_blk)
+    tenant_rep_blk, tenant_rep_d = block("tenant_rep")
+    with timer.stage("tenant_rep"):
+        tenant_reps = extract_party_people(tenant_rep_blk, tenant_rep_d)
     if tenant_reps:
         data["tenant_reps"] = tenant_reps
     if not data.get("tenant_name") and tenant_reps:
@@ -795,7 +2311,9 @@ def extract_all(pdf_path: str, debug: bool=False) -> Dict[str, Any]:
         data["tenant_phone"] = tenant_reps[0].get("phone","")
         data["tenant_email"] = tenant_reps[0].get("email","")
 
-    lessors = extract_party_people(lessor_block)
+    lessor_block, lessor_d = block("lessor")
+    with timer.stage("lessor"):
+        lessors = extract_party_people(lessor_block, lessor_d)
     if lessors:
         data["lessors"] = lessors
         first = lessors[0]
@@ -804,73 +2322,980 @@ def extract_all(pdf_path: str, debug: bool=False) -> Dict[str, Any]:
         if first.get("phone"): data["lessor_phone"] = first["phone"]
         if first.get("email"): data["lessor_email"] = first["email"]
 
-    lessor_reps = extract_party_people(lessor_rep_blk)
+    lessor_rep_blk, lessor_rep_d = block("lessor_rep")
+    with timer.stage("lessor_rep"):
+        lessor_reps = extract_party_people(lessor_rep_blk, lessor_rep_d)
     if lessor_reps:
         data["lessor_reps"] = lessor_reps
 
-    brok = extract_brokerage(brokerage_blk)
+    brokerage_blk, brokerage_d = block("brokerage")
+    with timer.stage("brokerage"):
+        brok = extract_brokerage(brokerage_blk, brokerage_d)
     if brok: data.update(brok)
 
-    prop = extract_property(property_blk)
+    property_blk, property_d = block("property")
+    with timer.stage("property"):
+        prop = extract_property(property_blk, property_d)
     if prop: data["property"] = prop
-    tds = extract_title_deeds(titles_blk)
+    titles_blk, titles_d = block("titles")
+    with timer.stage("titles"):
+        tds = extract_title_deeds(titles_blk, titles_d)
     if tds: data.update(tds)
 
-    units = extract_units(units_blk)
+    units_blk, units_d = block("units")
+    with timer.stage("units"):
+        units = extract_units(units_blk, units_d)
     if units:
         data["units"] = units
         u0 = units[0]
         for k in ["unit_no","unit_type","unit_area"]:
             if k in u0: data[k] = u0[k]
 
-    vat = extract_vat(financial_blk)
+    financial_blk, financial_d = block("financial")
+    with timer.stage("financial"):
+        vat = extract_vat(financial_blk, financial_d)
     if vat: data["vat_value"] = vat
     data.setdefault("vat_value", "")
-    data.update(extract_payments(pays_blk))
+    pays_blk, pays_d = block("payments")
+    with timer.stage("payments"):
+        data.update(extract_payments(pays_blk, pays_d,
+                                     expected_total=data.get("total_contract_value") or data.get("annual_rent"),
+                                     profile=profile))
     data.setdefault("first_payment", "")
 
+    if budget is not None and budget.partial:
+        if budget.unread_pages:
+            # قسم لم يظهر عنوانه فيما قُرئ قد يكون في الصفحات المتروكة
+            skipped.extend(k for k in wanted if k not in spans and k not in skipped)
+        data["partial"] = budget.report(skipped)
+    return data, spans
+
+def extract_all(pdf_path: PdfSource, debug: bool=False,
+                page_workers: Optional[int]=None,
+                sections: Optional[List[str]]=None,
+                lazy_pages: Optional[bool]=None,
+                timer: Optional[StageTimer]=None,
+                engine: Optional[str]=None,
+                template: Optional[bool]=None,
+                stream_pages: Optional[bool]=None,
+                keep_full_text: bool=True,
+                budget: Optional[ExtractionBudget]=None,
+                archive: Optional["TextArchive"]=None,
+                pdf_digest: Optional[str]=None) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    pdf_path: مسار الملف أو محتواه (bytes، mmap، كائن ملف ...؛ انظر open_pdf).
+    sections: الأقسام المطلوب استخراجها (الإفتراضي كلها)؛ الحقول الأساسية تُستخرج دائماً.
+    lazy_pages: تحليل تخطيط الصفحات التي تحتاجها هذه الأقسام فقط (EJAR_LAZY_PAGES=1).
+    engine: محرك استخراج النص (انظر TEXT_ENGINES).
+    template: قراءة الحقول الأساسية من مربعات القالب المطابق (EJAR_TEMPLATE=1 وEJAR_LAYOUTS_FILE)؛
+              قالب مقروء كاملاً بقيم سليمة (template_fields_valid) يغني عن مسح التعابير لهذه الحقول،
+              وإلا تُقارن بمسار التعابير وعند الاختلاف تُقدّم قيمة التعابير.
+    timer: StageTimer لتسجيل زمن كل مرحلة (مع debug تُضاف الأزمنة إلى data["debug"]["timings_ms"]).
+           timer.peak_rss: ذروة ذاكرة العملية أثناء المستند (انظر MemoryProbe).
+    stream_pages: تحرير كائنات كل صفحة بعد أخذ نصها (انظر extract_text).
+    keep_full_text: False → يُرجع None بدل النص الكامل فلا يبقى في الذاكرة (ولا في الكاش) بعد التحليل.
+    budget: حدود الوقت/الصفحات والإلغاء (الإفتراضي ExtractionBudget.from_env)؛ عند تجاوزها تُرجع
+            نتيجة جزئية فيها data["partial"] = {reason, pages_read, unread_pages, skipped_sections, ...}.
+    archive: حفظ نص الصفحات في أرشيف النص (الإفتراضي EJAR_TEXT_ARCHIVE إن وُجد) لإعادة التحليل لاحقاً
+             بدون PDF؛ يُحفظ النص الكامل فقط (ليس مع lazy_pages أو نتيجة جزئية).
+    pdf_digest: pdf_sha256 إن كان محسوباً مسبقاً (مفتاح الأرشيف).
+    """
+    memory = MemoryProbe().begin()
+    if budget is None:
+        budget = ExtractionBudget.from_env()
+    if page_workers is None:
+        page_workers = int(os.environ.get("EJAR_PAGE_WORKERS", "0")) or None
+    if lazy_pages is None:
+        lazy_pages = os.environ.get("EJAR_LAZY_PAGES", "0") == "1"
+    if template is None:
+        template = os.environ.get("EJAR_TEMPLATE", "0") == "1"
+    wanted = list(sections) if sections else SECTION_KEYS
+    timer = timer if timer is not None else StageTimer()
+
+    layouts = get_layouts() if template else None
+    tpl: Dict[str, Any] = {"id": None, "fields": {}}
+
+    def read_template(text_doc: TextEngine) -> bool:
+        # القوالب تحتاج إحداثيات الحروف → متاحة مع محرك pdfplumber فقط
+        if layouts is None or not isinstance(text_doc, PdfplumberEngine):
+            return False
+        with timer.stage("template"):
+            tpl["id"], tpl["fields"] = extract_template_fields(text_doc.pages, layouts)
+        return len(tpl["fields"]) == len(TEMPLATE_FIELDS)
+
+    with timer.stage("text_extraction"):
+        full_text, pages = extract_text(pdf_path, workers=page_workers,
+                                        sections=wanted if lazy_pages else None, engine=engine,
+                                        on_open=read_template, stream_pages=stream_pages, budget=budget)
+    timer.pages = len(pages)
+    archive = archive if archive is not None else get_text_archive()
+    if archive is not None and not lazy_pages and not (budget is not None and budget.partial):
+        with timer.stage("text_archive"):
+            archive.put(pdf_digest or pdf_sha256(pdf_path), resolve_engine(engine), pages)
+    data, spans = extract_sections(full_text, pages, wanted, timer=timer,
+                                   template_fields=tpl["fields"], budget=budget)
+    timer.peak_rss = memory.end()
+
     if debug:
         data["debug"] = {
             "spans": {k:list(v) for k,v in spans.items()},
             "pages_count": len(pages),
             "per_page_lengths": [len(p or "") for p in pages],
+            "lazy_pages": bool(lazy_pages),
+            "text_engine": resolve_engine(engine),
+            "template": tpl["id"],
+            "template_fields": sorted(tpl["fields"]),
+            "profile": timer.profile,
+            "timings_ms": timer.as_ms(),
+            "memory": memory.as_dict(),
         }
-    return data, full_text
+    return data, (full_text if keep_full_text else None)
+
+# ------------------------------
+# Result cache (content-addressed)
+# ------------------------------
+def pdf_sha256(pdf_path: PdfSource) -> str:
+    """ بصمة المحتوى لأي PdfSource؛ المصادر في الذاكرة تُجزَّأ مباشرة من الـ buffer. """
+    if isinstance(pdf_path, (bytes, bytearray, memoryview, mmap.mmap)):
+        with memoryview(pdf_path) as view:
+            return hashlib.sha256(view).hexdigest()
+    h = hashlib.sha256()
+    if is_path_source(pdf_path):
+        with open(pdf_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+    pos = pdf_path.tell()
+    pdf_path.seek(0)
+    for chunk in iter(lambda: pdf_path.read(1 << 20), b""):
+        h.update(chunk)
+    pdf_path.seek(pos)
+    return h.hexdigest()
+
+class ResultCache:
+    """
+    كاش لنتائج extract_all مفتاحه SHA-256 لملف PDF + إصدار القواعد (RULES.version).
+    طبقتان: LRU داخل العملية، وملفات JSON على القرص مع إخلاء الأقدم عند تجاوز الحجم.
+    حجم القرص يُتابع تقديرياً مع كل كتابة، ولا يُعاد مسح المجلد إلا عند تجاوز الحد أو كل evict_every كتابة
+    (لالتقاط ما تكتبه العمليات الأخرى في نفس المجلد).
+    """
+    evict_every = 32
+    low_water = 0.9  # الإخلاء ينزل إلى 90% من الحد حتى لا تعيد كل كتابة تالية المسح
+
+    def __init__(self, cache_dir: Optional[str] = None, max_items: int = 128,
+                 max_disk_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.max_disk_bytes = max_disk_bytes
+        self._mem: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._disk_bytes: Optional[int] = None  # None = غير معروف بعد → مسح عند أول كتابة
+        self._puts_since_scan = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(pdf_digest: str, **options: Any) -> str:
+        """ options: أي خيار يغيّر شكل النتيجة (debug، الأقسام المطلوبة، ...). """
+        tag = f"{RULES.version}|{json.dumps(options, sort_keys=True)}|{pdf_digest}"
+        return hashlib.sha256(tag.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        with self._lock:
+            raw = self._mem.get(key)
+            if raw is not None:
+                self._mem.move_to_end(key)
+        from_disk = raw is None and bool(self.cache_dir)
+        if from_disk:
+            path = self._disk_path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    raw = f.read()
+                os.utime(path)  # تحديث وقت الاستخدام لسياسة الإخلاء
+            except OSError:
+                raw = None
+            except ValueError:
+                raw = ""  # ليس UTF-8 → تالف
+        entry = self._parse(raw) if raw is not None else None
+        if raw is not None and entry is None:
+            # مدخل مقطوع أو تالف (كتابة منقطعة، قرص ممتلئ...) → يُحذف ويُعامل كـ miss
+            self._discard(key)
+        elif from_disk and entry is not None:
+            self._remember(key, raw)
+        hit = entry is not None and entry.get("version") == RULES.version
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return (entry["data"], entry["full_text"]) if hit else None
+
+    @staticmethod
+    def _parse(raw: str) -> Optional[Dict[str, Any]]:
+        try:
+            entry = json.loads(raw)
+        except ValueError:
+            return None
+        if not isinstance(entry, dict) or "data" not in entry or "full_text" not in entry:
+            return None
+        return entry
+
+    def _discard(self, key: str) -> None:
+        with self._lock:
+            self._mem.pop(key, None)
+        if self.cache_dir:
+            try: os.remove(self._disk_path(key))
+            except OSError: pass
+
+    def put(self, key: str, result: Tuple[Dict[str, Any], str]) -> None:
+        data, full_text = result
+        raw = json.dumps({"version": RULES.version, "data": data, "full_text": full_text},
+                         ensure_ascii=False)
+        self._remember(key, raw)
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        blob = raw.encode("utf-8")
+        try:
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, path)
+        except OSError:
+            try: os.remove(tmp)
+            except OSError: pass
+            return
+        with self._lock:
+            self._puts_since_scan += 1
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(blob)  # استبدال مفتاح موجود يُحسب مرتين → تقدير أعلى لا أقل
+            scan = (self._disk_bytes is None or self._disk_bytes > self.max_disk_bytes
+                    or self._puts_since_scan >= self.evict_every)
+            if scan:
+                self._puts_since_scan = 0
+        if scan:
+            self._evict_disk()
+
+    def _remember(self, key: str, raw: str) -> None:
+        with self._lock:
+            self._mem[key] = raw
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_items:
+                self._mem.popitem(last=False)
+
+    def _evict_disk(self) -> None:
+        """ مسح المجلد وحذف الأقدم استخداماً حتى ينزل الحجم إلى low_water من الحد، مع تحديث الحجم المتابَع. """
+        stats = []
+        try:
+            for e in os.scandir(self.cache_dir):
+                if not e.name.endswith(".json"):
+                    continue
+                try:
+                    if not e.is_file():
+                        continue
+                    st = e.stat()  # قد يحذفه عامل آخر بين المسح والقراءة
+                except OSError:
+                    continue
+                stats.append((st.st_mtime, st.st_size, e.path))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in stats)
+        if total > self.max_disk_bytes:
+            target = int(self.max_disk_bytes * self.low_water)
+            for _, size, path in sorted(stats):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= target:
+                    break
+        with self._lock:
+            self._disk_bytes = total
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._disk_bytes = None
+        if self.cache_dir:
+            for e in os.scandir(self.cache_dir):
+                if e.name.endswith(".json"):
+                    try: os.remove(e.path)
+                    except OSError: pass
+
+_default_cache: Optional[ResultCache] = None
+
+def get_default_cache() -> Optional[ResultCache]:
+    """ الكاش الافتراضي للعملية (يُعطّل بـ EJAR_CACHE=0). """
+    global _default_cache
+    if os.environ.get("EJAR_CACHE", "1") == "0":
+        return None
+    if _default_cache is None:
+        _default_cache = ResultCache(
+            cache_dir=os.environ.get("EJAR_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "ejar_cache"),
+            max_items=int(os.environ.get("EJAR_CACHE_ITEMS", "128")),
+            max_disk_bytes=int(os.environ.get("EJAR_CACHE_MAX_MB", "256")) * 1024 * 1024,
+        )
+    return _default_cache
+
+def extract_all_cached(pdf_path: PdfSource, debug: bool=False,
+                       cache: Optional[ResultCache]=None,
+                       sections: Optional[List[str]]=None,
+                       lazy_pages: Optional[bool]=None,
+                       timer: Optional[StageTimer]=None,
+                       engine: Optional[str]=None,
+                       template: Optional[bool]=None,
+                       keep_full_text: bool=True,
+                       budget: Optional[ExtractionBudget]=None) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    extract_all مع كاش مبني على محتوى الملف؛ بدون كاش متاح يستدعي extract_all مباشرة.
+    keep_full_text=False: النتيجة تُخزَّن بدون النص الكامل (مدخل أصغر بكثير) تحت مفتاح مستقل.
+    النتائج الجزئية (ميزانية أو إلغاء) لا تُخزَّن.
+    """
+    if lazy_pages is None:
+        lazy_pages = os.environ.get("EJAR_LAZY_PAGES", "0") == "1"
+    if template is None:
+        template = os.environ.get("EJAR_TEMPLATE", "0") == "1"
+    sections = sorted(sections) if sections else None
+    engine = resolve_engine(engine)
+    cache = cache or get_default_cache()
+    if cache is None:
+        return extract_all(pdf_path, debug=debug, sections=sections, lazy_pages=lazy_pages,
+                           timer=timer, engine=engine, template=template, keep_full_text=keep_full_text,
+                           budget=budget)
+    timer = timer if timer is not None else StageTimer()
+    layouts = get_layouts() if template else None
+    with timer.stage("cache_lookup"):
+        digest = pdf_sha256(pdf_path)
+        key = cache.key(digest, debug=debug, sections=sections,
+                        lazy_pages=lazy_pages, engine=engine,
+                        layouts=layouts.version if layouts else None,
+                        **({} if keep_full_text else {"full_text": False}),
+                        **({} if USE_PROFILES else {"profiles": False}))
+        hit = cache.get(key)
+    if hit is not None:
+        return hit
+    result = extract_all(pdf_path, debug=debug, sections=sections, lazy_pages=lazy_pages,
+                         timer=timer, engine=engine, template=template, keep_full_text=keep_full_text,
+                         budget=budget, pdf_digest=digest)
+    if "partial" not in result[0]:
+        cache.put(key, result)
+    return result
+
+# ------------------------------
+# Text-layer archive
+# ------------------------------
+class TextArchive:
+    """
+    أرشيف طبقة النص: نص كل صفحة كما أخرجه المحرك، مضغوطاً بـ gzip ومفتاحه بصمة الملف + المحرك.
+    استخراج النص هو الخطوة المكلفة؛ بعد تعديل القواعد يُعاد تشغيل find_spans والمستخرجات فقط
+    على النص المخزن (reextract_from_text / --reextract) دون فتح أي PDF.
+
+        <root>/<sha256[:2]>/<sha256>.<engine>.json.gz
+    """
+    FORMAT = 1
+
+    def __init__(self, root: str, level: int=6):
+        self.root = root
+        self.level = level
+
+    def _path(self, digest: str, engine: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}.{engine}.json.gz")
+
+    def has(self, digest: str, engine: str) -> bool:
+        return os.path.isfile(self._path(digest, engine))
+
+    def put(self, digest: str, engine: str, pages: List[str]) -> None:
+        path = self._path(digest, engine)
+        if os.path.isfile(path):
+            return  # نفس الملف ونفس المحرك → نفس النص
+        raw = json.dumps({"format": self.FORMAT, "sha256": digest, "engine": engine, "pages": pages},
+                         ensure_ascii=False).encode("utf-8")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(gzip.compress(raw, compresslevel=self.level))
+            os.replace(tmp, path)
+        except OSError:
+            try: os.remove(tmp)
+            except OSError: pass
+
+    def get(self, digest: str, engine: str) -> Optional[List[str]]:
+        try:
+            with open(self._path(digest, engine), "rb") as f:
+                entry = json.loads(gzip.decompress(f.read()).decode("utf-8"))
+        except (OSError, ValueError, EOFError):
+            return None
+        return entry.get("pages") if entry.get("format") == self.FORMAT else None
+
+    def entries(self, engine: Optional[str]=None) -> List[Tuple[str, str]]:
+        """ [(sha256, engine)] لكل ما في الأرشيف (أو لمحرك واحد)، مرتبة. """
+        found = []
+        for path in glob.glob(os.path.join(self.root, "??", "*.json.gz")):
+            digest, _, rest = os.path.basename(path).partition(".")
+            eng = rest[:-len(".json.gz")]
+            if engine is None or eng == engine:
+                found.append((digest, eng))
+        return sorted(found)
+
+_default_archive: Optional[TextArchive] = None
+
+def get_text_archive() -> Optional[TextArchive]:
+    """ أرشيف النص الافتراضي من EJAR_TEXT_ARCHIVE (مجلد)؛ None إن لم يُضبط. """
+    global _default_archive
+    root = os.environ.get("EJAR_TEXT_ARCHIVE")
+    if not root:
+        return None
+    if _default_archive is None or _default_archive.root != root:
+        _default_archive = TextArchive(root)
+    return _default_archive
+
+def reextract_from_text(digest: str, archive: Optional[TextArchive]=None,
+                        engine: Optional[str]=None, sections: Optional[List[str]]=None,
+                        debug: bool=False,
+                        timer: Optional[StageTimer]=None) -> Optional[Dict[str, Any]]:
+    """
+    إعادة تحليل عقد من نصه المؤرشف بالقواعد الحالية؛ None إن لم يكن في الأرشيف.
+    النتيجة مطابقة لـ extract_all بدون قالب (الحقول من مربعات القالب تحتاج PDF).
+    """
+    archive = archive or get_text_archive()
+    if archive is None:
+        raise ValueError("no text archive configured (EJAR_TEXT_ARCHIVE)")
+    engine = resolve_engine(engine)
+    timer = timer if timer is not None else StageTimer()
+    with timer.stage("text_archive"):
+        pages = archive.get(digest, engine)
+    if pages is None:
+        return None
+    timer.pages = len(pages)
+    data, spans = extract_sections("\n".join(pages), pages, sections, timer=timer)
+    if debug:
+        data["debug"] = {
+            "spans": {k: list(v) for k, v in spans.items()},
+            "pages_count": len(pages),
+            "per_page_lengths": [len(p or "") for p in pages],
+            "text_source": "archive",
+            "text_engine": engine,
+            "profile": timer.profile,
+            "timings_ms": timer.as_ms(),
+        }
+    return data
+
+def _reextract_job(args: Tuple[str, str, str, Optional[List[str]]]) -> Dict[str, Any]:
+    root, digest, engine, sections = args
+    try:
+        data = reextract_from_text(digest, TextArchive(root), engine=engine, sections=sections)
+        if data is None:
+            return {"sha256": digest, "engine": engine, "ok": False, "error": "missing from archive"}
+        return {"sha256": digest, "engine": engine, "ok": True, "data": data}
+    except Exception as e:
+        return {"sha256": digest, "engine": engine, "ok": False, "error": str(e),
+                "error_type": type(e).__name__}
+
+def run_reextract(archive: TextArchive, out_path: str, digests: Optional[List[str]]=None,
+                  engine: Optional[str]=None, sections: Optional[List[str]]=None,
+                  jobs: Optional[int]=None) -> Dict[str, int]:
+    """
+    إعادة تحليل الأرشيف كاملاً (أو بصمات محددة) بالقواعد الحالية إلى JSONL:
+    سطر {"sha256", "engine", "ok", "data"} لكل عقد، بترتيب البصمات.
+    """
+    engine = resolve_engine(engine)
+    todo = list(digests) if digests else [d for d, _ in archive.entries(engine)]
+    stats = {"total": len(todo), "ok": 0, "failed": 0}
+    work = [(archive.root, d, engine, sections) for d in todo]
+    with open(out_path, "w", encoding="utf-8") as out_f:
+
+        def record(res: Dict[str, Any]) -> None:
+            out_f.write(json.dumps(res, ensure_ascii=False) + "\n")
+            stats["ok" if res["ok"] else "failed"] += 1
+            n = stats["ok"] + stats["failed"]
+            if not res["ok"] or n % 500 == 0 or n == len(work):
+                label = "OK" if res["ok"] else f"FAIL {res.get('error')} {res['sha256']}"
+                print(f"[{n}/{len(work)}] {label}", file=sys.stderr, flush=True)
+
+        if jobs == 1 or len(work) < 2:
+            for w in work:
+                record(_reextract_job(w))
+            return stats
+
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            # كل عقد يستغرق مللي ثوانٍ → دفعات كبيرة لكل عامل بدل مهمة لكل عقد
+            for res in ex.map(_reextract_job, work, chunksize=max(1, min(64, len(work) // 32))):
+                record(res)
+    return stats
+
+# ------------------------------
+# Worker mode (--serve)
+# ------------------------------
+BUDGET_FIELDS = ("time_budget_ms", "max_pages")
+
+def budget_options(fields) -> Dict[str, int]:
+    """
+    حقلا الميزانية من مهمة JSON أو حقول نموذج HTTP كأعداد صحيحة غير سالبة (الغائب يُترك للبيئة).
+    قيمة خاطئة → ValueError برسالة تصلح للرد على المستدعي (400 / ok:false).
+    """
+    out: Dict[str, int] = {}
+    for key in BUDGET_FIELDS:
+        value = fields.get(key)
+        if value is None or value == "":
+            continue
+        if isinstance(value, str) and value.strip().isdigit():
+            value = int(value)
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"{key} must be a non-negative integer, got {value!r}")
+        out[key] = value
+    return out
+
+def job_budget(job, cancel_file: Optional[str]=None) -> Optional[ExtractionBudget]:
+    """ ميزانية من حقلي time_budget_ms / max_pages (انظر budget_options)، وإلا من البيئة. """
+    options = budget_options(job)
+    return ExtractionBudget.from_env(time_ms=options.get("time_budget_ms"), max_pages=options.get("max_pages"),
+                                     cancel_file=cancel_file)
+
+def handle_job(job: Dict[str, Any], budget: Optional[ExtractionBudget]=None) -> Dict[str, Any]:
+    """
+    تنفيذ مهمة واحدة من وضع العامل وإرجاع رد قابل للتسلسل إلى JSON.
+    budget: ميزانية المهمة (serve ينشئها عند استلامها حتى يستطيع أمر cancel الوصول إليها).
+    """
+    job_id = job.get("id")
+    cmd = job.get("cmd", "extract")
+    if cmd == "ping":
+        return {"id": job_id, "ok": True, "pong": True}
+    if cmd == "reload_rules":
+        rules = reload_rules(job.get("path"))
+        return {"id": job_id, "ok": True, "rules_version": rules.version}
+    if cmd == "stats":
+        cache = get_default_cache()
+        return {"id": job_id, "ok": True, "pid": os.getpid(), "arabic_memo": arabic_memo_stats(),
+                "profiles": profile_stats(),
+                "result_cache": {"hits": cache.hits, "misses": cache.misses} if cache else None}
+    if cmd != "extract":
+        return {"id": job_id, "ok": False, "error": f"unknown cmd: {cmd}"}
+
+    # الملف إما مسار على القرص أو محتواه مباشرة (pdf_b64) بدون ملف مؤقت
+    if job.get("pdf_b64"):
+        source: PdfSource = base64.b64decode(job["pdf_b64"])
+    else:
+        source = job.get("pdf_path")
+        if not source or not os.path.isfile(source):
+            return {"id": job_id, "ok": False, "error": f"file not found: {source}"}
+
+    data, _ = extract_all_cached(source, debug=bool(job.get("debug")),
+                                 sections=job.get("sections"), lazy_pages=job.get("lazy_pages"),
+                                 engine=job.get("engine"), template=job.get("template"),
+                                 keep_full_text=False,
+                                 budget=budget if budget is not None else job_budget(job))
+    if job.get("fix_arabic"):
+        data = walk_and_fix_arabic(data, shape=bool(job.get("shape_ar")), in_place=True)
+    return {"id": job_id, "ok": True, "data": data}
+
+def serve(stdin=None, stdout=None) -> None:
+    """
+    وضع العامل الدائم: يقرأ مهام JSON (سطر لكل مهمة) من stdin ويكتب نتيجة واحدة لكل سطر على stdout.
+    يبقى المفسّر والمكتبات والتعابير المترجمة محمّلة بين المهام.
+    stdin يُقرأ في خيط مستقل حتى يصل {"cmd": "cancel", "job_id": ...} أثناء تنفيذ مهمة:
+    المهمة الجارية تتوقف عند أول فحص للميزانية، والمنتظرة تُنفَّذ ملغاة (نتيجة جزئية فورية).
+    """
+    stdin = stdin or sys.stdin
+    out = stdout or sys.stdout
+    if hasattr(out, "reconfigure"):
+        out.reconfigure(encoding="utf-8")
+    # أي طباعة عرضية من المكتبات تذهب إلى stderr حتى لا تفسد البروتوكول
+    sys.stdout = sys.stderr
+
+    lock = threading.Lock()
+
+    def emit(msg: Dict[str, Any]) -> None:
+        line = json.dumps(msg, ensure_ascii=False) + "\n"
+        with lock:
+            out.write(line)
+            out.flush()
+
+    jobs: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+    budgets: Dict[Any, ExtractionBudget] = {}  # المهام المنتظرة والجارية → ميزانيتها
+
+    def read_jobs() -> None:
+        for line in stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                emit({"id": None, "ok": False, "error": f"invalid job: {e}"})
+                continue
+            if not isinstance(job, dict):
+                emit({"id": None, "ok": False, "error": "invalid job: expected a JSON object"})
+                continue
+            # خطأ في مهمة واحدة يُرد عليها وحدها؛ موت هذا الخيط يترك العامل معلقاً بلا مهام
+            try:
+                if job.get("cmd") == "cancel":
+                    target = budgets.get(job.get("job_id"))
+                    if target is not None:
+                        target.cancel()
+                    emit({"id": job.get("id"), "ok": True, "cancelled": target is not None})
+                    continue
+                if job.get("cmd", "extract") == "extract":
+                    # الميزانية تبدأ من الاستلام: وقت الانتظار في الطابور يُحسب منها كما عند المستدعي
+                    budgets[job.get("id")] = job_budget(job) or ExtractionBudget()
+            except Exception as e:
+                emit({"id": job.get("id"), "ok": False, "error": f"invalid job: {e}"})
+                continue
+            jobs.put(job)
+        jobs.put(None)
+
+    emit({"ready": True, "pid": os.getpid()})
+    threading.Thread(target=read_jobs, name="ejar-serve-stdin", daemon=True).start()
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        try:
+            reload_rules_if_changed()
+            emit(handle_job(job, budgets.get(job.get("id"))))
+        except Exception as e:
+            emit({"id": job.get("id"), "ok": False, "error": str(e)})
+        finally:
+            budgets.pop(job.get("id"), None)
+
+# ------------------------------
+# Batch mode (--batch)
+# ------------------------------
+def collect_pdfs(inputs: List[str]) -> List[str]:
+    """ تجميع ملفات PDF من مسارات ملفات أو مجلدات (بحث متداخل) أو أنماط glob. """
+    found = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                found.extend(os.path.join(root, f) for f in files if f.lower().endswith(".pdf"))
+        elif os.path.isfile(item):
+            found.append(item)
+        else:
+            found.extend(p for p in glob.glob(item, recursive=True)
+                         if os.path.isfile(p) and p.lower().endswith(".pdf"))
+    return sorted({os.path.abspath(p) for p in found})
+
+def _manifest_key(pdf_path: str) -> str:
+    st = os.stat(pdf_path)
+    return f"{pdf_path}|{st.st_size}|{int(st.st_mtime)}"
+
+def load_manifest(manifest_path: str) -> Dict[str, str]:
+    """ قراءة سجل التقدم: آخر حالة لكل ملف (سطر مقطوع بسبب انهيار يُتجاهل). """
+    done: Dict[str, str] = {}
+    if not os.path.isfile(manifest_path):
+        return done
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            done[rec["key"]] = rec["status"]
+    return done
+
+def _batch_job(pdf_path: str) -> Dict[str, Any]:
+    try:
+        # الدفعة لا تكتب النص الكامل → لا داعي لحفظه في الكاش مع كل عقد
+        data, _ = extract_all_cached(pdf_path, keep_full_text=False)
+        return {"path": pdf_path, "ok": True, "data": data}
+    except Exception as e:
+        return {"path": pdf_path, "ok": False, "error": str(e), "error_type": type(e).__name__}
+
+def _batch_job_isolated(pdf_path: str) -> Dict[str, Any]:
+    """ إعادة عقد مشتبه به في عملية مستقلة: انهيارها هنا يعني أن هذا العقد هو سبب الانهيار. """
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    with ProcessPoolExecutor(max_workers=1) as one:
+        try:
+            return one.submit(_batch_job, pdf_path).result()
+        except BrokenProcessPool as e:
+            return {"path": pdf_path, "ok": False, "error": f"worker process crashed: {e}",
+                    "error_type": type(e).__name__}
+
+def run_batch(inputs: List[str], out_path: str, manifest_path: Optional[str]=None,
+              jobs: Optional[int]=None, retry_failed: bool=True) -> Dict[str, int]:
+    """
+    استخراج دفعي لأرشيف كامل: النتائج سطر JSON لكل عقد في out_path،
+    وسجل manifest يسمح باستئناف تشغيل منقطع دون إعادة معالجة ما اكتمل.
+    فشل عقد واحد يُسجَّل ولا يوقف الدفعة، وكذلك انهيار عامل (segfault / OOM): ما كان قيد التنفيذ
+    يُعاد كلٌّ في عملية مستقلة فيُحسب الفاشل وحده، ثم يُبنى مجمع جديد لباقي الدفعة.
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    from concurrent.futures.process import BrokenProcessPool
+
+    manifest_path = manifest_path or f"{out_path}.manifest"
+    pdfs = collect_pdfs(inputs)
+    done = load_manifest(manifest_path)
+    skip = {"ok"} if retry_failed else {"ok", "error"}
+    todo = [(p, _manifest_key(p)) for p in pdfs]
+    todo = [(p, k) for p, k in todo if done.get(k) not in skip]
+
+    stats = {"total": len(pdfs), "skipped": len(pdfs) - len(todo), "ok": 0, "failed": 0}
+    if not todo:
+        return stats
+
+    with open(out_path, "a", encoding="utf-8") as out_f, \
+         open(manifest_path, "a", encoding="utf-8") as man_f:
+
+        def record(res: Dict[str, Any], key: str) -> None:
+            # النتيجة أولاً ثم السجل: الانهيار بينهما يكرر سطراً ولا يفقده
+            out_f.write(json.dumps(res, ensure_ascii=False) + "\n")
+            out_f.flush()
+            status = "ok" if res["ok"] else "error"
+            man_f.write(json.dumps({"key": key, "status": status}, ensure_ascii=False) + "\n")
+            man_f.flush()
+            stats["ok" if res["ok"] else "failed"] += 1
+            n = stats["ok"] + stats["failed"]
+            label = "OK" if res["ok"] else f"FAIL {res.get('error')}"
+            print(f"[{n}/{len(todo)}] {label} {res['path']}", file=sys.stderr, flush=True)
+
+        if jobs == 1:
+            for p, k in todo:
+                record(_batch_job(p), k)
+            return stats
+
+        # نافذة محدودة من المهام المرسلة: عند الانهيار يُعرف المشتبه بهم (ما في النافذة فقط)
+        workers = jobs or os.cpu_count() or 1
+        window = 2 * workers
+        pending = list(reversed(todo))
+        inflight: Dict[Any, Tuple[str, str]] = {}
+        ex = ProcessPoolExecutor(max_workers=workers)
+        try:
+            while pending or inflight:
+                while pending and len(inflight) < window:
+                    p, k = pending.pop()
+                    inflight[ex.submit(_batch_job, p)] = (p, k)
+                finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                failed: List[Tuple[str, str, BaseException]] = []
+                broken = False
+                for fut in finished:
+                    p, k = inflight.pop(fut)
+                    try:
+                        res = fut.result()
+                    except Exception as e:
+                        broken = broken or isinstance(e, BrokenProcessPool)
+                        failed.append((p, k, e))
+                        continue
+                    record(res, k)
+                if not broken:
+                    for p, k, e in failed:
+                        record({"path": p, "ok": False, "error": str(e) or type(e).__name__,
+                                "error_type": type(e).__name__}, k)
+                    continue
+                # المجمع انتهى وكل ما في النافذة فشل معه؛ كل واحد يُعاد منفرداً، ولا يُكتب سطر
+                # خطأ إلا إن فشلت إعادته هو أيضاً (كل ملف يُسجَّل مرة واحدة فقط)
+                suspects = [(p, k) for p, k, _ in failed] + list(inflight.values())
+                inflight.clear()
+                ex.shutdown(wait=False)
+                for p, k in suspects:
+                    record(_batch_job_isolated(p), k)
+                ex = ProcessPoolExecutor(max_workers=workers)
+        finally:
+            ex.shutdown(wait=True)
+    return stats
 
 # ------------------------------
 # CLI
 # ------------------------------
 def main():
     parser = argparse.ArgumentParser(description="Extract fields from Ejar bilingual contracts.")
-    parser.add_argument("pdf_path", help="مسار ملف العقد PDF")
+    parser.add_argument("pdf_path", nargs="?", help="مسار ملف العقد PDF (أو - لقراءته من stdin)")
     parser.add_argument("--debug", action="store_true", help="حفظ ملفات تصحيح (raw_text/debug)")
     parser.add_argument("--output-dir", default=None, help="مجلد الإخراج (إفتراضي مجلد السكربت).")
     parser.add_argument("--no-shape-ar", action="store_true",
                         help="عدم قلب/تشكيل العربية للعرض في JSON (يُستخدم التطبيع فقط).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="تجاهل كاش النتائج (EJAR_CACHE_DIR) وإعادة التحليل.")
+    parser.add_argument("--serve", action="store_true",
+                        help="وضع العامل الدائم: مهام JSON سطراً بسطر عبر stdin/stdout.")
+    parser.add_argument("--page-workers", type=int, default=None,
+                        help="توزيع استخراج نص الصفحات على N عملية للملفات الطويلة (EJAR_PAGE_WORKERS).")
+    parser.add_argument("--sections", default=None,
+                        help="أقسام محددة مفصولة بفواصل (مثل units,payments)؛ الإفتراضي كل الأقسام.")
+    parser.add_argument("--engine", default=None, choices=sorted(TEXT_ENGINES),
+                        help="محرك استخراج النص (EJAR_TEXT_ENGINE)؛ الإفتراضي pdfplumber.")
+    parser.add_argument("--template", action="store_true",
+                        help="قراءة الحقول الأساسية من مربعات القالب (EJAR_TEMPLATE=1 مع EJAR_LAYOUTS_FILE).")
+    parser.add_argument("--learn-layout", metavar="LAYOUT_ID", default=None,
+                        help="بناء قالب من pdf_path (عقد معروف) وإضافته إلى --layouts-file.")
+    parser.add_argument("--layouts-file", default=None,
+                        help="ملف القوالب JSON (إفتراضي EJAR_LAYOUTS_FILE).")
+    parser.add_argument("--lazy-pages", action="store_true",
+                        help="تحليل الصفحات التي تحتاجها الأقسام المطلوبة فقط (EJAR_LAZY_PAGES=1).")
+    parser.add_argument("--time-budget-ms", type=int, default=None,
+                        help="حد زمن التحليل؛ عند تجاوزه تُكتب نتيجة جزئية (EJAR_TIME_BUDGET_MS).")
+    parser.add_argument("--max-pages", type=int, default=None,
+                        help="تحليل أول N صفحة فقط (EJAR_MAX_PAGES).")
+    parser.add_argument("--stdout", action="store_true",
+                        help="كتابة JSON النتيجة على stdout بدل ملف (مع غلاف خطأ JSON عند الفشل).")
+    parser.add_argument("--output-fd", type=int, default=None,
+                        help="كتابة JSON النتيجة على واصف ملف يمرره المستدعي (مثل 3).")
+    parser.add_argument("--batch", nargs="+", metavar="PATH_OR_GLOB",
+                        help="استخراج دفعي لمجلدات/ملفات/أنماط glob إلى ملف JSONL.")
+    parser.add_argument("--jobs", type=int, default=None, help="عدد العمليات المتوازية في وضع الدفعات.")
+    parser.add_argument("--out", default=None, help="ملف JSONL لنتائج الدفعات (إفتراضي batch_results.jsonl).")
+    parser.add_argument("--manifest", default=None, help="سجل التقدم للاستئناف (إفتراضي <out>.manifest).")
+    parser.add_argument("--text-archive", default=None, metavar="DIR",
+                        help="أرشفة نص الصفحات مضغوطاً حسب بصمة الملف (EJAR_TEXT_ARCHIVE).")
+    parser.add_argument("--reextract", nargs="*", metavar="SHA256", default=None,
+                        help="إعادة التحليل من أرشيف النص بالقواعد الحالية (كل الأرشيف أو بصمات محددة) إلى --out.")
+    parser.add_argument("--no-retry-failed", action="store_true",
+                        help="عند الاستئناف لا تُعاد محاولة الملفات التي فشلت سابقاً.")
     args = parser.parse_args()
 
-    pdf_path = args.pdf_path
-    if not os.path.isfile(pdf_path):
-        raise SystemExit(f"[ERROR] الملف غير موجود: {pdf_path}")
+    if args.no_cache:
+        os.environ["EJAR_CACHE"] = "0"
+    if args.page_workers is not None:
+        os.environ["EJAR_PAGE_WORKERS"] = str(args.page_workers)
+    if args.lazy_pages:
+        os.environ["EJAR_LAZY_PAGES"] = "1"
+    if args.engine:
+        os.environ["EJAR_TEXT_ENGINE"] = args.engine
+    if args.layouts_file:
+        os.environ["EJAR_LAYOUTS_FILE"] = args.layouts_file
+    if args.template:
+        os.environ["EJAR_TEMPLATE"] = "1"
+    if args.time_budget_ms is not None:
+        os.environ["EJAR_TIME_BUDGET_MS"] = str(args.time_budget_ms)
+    if args.max_pages is not None:
+        os.environ["EJAR_MAX_PAGES"] = str(args.max_pages)
+    if args.text_archive:
+        os.environ["EJAR_TEXT_ARCHIVE"] = args.text_archive
+    sections = [k.strip() for k in args.sections.split(",") if k.strip()] if args.sections else None
+    if sections:
+        unknown = set(sections) - set(SECTION_KEYS)
+        if unknown:
+            parser.error(f"unknown sections: {', '.join(sorted(unknown))}")
+
+    if args.serve:
+        serve()
+        return
 
     script_dir = os.path.dirname(os.path.abspath(__file__))
     out_dir = args.output_dir if args.output_dir else script_dir
     os.makedirs(out_dir, exist_ok=True)
 
-    base = os.path.splitext(os.path.basename(pdf_path))[0]
+    if args.reextract is not None:
+        archive = get_text_archive()
+        if archive is None:
+            parser.error("--reextract needs --text-archive (or EJAR_TEXT_ARCHIVE)")
+        out_path = args.out or os.path.join(out_dir, "reextract_results.jsonl")
+        t0 = time.perf_counter()
+        stats = run_reextract(archive, out_path, digests=args.reextract, sections=sections, jobs=args.jobs)
+        print(f"[OK] re-extracted from text -> {out_path} "
+              f"(total={stats['total']} ok={stats['ok']} failed={stats['failed']} "
+              f"in {time.perf_counter() - t0:.1f}s, rules {RULES.version})", flush=True)
+        return
+
+    if args.batch:
+        out_path = args.out or os.path.join(out_dir, "batch_results.jsonl")
+        stats = run_batch(args.batch, out_path, manifest_path=args.manifest, jobs=args.jobs,
+                          retry_failed=not args.no_retry_failed)
+        print(f"[OK] batch done -> {out_path} "
+              f"(total={stats['total']} skipped={stats['skipped']} ok={stats['ok']} failed={stats['failed']})",
+              flush=True)
+        return
+
+    pdf_path = args.pdf_path
+    if not pdf_path:
+        parser.error("pdf_path is required unless --serve or --batch is given")
+
+    if args.learn_layout:
+        layouts_file = os.environ.get("EJAR_LAYOUTS_FILE")
+        if not layouts_file:
+            parser.error("--learn-layout needs --layouts-file (or EJAR_LAYOUTS_FILE)")
+        write_learned_layout(learn_layout(pdf_path, args.learn_layout), layouts_file)
+        return
+
+    if args.stdout or args.output_fd is not None:
+        raise SystemExit(emit_result_stream(args, out_dir, sections))
+
+    if pdf_path == "-":
+        source: PdfSource = sys.stdin.buffer.read()
+        base = "stdin"
+    elif os.path.isfile(pdf_path):
+        source = pdf_path
+        base = os.path.splitext(os.path.basename(pdf_path))[0]
+    else:
+        raise SystemExit(f"[ERROR] الملف غير موجود: {pdf_path}")
     out_json = os.path.join(out_dir, f"{base}_result.json")
 
-    data, full_text = extract_all(pdf_path, debug=args.debug)
+    data, full_text = extract_all_cached(source, debug=args.debug, sections=sections,
+                                         keep_full_text=args.debug)
 
     with open(out_json, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
     print(f"[OK] JSON saved -> {out_json}", flush=True)
 
     if args.debug:
-        out_txt = os.path.join(out_dir, f"{base}_raw_text.txt")
-        with open(out_txt, "w", encoding="utf-8") as f:
-            f.write(full_text)
-        print(f"[DEBUG] raw text -> {out_txt}", flush=True)
+        write_raw_text(full_text, out_dir, base)
+
+def write_learned_layout(layout: Dict[str, Any], layouts_file: str) -> None:
+    """ إضافة القالب إلى ملف القوالب (أو استبدال قالب بنفس المعرّف). """
+    doc = {"layouts": []}
+    if os.path.isfile(layouts_file):
+        with open(layouts_file, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+    doc["layouts"] = [l for l in doc.get("layouts", []) if l.get("id") != layout["id"]] + [layout]
+    LayoutSet(doc["layouts"])  # تحقق قبل الكتابة
+    with open(layouts_file, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, indent=2)
+    missing = sorted(set(TEMPLATE_FIELDS) - set(layout["fields"]))
+    print(f"[OK] layout {layout['id']} -> {layouts_file} "
+          f"(fields={len(layout['fields'])} anchors={len(layout['anchors'])})", flush=True)
+    if missing:
+        print(f"[WARN] not located (regex fallback): {', '.join(missing)}", flush=True)
+
+def write_raw_text(full_text: str, out_dir: str, base: str) -> None:
+    out_txt = os.path.join(out_dir, f"{base}_raw_text.txt")
+    with open(out_txt, "w", encoding="utf-8") as f:
+        f.write(full_text)
+    print(f"[DEBUG] raw text -> {out_txt}", flush=True)
+
+def emit_result_stream(args: argparse.Namespace, out_dir: str,
+                       sections: Optional[List[str]]=None) -> int:
+    """
+    يكتب JSON النتيجة مباشرة على stdout أو على fd من المستدعي (بدون ملف مؤقت).
+    عند الفشل يُكتب {"error": ..., "error_type": ...} ويُرجع رمز خروج 1.
+    """
+    if args.output_fd is not None:
+        stream = os.fdopen(args.output_fd, "w", encoding="utf-8", closefd=False)
+    else:
+        stream = sys.stdout
+        if hasattr(stream, "reconfigure"):
+            stream.reconfigure(encoding="utf-8")
+    # أي طباعة أخرى تذهب إلى stderr حتى يبقى المخرج JSON صالحاً
+    sys.stdout = sys.stderr
+
+    code = 0
+    try:
+        if args.pdf_path == "-":
+            source: PdfSource = sys.stdin.buffer.read()
+            base = "stdin"
+        elif os.path.isfile(args.pdf_path):
+            source = args.pdf_path
+            base = os.path.splitext(os.path.basename(args.pdf_path))[0]
+        else:
+            raise FileNotFoundError(f"file not found: {args.pdf_path}")
+        data, full_text = extract_all_cached(source, debug=args.debug, sections=sections,
+                                             keep_full_text=args.debug)
+        payload = data
+        if args.debug:
+            write_raw_text(full_text, out_dir, base)
+    except Exception as e:
+        payload = {"error": str(e), "error_type": type(e).__name__}
+        code = 1
+    stream.write(json.dumps(payload, ensure_ascii=False))
+    stream.write("\n")
+    stream.flush()
+    return code
 
 if __name__ == "__main__":
     main()
@@ -2,47 +2,87 @@ import express from "express";
 import multer from "multer";
 import { spawn } from "child_process";
 import path from "path";
-import fs from "fs";
+import { isPoolEnabled, runExtraction } from "../utils/extractWorkerPool.js";
 
 const router = express.Router();
-const upload = multer({ dest: "uploads/" });
+// نفس حد خادم ASGI (EJAR_MAX_UPLOAD_MB)
+const MAX_UPLOAD_MB = parseInt(process.env.EJAR_MAX_UPLOAD_MB ?? "25", 10);
+// الملف يبقى في الذاكرة ويُمرَّر لـ Python مباشرة (بدون ملفات مؤقتة في uploads/)
+// الحد يمنع رفعاً ضخماً من حجز ذاكرة العملية كلها قبل أن يصل إلى التحليل
+const upload = multer({
+  storage: multer.memoryStorage(),
+  limits: { fileSize: MAX_UPLOAD_MB * 1024 * 1024, files: 1 },
+});
+
+// أخطاء الرفع تُرد كأخطاء عميل: ملف أكبر من الحد → 413، وغيره (ملفات زائدة...) → 400
+const uploadFile = (req, res, next) =>
+  upload.single("file")(req, res, (err) => {
+    if (!err) return next();
+    if (!(err instanceof multer.MulterError)) return next(err);
+    if (err.code === "LIMIT_FILE_SIZE") {
+      return res.status(413).json({ error: `File too large (max ${MAX_UPLOAD_MB} MB)` });
+    }
+    return res.status(400).json({ error: err.message });
+  });
 
-router.post("/api/extract", upload.single("file"), async (req, res) => {
+router.post("/api/extract", uploadFile, async (req, res) => {
   try {
     if (!req.file) return res.status(400).json({ error: "No file uploaded" });
 
-    const filePath = path.resolve(req.file.path);
+    // 🔌 إلغاء التحليل إذا أغلق العميل الاتصال قبل وصول النتيجة
+    const abort = new AbortController();
+    res.on("close", () => {
+      if (!res.writableFinished) abort.abort();
+    });
+
+    // 🔥 مجمع العمّال الدافئ (EXTRACT_WORKERS=0 يعيد التشغيل القديم لكل طلب)
+    if (isPoolEnabled()) {
+      try {
+        const data = await runExtraction(
+          { pdf_b64: req.file.buffer.toString("base64") },
+          { signal: abort.signal }
+        );
+        return res.json(data);
+      } catch (err) {
+        if (abort.signal.aborted) return;
+        console.error("Extraction worker error:", err);
+        return res.status(500).json({ error: "Extraction failed", details: err.message });
+      }
+    }
+
     const pyPath = path.resolve("extract/extract_ejar.py");
 
-    // 🐍 Run Python script and get JSON result
-    const py = spawn("python", [pyPath, filePath]);
+    // 🐍 Run Python script: the PDF goes in on stdin, the result JSON comes back on stdout
+    const py = spawn("python", [pyPath, "-", "--stdout"], {
+      env: { ...process.env, PYTHONIOENCODING: "utf-8" },
+    });
+    py.stdin.on("error", () => {}); // Python exited early → handled in "close"
+    py.stdin.end(req.file.buffer);
+    abort.signal.addEventListener("abort", () => py.kill(), { once: true });
 
-    let output = "";
+    const chunks = [];
     let errorOutput = "";
 
-    py.stdout.on("data", (data) => (output += data.toString()));
+    py.stdout.on("data", (data) => chunks.push(data));
     py.stderr.on("data", (data) => (errorOutput += data.toString()));
 
     py.on("close", (code) => {
-      fs.unlinkSync(filePath); // cleanup uploaded PDF
-      if (code !== 0 || !output.trim()) {
-        console.error("Python error:", errorOutput);
-        return res.status(500).json({ error: "Extraction failed", details: errorOutput });
-      }
+      if (abort.signal.aborted) return;
+      const output = Buffer.concat(chunks).toString("utf-8").trim();
 
+      let data;
       try {
-        // Your Python prints "[OK] JSON saved -> path", so we’ll load that file
-        const match = output.match(/JSON saved -> (.+\.json)/);
-        if (!match) throw new Error("No JSON file path found in Python output");
-
-        const jsonPath = match[1].trim();
-        const data = JSON.parse(fs.readFileSync(jsonPath, "utf-8"));
-        fs.unlinkSync(jsonPath);
-        res.json(data);
+        data = JSON.parse(output);
       } catch (err) {
-        console.error("Parse error:", err);
-        res.status(500).json({ error: "Failed to parse JSON", details: err.message });
+        console.error("Python error:", errorOutput);
+        return res.status(500).json({ error: "Extraction failed", details: errorOutput || err.message });
+      }
+
+      if (code !== 0 || data.error) {
+        console.error("Python error:", data.error, errorOutput);
+        return res.status(500).json({ error: "Extraction failed", details: data.error || errorOutput });
       }
+      res.json(data);
     });
   } catch (err) {
     console.error("Server error:", err);
@@ -0,0 +1,139 @@
+import { spawn } from "child_process";
+import path from "path";
+import readline from "readline";
+
+/* =========================================================
+   ⚙️ إعدادات مجمع عمّال الاستخراج (Python --serve)
+========================================================= */
+const PYTHON_BIN = process.env.PYTHON_BIN || "python";
+const SCRIPT_PATH = path.resolve("extract/extract_ejar.py");
+const POOL_SIZE = parseInt(process.env.EXTRACT_WORKERS ?? "2", 10);
+const JOB_TIMEOUT_MS = parseInt(process.env.EXTRACT_TIMEOUT_MS ?? "60000", 10);
+// ميزانية Python أقل من مهلة القتل حتى يرجع نتيجة جزئية قبل أن يُعاد تشغيل العامل
+const TIME_BUDGET_MS = Math.max(1000, JOB_TIMEOUT_MS - 5000);
+const RESPAWN_DELAY_MS = 1000;
+
+/* =========================================================
+   🐍 عامل Python واحد يبقى دافئاً بين الطلبات
+========================================================= */
+class ExtractWorker {
+  constructor(index) {
+    this.index = index;
+    this.pending = new Map();
+    this.proc = null;
+    this.start();
+  }
+
+  start() {
+    const proc = spawn(PYTHON_BIN, [SCRIPT_PATH, "--serve"], {
+      stdio: ["pipe", "pipe", "pipe"],
+      env: { ...process.env, PYTHONIOENCODING: "utf-8" },
+    });
+    this.proc = proc;
+
+    readline.createInterface({ input: proc.stdout }).on("line", (line) => {
+      let msg;
+      try {
+        msg = JSON.parse(line);
+      } catch {
+        console.error(`[extract-worker ${this.index}] bad line:`, line);
+        return;
+      }
+      if (msg.ready) return;
+
+      const job = this.pending.get(msg.id);
+      if (!job) return;
+      this.pending.delete(msg.id);
+      clearTimeout(job.timer);
+
+      if (msg.ok) job.resolve(msg.data);
+      else job.reject(new Error(msg.error || "Extraction failed"));
+    });
+
+    proc.stderr.on("data", (data) =>
+      console.error(`[extract-worker ${this.index}]`, data.toString().trim())
+    );
+
+    proc.on("exit", (code, signal) =>
+      this.retire(proc, new Error(`Extraction worker exited (${signal || code})`))
+    );
+    // ENOENT (PYTHON_BIN غير موجود) لا يصل إلى exit دائماً، وEPIPE على stdin يُسقط العملية إن لم يُلتقط
+    proc.on("error", (err) =>
+      this.retire(proc, new Error(`Extraction worker failed: ${err.message}`))
+    );
+    proc.stdin.on("error", (err) =>
+      this.retire(proc, new Error(`Extraction worker stdin failed: ${err.message}`))
+    );
+  }
+
+  // إخراج العملية من الخدمة مرة واحدة مهما تعددت الأحداث: رفض مهامها ثم تشغيل بديل
+  retire(proc, err) {
+    if (this.proc !== proc) return;
+    this.proc = null;
+    console.error(`[extract-worker ${this.index}]`, err.message);
+    this.failAll(err);
+    proc.kill();
+    setTimeout(() => this.start(), RESPAWN_DELAY_MS);
+  }
+
+  get load() {
+    return this.pending.size;
+  }
+
+  run(payload, id, signal) {
+    return new Promise((resolve, reject) => {
+      if (!this.proc) return reject(new Error("Extraction worker is restarting"));
+      if (signal?.aborted) return reject(new Error("Extraction cancelled"));
+
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error("Extraction timed out"));
+        // العامل عالق على هذا الملف → إعادة تشغيله
+        this.proc?.kill();
+      }, JOB_TIMEOUT_MS);
+
+      // 🔌 العميل قطع الاتصال → أمر cancel يوقف المهمة عند أول فحص للميزانية (أو يتخطاها إن لم تبدأ)
+      const onAbort = () => {
+        if (!this.pending.has(id)) return;
+        this.pending.delete(id);
+        clearTimeout(timer);
+        this.proc?.stdin.write(JSON.stringify({ cmd: "cancel", job_id: id }) + "\n");
+        reject(new Error("Extraction cancelled"));
+      };
+      signal?.addEventListener("abort", onAbort, { once: true });
+      const settle = (fn) => (value) => {
+        signal?.removeEventListener("abort", onAbort);
+        fn(value);
+      };
+
+      this.pending.set(id, { resolve: settle(resolve), reject: settle(reject), timer });
+      this.proc.stdin.write(JSON.stringify({ time_budget_ms: TIME_BUDGET_MS, ...payload, id }) + "\n");
+    });
+  }
+
+  failAll(err) {
+    for (const job of this.pending.values()) {
+      clearTimeout(job.timer);
+      job.reject(err);
+    }
+    this.pending.clear();
+  }
+}
+
+/* =========================================================
+   🧮 المجمع: يختار العامل الأقل انشغالاً
+========================================================= */
+let workers = null;
+let nextId = 1;
+
+export function isPoolEnabled() {
+  return POOL_SIZE > 0;
+}
+
+export function runExtraction(payload, { signal } = {}) {
+  if (!workers) {
+    workers = Array.from({ length: POOL_SIZE }, (_, i) => new ExtractWorker(i));
+  }
+  const worker = workers.reduce((a, b) => (b.load < a.load ? b : a));
+  return worker.run(payload, nextId++, signal);
+}